@@ -1,21 +1,42 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
+import hmac
 import json
 import os
+import time
 from functools import wraps
 from datetime import datetime
 
-from models import Database, User, Category, Product, UseCase, Order, Cart
-from auth import hash_password, verify_password, create_access_token, decode_token
+from models import (
+    Database, User, Category, Product, UseCase, Order, Cart, CartOperationError, InsufficientStockError,
+    TokenRevocation
+)
+from auth import (
+    hash_password, verify_password, password_needs_rehash, password_hasher, HasherBusy,
+    create_access_token, decode_token, TOKEN_EXPIRY,
+    set_revocation_check, forget_token, forget_user_tokens, token_cache_stats
+)
+from http_cache import conditional
+from compression import ResponseCompressor
+from metrics import Metrics
+from pool import PoolTimeout
+from checkout import CheckoutService, EmptyCartError
+from inventory import Inventory
+from sold_counts import SoldCounts
+from leaderboard import Leaderboard
+import serializers
+import logs
+from logs import get_logger
 
 app = Flask(__name__)
+log = get_logger("app")
 
 # Configure CORS to allow any origin during development
 CORS(app, 
      resources={r"/api/*": {"origins": "*"}},
      supports_credentials=True,
      allow_headers=["Content-Type", "Authorization", "Access-Control-Allow-Origin"],
-     expose_headers=["Access-Control-Allow-Origin"],
+     expose_headers=["Access-Control-Allow-Origin", "X-Query-Count", "X-SQL-Profile", "ETag"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 # Add CORS headers to all responses
@@ -33,15 +54,131 @@ def add_cors_headers(response):
 # Initialize database
 db = Database()
 
+# Cache-Control per catalog route. Responses carry ETags tied to the catalog
+# version, so "no-cache" still lets clients revalidate cheaply with a 304.
+CACHE_CONTROL = {
+    "categories": os.getenv("CACHE_CONTROL_CATEGORIES", "public, max-age=60"),
+    "usecases": os.getenv("CACHE_CONTROL_USECASES", "public, max-age=60"),
+    "products": os.getenv("CACHE_CONTROL_PRODUCTS", "no-cache"),
+    "product": os.getenv("CACHE_CONTROL_PRODUCT", "no-cache"),
+}
+
+def catalog_conditional(route):
+    return conditional(lambda: db.catalog_version, cache_control=CACHE_CONTROL[route])
+
+# Product listing page sizes
+PRODUCTS_PAGE_SIZE = 50
+MAX_PRODUCTS_PAGE_SIZE = 100
+
+# Order history page sizes
+ORDERS_PAGE_SIZE = 50
+MAX_ORDERS_PAGE_SIZE = 100
+
+# Most operations one /api/cart/batch or guest-cart merge may carry
+MAX_CART_OPERATIONS = 100
+
+# Start the request clock before anything can wait on the pool, so requests
+# refused with a pool timeout are still timed and counted
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.request_started()
+
+# Count SQLite statements per request so list latency can be tied to query volume
+@app.before_request
+def reset_query_count():
+    db.reset_query_count()
+
+# With SQL_PROFILE=1, summarize the request's statements and flag slow and repeated
+# ones. Registered first so it runs last and its EXPLAINs stay out of the counts.
+@app.after_request
+def add_sql_profile_header(response):
+    summary = db.profile_summary(request.url_rule.rule if request.url_rule else request.path)
+    if summary is not None:
+        response.headers['X-SQL-Profile'] = db.profiler.header(summary)
+    return response
+
+@app.after_request
+def add_query_count_header(response):
+    response.headers['X-Query-Count'] = str(db.get_query_count())
+    return response
+
+# Per-route latency, status, size and query metrics, exported at /api/metrics.
+# Registered before compression so it runs after it and counts the bytes sent.
+metrics = Metrics(directory=os.getenv("METRICS_DIR"))
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe(
+        route,
+        request.method,
+        response.status_code,
+        time.perf_counter() - g.request_started,
+        response.calculate_content_length() or 0,
+        db.get_query_count(),
+        db.get_query_time()
+    )
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception):
+    if "request_started" in g:
+        metrics.request_finished()
+
+# Compress responses the client can decode; catalog bodies are cached per ETag
+compressor = ResponseCompressor(
+    min_size=int(os.getenv("COMPRESSION_MIN_SIZE", "500")),
+    level=int(os.getenv("COMPRESSION_LEVEL", "6")),
+    brotli_quality=int(os.getenv("BROTLI_QUALITY", "5")),
+    cache_size=int(os.getenv("COMPRESSION_CACHE_SIZE", "256"))
+)
+
+@app.after_request
+def compress_response(response):
+    return compressor.compress(response)
+
+# Return the request's pooled connection, whatever happened during the request
+@app.teardown_appcontext
+def release_db_connection(exception):
+    db.release_connection()
+
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    return jsonify({"error": "Server is busy. Please try again."}), 503
+
+@app.errorhandler(HasherBusy)
+def handle_hasher_busy(e):
+    return jsonify({"error": "Server is busy. Please try again."}), 503
+
 # Initialize models
+sold_counts = SoldCounts(db)
+leaderboard = Leaderboard(db)
 user_model = User(db)
 category_model = Category(db)
-product_model = Product(db)
+product_model = Product(db, sold_counts, leaderboard)
 use_case_model = UseCase(db)
-order_model = Order(db)
+order_model = Order(db, sold_counts)
 cart_model = Cart(db)
+inventory = Inventory(db)
+checkout_service = CheckoutService(db, inventory, sold_counts)
+token_revocation = TokenRevocation(db)
+
+# Expired stock holds stop counting the moment they expire; the sweeper only deletes them
+inventory.start_sweeper()
+# Fold deferred sales into sold_count (no-op with SOLD_COUNT_MODE=inline)
+sold_counts.start_aggregator()
+# Best-seller boards are loaded once per process and kept current from there
+if leaderboard.enabled:
+    leaderboard.rebuild()
+    db.release_connection()
+# Trim the change log the boards read, off the request path
+leaderboard.start_pruner()
 
-# Helper function to extract user ID from JWT token
+# Reject revoked tokens even when their verified payload is cached
+set_revocation_check(token_revocation.is_revoked)
+
+# Helper function to extract the user from a JWT token
 def get_user_from_token(token):
     if not token:
         return None
@@ -50,8 +187,16 @@ def get_user_from_token(token):
     if not payload:
         return None
     
+    # Tokens carry the user's name and email as signed claims, so the common
+    # case needs no database lookup. Older tokens only have the user id.
+    if "name" in payload and "email" in payload:
+        return {"id": payload["sub"], "name": payload["name"], "email": payload["email"]}
+    
     return user_model.get_by_id(payload.get("sub"))
 
+def token_claims(user):
+    return {"sub": str(user["id"]), "name": user["name"], "email": user["email"]}
+
 # Authentication middleware
 def login_required(f):
     @wraps(f)
@@ -59,39 +204,109 @@ def login_required(f):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
-            print("Auth error: No authorization header provided")
+            log.info("auth.failed", "No authorization header provided", path=request.path)
             return jsonify({"error": "No authorization header provided"}), 401
         
         try:
             # Extract token from header
             token = auth_header.split("Bearer ")[-1]
             if not token:
-                print("Auth error: Empty token")
+                log.info("auth.failed", "Empty token", path=request.path)
                 return jsonify({"error": "Empty token"}), 401
                 
             # Get user from token
             user = get_user_from_token(token)
             
             if not user:
-                print(f"Auth error: Invalid or expired token: {token[:10]}...")
+                log.info("auth.failed", "Invalid or expired token", path=request.path)
                 return jsonify({"error": "Invalid or expired token"}), 401
             
             # Add user to request
+            request.token = token
             request.user = user
             request.user_id = user["id"]
             return f(*args, **kwargs)
         except Exception as e:
-            print(f"Auth error: {str(e)}")
+            log.exception("auth.error", "Authentication error", path=request.path)
             return jsonify({"error": f"Authentication error: {str(e)}"}), 401
     
     return decorated_function
 
+# Diagnostics that expose process internals or cost real work. With ADMIN_TOKEN
+# set they need it as a bearer token; without it only loopback clients get in.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def internal_only(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if ADMIN_TOKEN:
+            allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {ADMIN_TOKEN}")
+        else:
+            allowed = request.remote_addr in ("127.0.0.1", "::1")
+        if not allowed:
+            log.info("auth.forbidden", "Internal endpoint refused", path=request.path, addr=request.remote_addr)
+            return jsonify({"error": "Forbidden"}), 403
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    try:
+        db.get_connection().execute("SELECT 1").fetchone()
+        db.pool.health_check()
+    except Exception as e:
+        log.error("health.failed", "Health check failed", error=str(e))
+        return jsonify({"status": "error", "timestamp": datetime.now().isoformat()}), 503
     return jsonify({"status": "ok", "timestamp": datetime.now().isoformat()})
 
+# Readiness for load balancers: 503 while this worker drains for a restart
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    if app.config.get("DRAINING"):
+        return jsonify({"status": "draining", "pid": os.getpid()}), 503
+    try:
+        db.get_connection().execute("SELECT 1").fetchone()
+    except Exception as e:
+        log.error("ready.failed", "Readiness check failed", error=str(e))
+        return jsonify({"status": "error", "pid": os.getpid()}), 503
+    return jsonify({"status": "ready", "pid": os.getpid()})
+
+@app.route('/api/stats', methods=['GET'])
+@internal_only
+def get_stats():
+    return jsonify({
+        "catalogVersion": db.catalog_version,
+        "catalogCache": db.catalog_cache.stats(),
+        "connectionPool": db.pool.stats(),
+        "tokenCache": token_cache_stats(),
+        "tokenRevocation": token_revocation.stats(),
+        "passwordHasher": password_hasher.stats(),
+        "compression": compressor.stats(),
+        "logging": logs.stats(),
+        "sqlProfile": db.profiler.stats() if db.profiler else None,
+        "inventory": inventory.stats(),
+        "soldCounts": sold_counts.stats(),
+        "leaderboard": leaderboard.stats()
+    })
+
+# Compare this process's best-seller boards with the database; repair=1 rebuilds them on drift
+@app.route('/api/leaderboard/check', methods=['GET'])
+@internal_only
+def check_leaderboard():
+    if not leaderboard.enabled:
+        return jsonify({"error": "Leaderboard is disabled"}), 404
+    result = leaderboard.check(repair=request.args.get('repair') == '1')
+    return jsonify({**result, "pid": os.getpid()}), 200 if result["consistent"] else 409
+
+# Prometheus scrape target; sums every worker when METRICS_DIR is shared
+@app.route('/api/metrics', methods=['GET'])
+@internal_only
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # Auth endpoints
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -106,36 +321,61 @@ def login():
         if not email or not password:
             return jsonify({"error": "Email and password are required"}), 400
         
+        # Items the shopper put in the cart before logging in
+        guest_cart = None
+        if data.get('guestCart') is not None:
+            guest_cart, error = parse_cart_operations(data['guestCart'], default_op="add")
+            if error:
+                return jsonify({"error": f"Invalid guestCart: {error}"}), 400
+        
         user = user_model.get_by_email(email)
         
         if not user:
-            print(f"Login failed: User with email {email} not found")
+            # Addresses are personal data and stay out of the logs
+            log.info("auth.login_failed", "Login failed", reason="unknown_email")
             # Use a generic message to prevent email enumeration
             return jsonify({"error": "Invalid credentials"}), 401
         
         # Debug password verification
-        print(f"Attempting to verify password for {email}")
+        log.debug("auth.login_attempt", "Verifying password", user_id=user["id"])
         stored_password = user["password"]
         
         # Verify password
         password_valid = verify_password(stored_password, password)
         if not password_valid:
-            print(f"Login failed: Invalid password for {email}")
+            log.info("auth.login_failed", "Login failed", reason="bad_password", user_id=user["id"])
             return jsonify({"error": "Invalid credentials"}), 401
         
-        print(f"Login successful for {email}")
+        log.info("auth.login", "Login successful", user_id=user["id"])
+        
+        # Upgrade hashes made with an older cost factor while we have the password
+        if password_needs_rehash(stored_password):
+            try:
+                user_model.update_password(user["id"], hash_password(password))
+            except HasherBusy:
+                pass  # Try again on the next login
         
         # Create access token
-        token = create_access_token({"sub": user["id"]})
+        token = create_access_token(token_claims(user))
+        user_info = {
+            "id": user["id"],
+            "name": user["name"],
+            "email": user["email"]
+        }
         
-        response = jsonify({
-            "token": token,
-            "user": {
-                "id": user["id"],
-                "name": user["name"],
-                "email": user["email"]
-            }
-        })
+        if guest_cart:
+            adjusted = cart_model.merge(user["id"], [(product_id, quantity) for _, product_id, quantity in guest_cart])
+            response = serializers.respond(
+                token=token,
+                user=user_info,
+                cart=serializers.many(serializers.cart_item, cart_model.get_items(user["id"])),
+                cartAdjusted=format_cart_adjustments(adjusted)
+            )
+        else:
+            response = jsonify({
+                "token": token,
+                "user": user_info
+            })
         
         # Set cookie with token for client-side storage
         response.set_cookie(
@@ -148,8 +388,10 @@ def login():
         )
         
         return response
+    except HasherBusy:
+        return jsonify({"error": "Server is busy. Please try again."}), 503
     except Exception as e:
-        print(f"Login error: {e}")
+        log.exception("auth.login_error", "Login error")
         return jsonify({"error": "Server error during login. Please try again."}), 500
 
 @app.route('/api/auth/register', methods=['POST'])
@@ -174,7 +416,7 @@ def register():
         return jsonify({"error": "Error creating user"}), 500
     
     # Create access token
-    token = create_access_token({"sub": user["id"]})
+    token = create_access_token(token_claims(user))
     
     return jsonify({
         "token": token,
@@ -196,85 +438,106 @@ def get_me():
         }
     })
 
+@app.route('/api/auth/logout', methods=['POST'])
+@login_required
+def logout():
+    payload = decode_token(request.token)
+    if payload:
+        token_revocation.revoke_token(payload)
+    forget_token(request.token)
+    
+    response = jsonify({"message": "Logged out"})
+    response.delete_cookie('auth_token')
+    return response
+
+@app.route('/api/auth/password', methods=['POST'])
+@login_required
+def change_password():
+    data = request.json or {}
+    current_password = data.get('currentPassword')
+    new_password = data.get('newPassword')
+    
+    if not current_password or not new_password:
+        return jsonify({"error": "Current and new password are required"}), 400
+    
+    user = user_model.get_by_email(request.user["email"])
+    if not user or not verify_password(user["password"], current_password):
+        return jsonify({"error": "Invalid credentials"}), 401
+    
+    user_model.update_password(user["id"], hash_password(new_password))
+    
+    # Sign out every session issued before the change, then start a new one
+    token_revocation.revoke_user_tokens(user["id"], time.time() + TOKEN_EXPIRY)
+    forget_user_tokens(user["id"])
+    token = create_access_token(token_claims(user))
+    
+    return jsonify({
+        "token": token,
+        "user": {
+            "id": user["id"],
+            "name": user["name"],
+            "email": user["email"]
+        }
+    })
+
 # Categories endpoints
 @app.route('/api/categories', methods=['GET'])
+@catalog_conditional("categories")
 def get_categories():
     categories = category_model.get_all()
     return jsonify({"categories": categories})
 
 # Products endpoints
 @app.route('/api/products', methods=['GET'])
+@catalog_conditional("products")
 def get_products():
     try:
         category = request.args.get('category')
         use_case = request.args.get('useCase')
         search = request.args.get('search')
-        limit = request.args.get('limit', type=int)
+        sort = request.args.get('sort')
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', default=PRODUCTS_PAGE_SIZE, type=int)
         offset = request.args.get('offset', default=0, type=int)
         
-        products = product_model.get_all(
-            limit=limit,
-            offset=offset,
-            category_slug=category,
-            use_case_slug=use_case,
-            search=search
-        )
+        # Keep every page bounded, whatever the client asks for
+        limit = max(1, min(limit, MAX_PRODUCTS_PAGE_SIZE))
         
-        # Format response to match frontend expectations
-        formatted_products = []
-        for product in products:
-            # Make sure image is always defined to prevent client errors
-            image = product.get("image") or "/placeholder.svg"
-            
-            formatted_products.append({
-                "id": str(product["id"]),
-                "name": product["name"],
-                "description": product["description"],
-                "price": product["price"],
-                "category": product["category_slug"],
-                "useCase": [uc["slug"] for uc in product["use_cases"]],
-                "image": image,
-                "soldCount": product["sold_count"],
-                "stock": product["stock"],
-                "treatmentFor": product["treatment_for"]
-            })
+        try:
+            products, next_cursor = product_model.get_page(
+                limit=limit,
+                cursor=cursor,
+                offset=max(offset, 0),
+                category_slug=category,
+                use_case_slug=use_case,
+                search=search,
+                sort=sort
+            )
+        except ValueError as e:
+            return jsonify({"products": [], "error": str(e)}), 400
         
-        return jsonify({"products": formatted_products})
+        return serializers.respond(
+            products=serializers.many(serializers.search_result if search else serializers.product, products),
+            nextCursor=next_cursor
+        )
     except Exception as e:
-        print(f"Error getting products: {e}")
-        return jsonify({"products": [], "error": str(e)})
+        log.exception("products.error", "Error getting products")
+        return jsonify({"products": [], "error": str(e)}), 500
 
 @app.route('/api/products/featured', methods=['GET'])
+@catalog_conditional("products")
 def get_featured_products():
     try:
         limit = request.args.get('limit', default=6, type=int)
         products = product_model.get_featured(limit=limit)
         
-        # Format response to match frontend expectations
-        formatted_products = []
-        for product in products:
-            # Make sure image is always defined to prevent client errors
-            image = product.get("image") or "/placeholder.svg"
-            
-            formatted_products.append({
-                "id": str(product["id"]),
-                "name": product["name"],
-                "description": product["description"],
-                "price": product["price"],
-                "category": product["category_slug"],
-                "useCase": [uc["slug"] for uc in product["use_cases"]],
-                "image": image,
-                "soldCount": product["sold_count"],
-                "stock": product["stock"],
-                "treatmentFor": product["treatment_for"]
-            })
-        
-        return jsonify({"products": formatted_products})
+        return serializers.respond(products=serializers.many(serializers.product, products))
     except Exception as e:
-        print(f"Error getting featured products: {e}")
-        return jsonify({"products": [], "error": str(e)})
+        log.exception("products.error", "Error getting featured products")
+        return jsonify({"products": [], "error": str(e)}), 500
 
 @app.route('/api/products/<product_id>', methods=['GET'])
+@catalog_conditional("product")
 def get_product(product_id):
     try:
         product = product_model.get_by_id(product_id)
@@ -282,89 +545,87 @@ def get_product(product_id):
         if not product:
             return jsonify({"error": "Product not found"}), 404
         
-        # Make sure image is always defined to prevent client errors
-        image = product.get("image") or "/placeholder.svg"
-        
-        # Format response to match frontend expectations
-        formatted_product = {
-            "id": str(product["id"]),
-            "name": product["name"],
-            "description": product["description"],
-            "price": product["price"],
-            "category": product["category_slug"],
-            "useCase": [uc["slug"] for uc in product["use_cases"]],
-            "image": image,
-            "soldCount": product["sold_count"],
-            "stock": product["stock"],
-            "treatmentFor": product["treatment_for"]
-        }
-        
-        return jsonify({"product": formatted_product})
+        return serializers.respond(product=serializers.one(serializers.product, product))
     except Exception as e:
-        print(f"Error getting product: {e}")
+        log.exception("products.error", "Error getting product", product_id=product_id)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/products/<product_id>/related', methods=['GET'])
+@catalog_conditional("products")
 def get_related_products(product_id):
     try:
         limit = request.args.get('limit', default=4, type=int)
         products = product_model.get_related(product_id, limit=limit)
         
-        # Format response to match frontend expectations
-        formatted_products = []
-        for product in products:
-            # Make sure image is always defined to prevent client errors
-            image = product.get("image") or "/placeholder.svg"
-            
-            formatted_products.append({
-                "id": str(product["id"]),
-                "name": product["name"],
-                "description": product["description"],
-                "price": product["price"],
-                "category": product["category_slug"],
-                "useCase": [uc["slug"] for uc in product["use_cases"]],
-                "image": image,
-                "soldCount": product["sold_count"],
-                "stock": product["stock"],
-                "treatmentFor": product["treatment_for"]
-            })
-        
-        return jsonify({"products": formatted_products})
+        return serializers.respond(products=serializers.many(serializers.product, products))
     except Exception as e:
-        print(f"Error getting related products: {e}")
-        return jsonify({"products": [], "error": str(e)})
+        log.exception("products.error", "Error getting related products", product_id=product_id)
+        return jsonify({"products": [], "error": str(e)}), 500
 
 # Use Cases endpoints
 @app.route('/api/usecases', methods=['GET'])
+@catalog_conditional("usecases")
 def get_use_cases():
     use_cases = use_case_model.get_all()
     return jsonify({"useCases": use_cases})
 
 # Cart endpoints
+def parse_product_id(raw):
+    # Accept "prod-12", "12" and 12; raise ValueError for anything else
+    if isinstance(raw, bool):
+        raise ValueError(raw)
+    if isinstance(raw, str) and raw.startswith('prod-'):
+        raw = raw[len('prod-'):]
+    return int(raw)
+
+def parse_cart_operations(raw, default_op=None):
+    """
+    Validate a list of {op, productId, quantity}; return ([(op, product_id, quantity)], error)
+    """
+    if not isinstance(raw, list):
+        return None, "expected a list of items"
+    if len(raw) > MAX_CART_OPERATIONS:
+        return None, f"at most {MAX_CART_OPERATIONS} items per request"
+    
+    operations = []
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict):
+            return None, f"item {index} is not an object"
+        op = item.get('op', default_op)
+        if op not in Cart.OPERATIONS:
+            return None, f"item {index}: op must be one of {', '.join(Cart.OPERATIONS)}"
+        try:
+            product_id = parse_product_id(item.get('productId'))
+        except (ValueError, TypeError):
+            return None, f"item {index}: invalid product ID {item.get('productId')}"
+        quantity = item.get('quantity', 1 if op == "add" else 0)
+        minimum = 1 if op == "add" else 0
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < minimum:
+            return None, f"item {index}: quantity must be an integer of at least {minimum}"
+        operations.append((op, product_id, quantity))
+    return operations, None
+
+def format_stock_errors(errors):
+    return [
+        {"productId": f"prod-{e['product_id']}", "requested": e["requested"], "available": e["available"]}
+        for e in errors
+    ]
+
+def format_cart_adjustments(adjustments):
+    return [
+        {"productId": f"prod-{a['product_id']}", "requested": a["requested"], "quantity": a["quantity"]}
+        for a in adjustments
+    ]
+
 @app.route('/api/cart', methods=['GET'])
 @login_required
 def get_cart():
     try:
         items = cart_model.get_items(request.user_id)
         
-        # Format response to match frontend expectations
-        formatted_items = []
-        for item in items:
-            # Make sure image is always defined to prevent client errors
-            image = item.get("image") or "/placeholder.svg"
-            
-            formatted_items.append({
-                "id": str(item["product_id"]),
-                "name": item["name"],
-                "price": item["price"],
-                "quantity": item["quantity"],
-                "image": image,
-                "stock": item["stock"]
-            })
-        
-        return jsonify({"items": formatted_items})
+        return serializers.respond(items=serializers.many(serializers.cart_item, items))
     except Exception as e:
-        print(f"Error getting cart: {e}")
+        log.exception("cart.error", "Error getting cart", user_id=request.user_id)
         return jsonify({"items": [], "error": str(e)})
 
 @app.route('/api/cart/add', methods=['POST'])
@@ -400,7 +661,7 @@ def add_to_cart():
     
     # Add to cart
     try:
-        print(f"Adding product ID {product_id} to cart for user {request.user_id}")
+        log.info("cart.add", "Adding product to cart", product_id=product_id, user_id=request.user_id)
         cart_model.add_item(request.user_id, product_id, quantity)
         return jsonify({
             "message": "Product added to cart",
@@ -408,7 +669,7 @@ def add_to_cart():
             "quantity": quantity
         })
     except Exception as e:
-        print(f"Error adding product {product_id} to cart: {str(e)}")
+        log.exception("cart.error", "Error adding product to cart", product_id=product_id, user_id=request.user_id)
         return jsonify({"error": f"Error adding product to cart: {str(e)}"}), 500
 
 @app.route('/api/cart/update', methods=['PUT'])
@@ -475,6 +736,45 @@ def remove_from_cart():
     else:
         return jsonify({"error": "Error removing product from cart"}), 500
 
+# Apply several add/set/remove operations in one transaction and return the cart
+@app.route('/api/cart/batch', methods=['POST'])
+@login_required
+def batch_cart():
+    data = request.get_json(silent=True) or {}
+    operations, error = parse_cart_operations(data.get('operations'))
+    if error:
+        return jsonify({"error": f"Invalid operations: {error}"}), 400
+    
+    try:
+        cart_model.apply(request.user_id, operations)
+    except CartOperationError as e:
+        return jsonify({
+            "error": "Cart was not changed",
+            "details": [
+                {**{key: value for key, value in item.items() if key != "product_id"},
+                 "productId": f"prod-{item['product_id']}"}
+                for item in e.errors
+            ]
+        }), 400
+    
+    log.info("cart.batch", "Applied cart operations", user_id=request.user_id, operations=len(operations))
+    return serializers.respond(items=serializers.many(serializers.cart_item, cart_model.get_items(request.user_id)))
+
+# Merge a guest cart into the user's cart; quantities are capped at stock
+@app.route('/api/cart/merge', methods=['POST'])
+@login_required
+def merge_cart():
+    data = request.get_json(silent=True) or {}
+    operations, error = parse_cart_operations(data.get('items'), default_op="add")
+    if error:
+        return jsonify({"error": f"Invalid items: {error}"}), 400
+    
+    adjusted = cart_model.merge(request.user_id, [(product_id, quantity) for _, product_id, quantity in operations])
+    return serializers.respond(
+        items=serializers.many(serializers.cart_item, cart_model.get_items(request.user_id)),
+        adjusted=format_cart_adjustments(adjusted)
+    )
+
 @app.route('/api/cart/clear', methods=['DELETE'])
 @login_required
 def clear_cart():
@@ -485,40 +785,59 @@ def clear_cart():
     else:
         return jsonify({"message": "Cart was already empty"})
 
+# Checkout endpoints
+# Start checkout: hold the cart's stock for INVENTORY_HOLD_SECONDS
+@app.route('/api/checkout/reserve', methods=['POST'])
+@login_required
+def reserve_checkout():
+    try:
+        reservation = checkout_service.reserve(request.user_id)
+    except EmptyCartError:
+        return jsonify({"error": "Cart is empty. Please add items to your cart before checking out."}), 400
+    except InsufficientStockError as e:
+        return jsonify({"error": "Not enough stock available", "details": format_stock_errors(e.errors)}), 409
+    
+    return jsonify({"reservation": {
+        "expiresAt": datetime.utcfromtimestamp(reservation["expires_at"]).isoformat(timespec="seconds") + "Z",
+        "items": [
+            {"productId": f"prod-{item['product_id']}", "quantity": item["quantity"]}
+            for item in reservation["items"]
+        ]
+    }})
+
+# Leave checkout without ordering; the holds would otherwise lapse on their own
+@app.route('/api/checkout/reserve', methods=['DELETE'])
+@login_required
+def release_checkout():
+    return jsonify({"released": inventory.release(request.user_id)})
+
 # Orders endpoints
 @app.route('/api/orders', methods=['GET'])
 @login_required
 def get_orders():
-    orders = order_model.get_user_orders(request.user_id)
-    
-    # Format response to match frontend expectations
-    formatted_orders = []
-    for order in orders:
-        formatted_items = []
-        for item in order["items"]:
-            # Make sure image is always defined
-            image = item.get("image") or "/placeholder.svg"
-            
-            formatted_items.append({
-                "productId": str(item["product_id"]),
-                "name": item["name"],
-                "price": item["price"],
-                "quantity": item["quantity"],
-                "image": image
-            })
-        
-        formatted_orders.append({
-            "id": str(order["id"]),
-            "userId": str(order["user_id"]),
-            "items": formatted_items,
-            "total": order["total"],
-            "status": order["status"],
-            "createdAt": order["created_at"],
-            "address": order["address"],
-            "paymentMethod": order["payment_method"]
-        })
+    limit = request.args.get('limit', default=ORDERS_PAGE_SIZE, type=int)
+    cursor = request.args.get('cursor')
+    summary = request.args.get('summary', '').lower() in ('1', 'true', 'yes')
     
-    return jsonify({"orders": formatted_orders})
+    # Keep every page bounded, whatever the client asks for
+    limit = max(1, min(limit, MAX_ORDERS_PAGE_SIZE))
+    
+    try:
+        after = Order.decode_page_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    
+    orders, next_cursor = order_model.get_user_orders_page(
+        request.user_id,
+        limit=limit,
+        after=after,
+        summary=summary
+    )
+    
+    return serializers.respond(
+        orders=serializers.many(serializers.order_summary if summary else serializers.order, orders),
+        nextCursor=next_cursor
+    )
 
 @app.route('/api/orders/<order_id>', methods=['GET'])
 @login_required
@@ -528,32 +847,7 @@ def get_order(order_id):
     if not order:
         return jsonify({"error": "Order not found"}), 404
     
-    # Format response to match frontend expectations
-    formatted_items = []
-    for item in order["items"]:
-        # Make sure image is always defined
-        image = item.get("image") or "/placeholder.svg"
-        
-        formatted_items.append({
-            "productId": str(item["product_id"]),
-            "name": item["name"],
-            "price": item["price"],
-            "quantity": item["quantity"],
-            "image": image
-        })
-    
-    formatted_order = {
-        "id": str(order["id"]),
-        "userId": str(order["user_id"]),
-        "items": formatted_items,
-        "total": order["total"],
-        "status": order["status"],
-        "createdAt": order["created_at"],
-        "address": order["address"],
-        "paymentMethod": order["payment_method"]
-    }
-    
-    return jsonify({"order": formatted_order})
+    return serializers.respond(order=serializers.one(serializers.order, order))
 
 @app.route('/api/orders', methods=['POST'])
 @login_required
@@ -565,79 +859,32 @@ def create_order():
     if not address or not payment_method:
         return jsonify({"error": "Address and payment method are required"}), 400
     
-    # Get cart items
-    cart_items = cart_model.get_items(request.user_id)
-    
-    if not cart_items:
-        # More descriptive error message for empty cart
-        return jsonify({"error": "Cart is empty. Please add items to your cart before placing an order."}), 400
-    
-    # Log cart items for debugging
-    print(f"Creating order for user {request.user_id} with {len(cart_items)} items in cart.")
-    for item in cart_items:
-        print(f"  - Product {item['product_id']}: {item['name']} (Qty: {item['quantity']}, Price: {item['price']})")
-    
-    # Calculate total
-    total = sum(item["price"] * item["quantity"] for item in cart_items)
-    
-    # Create order
+    # Create the order, its items, the stock updates and the cart clear in one transaction
     try:
-        order_id = order_model.create(
+        order = checkout_service.place_order(
             user_id=request.user_id,
-            total=total,
             address=address,
             payment_method=payment_method
         )
-        
-        # Add order items
-        for item in cart_items:
-            # Make sure image is always defined
-            image = item.get("image") or "/placeholder.svg"
-            
-            order_model.add_item(
-                order_id=order_id,
-                product_id=item["product_id"],
-                name=item["name"],
-                price=item["price"],
-                quantity=item["quantity"],
-                image=image
-            )
-        
-        # Clear cart after successful order creation
-        cart_model.clear(request.user_id)
-        
-        # Get created order
-        order = order_model.get_by_id(order_id)
-        
-        # Format response to match frontend expectations
-        formatted_items = []
-        for item in order["items"]:
-            # Make sure image is always defined
-            image = item.get("image") or "/placeholder.svg"
-            
-            formatted_items.append({
-                "productId": f"prod-{item['product_id']}",  # Format product ID as expected by frontend
-                "name": item["name"],
-                "price": item["price"],
-                "quantity": item["quantity"],
-                "image": image
-            })
-        
-        formatted_order = {
-            "id": f"order-{order['id']}",  # Format order ID as expected by frontend
-            "userId": str(order["user_id"]),
-            "items": formatted_items,
-            "total": order["total"],
-            "status": order["status"],
-            "createdAt": order["created_at"],
-            "address": order["address"],
-            "paymentMethod": order["payment_method"]
-        }
-        
-        return jsonify({"order": formatted_order}), 201
+    except EmptyCartError:
+        # More descriptive error message for empty cart
+        return jsonify({"error": "Cart is empty. Please add items to your cart before placing an order."}), 400
+    except InsufficientStockError as e:
+        log.info("order.out_of_stock", "Order rejected for stock", user_id=request.user_id, products=len(e.errors))
+        return jsonify({"error": "Not enough stock available", "details": format_stock_errors(e.errors)}), 409
     except Exception as e:
-        print(f"Error creating order: {str(e)}")
+        log.exception("order.error", "Error creating order", user_id=request.user_id)
         return jsonify({"error": f"Error creating order: {str(e)}"}), 500
+    
+    log.info("order.created", "Created order", order_id=order["id"], user_id=request.user_id,
+             items=len(order["items"]), total=order["total"])
+    if log.debug_enabled:
+        log.debug("order.items", "Order items", order_id=order["id"], items=[
+            {"productId": item["product_id"], "quantity": item["quantity"], "price": item["price"]}
+            for item in order["items"]
+        ])
+    
+    return serializers.respond(status=201, order=serializers.one(serializers.placed_order, order))
 
 @app.route('/api/orders/<order_id>/status', methods=['PUT'])
 @login_required
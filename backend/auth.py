@@ -1,26 +1,132 @@
 import bcrypt
 import jwt
 import os
+import hashlib
+import secrets
+import time
+import threading
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from cache import LRUCache
+from logs import get_logger
+
 load_dotenv()
 
+log = get_logger("auth")
+
 # Use an environment variable for the secret key or create a default one
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "fertishop-super-secret-key")
 TOKEN_EXPIRY = 24 * 60 * 60  # 24 hours in seconds
 
+# Tokens whose signature has already been verified, keyed by a digest of the
+# token and dropped at the token's own expiry
+_verified_tokens = LRUCache(max_size=int(os.getenv("TOKEN_CACHE_SIZE", "10000")))
+
+# Optional callable(payload) -> bool that reports revoked tokens
+_revocation_check = None
+
+
+class HasherBusy(Exception):
+    """
+    Raised when password hashing has no room for another request
+    """
+
+
+class PasswordHasher:
+    """
+    Limits how many bcrypt calls run at once.
+
+    bcrypt runs on the calling request thread and releases the GIL while it
+    works. At most workers calls hash at a time, and up to max_pending more
+    wait their turn; anything beyond that is rejected with HasherBusy at once,
+    so a login burst answers 503 instead of piling up request threads.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=16):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._running = threading.BoundedSemaphore(workers)
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self._outstanding = 0
+
+        # Metrics
+        self.completed = 0
+        self.rejected = 0
+        self.total_time = 0.0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy("Password hashing is at capacity")
+
+        with self._lock:
+            self._outstanding += 1
+        try:
+            start = time.perf_counter()
+            with self._running:
+                result = fn(*args)
+            with self._lock:
+                self.completed += 1
+                self.total_time += time.perf_counter() - start
+            return result
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        """
+        Hash a password with the configured cost factor
+        """
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, hashed_password, password):
+        """
+        Check a password against a stored hash
+        """
+        return self._run(bcrypt.checkpw, password, hashed_password)
+
+    def needs_rehash(self, hashed_password):
+        """
+        Return True if a stored hash was made with a different cost factor
+        """
+        # bcrypt hashes look like $2b$12$<salt+hash>
+        try:
+            return int(hashed_password.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "maxPending": self.max_pending,
+                "outstanding": self._outstanding,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                # Includes time spent queued behind other hashes
+                "avgMs": round(self.total_time * 1000 / self.completed, 3) if self.completed else 0.0
+            }
+
+
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    workers=int(os.getenv("HASHER_WORKERS", str(os.cpu_count() or 2))),
+    max_pending=int(os.getenv("HASHER_MAX_PENDING", "16"))
+)
+
 
 def hash_password(password):
     """
     Hash a password for storing
     """
-    # Generate a salt
-    salt = bcrypt.gensalt()
-    # Hash the password with the salt
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    # Return the hashed password as a string
-    return hashed.decode('utf-8')
+    return password_hasher.hash(password)
 
 
 def verify_password(hashed_password, password):
@@ -35,12 +141,21 @@ def verify_password(hashed_password, password):
     
     # Verify the password against the hash
     try:
-        return bcrypt.checkpw(password, hashed_password)
+        return password_hasher.verify(hashed_password, password)
+    except HasherBusy:
+        raise
     except Exception as e:
-        print(f"Error verifying password: {e}")
+        log.error("auth.verify_error", "Error verifying password", error=str(e))
         return False
 
 
+def password_needs_rehash(hashed_password):
+    """
+    Check whether a stored hash should be upgraded to the current cost factor
+    """
+    return password_hasher.needs_rehash(hashed_password)
+
+
 def create_access_token(payload):
     """
     Create a JWT token
@@ -48,11 +163,18 @@ def create_access_token(payload):
     # Set expiry time
     expiry = datetime.utcnow() + timedelta(seconds=TOKEN_EXPIRY)
     
-    # Add expiry time to payload
+    # Add expiry, issue time and a unique id (used to revoke this one token).
+    # iat keeps sub-second precision so a password change can revoke every
+    # earlier token without also revoking the one issued right after it.
     token_payload = {
         **payload,
-        'exp': expiry
+        'exp': expiry,
+        'iat': time.time(),
+        'jti': secrets.token_urlsafe(12)
     }
+    # RFC 7519 makes sub a string, and PyJWT 2.10+ rejects any other type
+    if 'sub' in token_payload:
+        token_payload['sub'] = str(token_payload['sub'])
     
     # Create token
     token = jwt.encode(token_payload, SECRET_KEY, algorithm='HS256')
@@ -61,23 +183,70 @@ def create_access_token(payload):
     return token
 
 
+def _token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
 def decode_token(token):
     """
     Decode and verify JWT token
     """
-    try:
-        # Decode token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        # Token has expired
-        print("Token expired")
-        return None
-    except jwt.InvalidTokenError as e:
-        # Invalid token
-        print(f"Invalid token: {e}")
+    key = _token_key(token)
+    payload = _verified_tokens.get(key)
+    
+    if payload is None:
+        try:
+            # Decode token
+            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            # Token has expired
+            log.debug("auth.token_expired", "Token expired")
+            return None
+        except jwt.InvalidTokenError as e:
+            # Invalid token
+            log.info("auth.token_invalid", "Invalid token", error=str(e))
+            return None
+        except Exception as e:
+            # Other errors
+            log.exception("auth.token_error", "Error decoding token")
+            return None
+        
+        # Callers work with the integer user id
+        if isinstance(payload.get('sub'), str) and payload['sub'].isdigit():
+            payload['sub'] = int(payload['sub'])
+        
+        # Cache the verified payload until the token itself expires
+        ttl = payload['exp'] - time.time() if 'exp' in payload else None
+        if ttl is None or ttl > 0:
+            _verified_tokens.set(key, payload, ttl=ttl)
+    
+    if _revocation_check is not None and _revocation_check(payload):
         return None
-    except Exception as e:
-        # Other errors
-        print(f"Error decoding token: {e}")
-        return None 
\ No newline at end of file
+    
+    return payload
+
+
+def set_revocation_check(check):
+    """
+    Install a callable(payload) -> bool consulted on every decode
+    """
+    global _revocation_check
+    _revocation_check = check
+
+
+def forget_token(token):
+    """
+    Drop one token from the verified-token cache
+    """
+    return _verified_tokens.delete(_token_key(token))
+
+
+def forget_user_tokens(user_id):
+    """
+    Drop every cached token issued to a user; return how many were dropped
+    """
+    return _verified_tokens.delete_where(lambda payload: payload.get('sub') == user_id)
+
+
+def token_cache_stats():
+    return _verified_tokens.stats()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the backend directory to the path so we can import modules
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+
+def time_calls(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure auth overhead per authenticated request")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens fertishop.db in the working directory
+        os.chdir(tmp)
+        import app as shop
+        from auth import create_access_token
+        from cache import LRUCache
+
+        user = shop.user_model.create("Bench User", "bench@example.com", "not-a-real-hash")
+        legacy_token = create_access_token({"sub": user["id"]})
+        claims_token = create_access_token(shop.token_claims(user))
+        client = shop.app.test_client()
+
+        scenarios = [
+            ("id-only token, no user cache", legacy_token, None),
+            ("id-only token, user cache", legacy_token, LRUCache(max_size=1000, ttl=60)),
+            ("claims token", claims_token, None),
+        ]
+
+        print(f"{'scenario':<32} {'auth us':>9} {'request us':>11} {'queries':>8}")
+        for name, token, cache in scenarios:
+            shop.user_model.cache = cache
+            headers = {"Authorization": f"Bearer {token}"}
+
+            # Warm up caches and the test client before timing
+            time_calls(lambda: client.get("/api/auth/me", headers=headers), 200)
+
+            auth_time = time_calls(lambda: shop.get_user_from_token(token), args.iterations)
+            request_time = time_calls(
+                lambda: client.get("/api/auth/me", headers=headers), args.iterations
+            )
+            queries = client.get("/api/auth/me", headers=headers).headers["X-Query-Count"]
+
+            print(f"{name:<32} {auth_time * 1e6:>9.1f} {request_time * 1e6:>11.1f} {queries:>8}")
+
+        shop.db.close()
+        os.chdir(BACKEND_DIR)
+
+
+if __name__ == "__main__":
+    main()
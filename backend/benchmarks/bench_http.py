@@ -0,0 +1,365 @@
+"""
+End-to-end load test for the shop API.
+
+Starts the app on a fresh copy of the seeded database and drives it with
+virtual shoppers. Each shopper registers once, then picks weighted actions:
+catalog browsing, search, featured and related lookups, product pages, login,
+cart add/update/remove and checkout. Throughput and p50/p95/p99 latency are
+reported per action.
+
+Results can be saved as JSON and compared with an earlier run; an action whose
+p95 latency grew, or whose throughput fell, by more than --max-regression fails
+the run with exit status 1.
+
+Usage:
+    python benchmarks/bench_http.py --duration 30 --concurrency 16 --output run.json
+    python benchmarks/bench_http.py --baseline run.json
+    python benchmarks/bench_http.py --compare old.json new.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from bench_server import BACKEND_DIR, SERVERS, percentile, wait_until_up
+
+import snapshot
+
+# Relative weights of shopper actions; override with --mix "search=20,checkout=0"
+DEFAULT_MIX = {
+    "browse": 25,
+    "product": 20,
+    "search": 10,
+    "featured": 8,
+    "related": 8,
+    "categories": 4,
+    "cart_add": 10,
+    "cart_update": 4,
+    "cart_remove": 3,
+    "cart_view": 4,
+    "checkout": 2,
+    "login": 2,
+}
+
+SEARCH_TERMS = ["soil", "organic", "growth", "root", "nutrient", "compost", "bloom", "nitrogen", "zzzz"]
+
+
+class Shopper:
+    """
+    One virtual user with its own token, cart and random stream
+    """
+
+    def __init__(self, port, index, seed, catalog):
+        self.port = port
+        self.rng = random.Random(seed * 1000003 + index)
+        self.email = f"loadtest-{seed}-{index}@example.com"
+        self.password = "loadtest-password"
+        self.catalog = catalog
+        self.token = None
+        self.cart = set()
+
+    def request(self, method, path, body=None, auth=False):
+        headers = {"Accept-Encoding": "gzip"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if auth:
+            headers["Authorization"] = f"Bearer {self.token}"
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            return response.status, data
+        finally:
+            conn.close()
+
+    def register(self):
+        status, data = self.request("POST", "/api/auth/register",
+                                    {"name": "Load Test", "email": self.email, "password": self.password})
+        if status != 201:
+            raise RuntimeError(f"registering {self.email} failed with {status}")
+        self.token = json.loads(data)["token"]
+
+    # Actions return the response status
+
+    def browse(self):
+        category = self.rng.choice(self.catalog["categories"] + [None, None])
+        path = "/api/products?limit=12"
+        if category:
+            path += f"&category={category}"
+        if self.rng.random() < 0.3:
+            path += "&sort=" + self.rng.choice(["price-asc", "price-desc"])
+        return self.request("GET", path)[0]
+
+    def product(self):
+        return self.request("GET", f"/api/products/{self._product_id()}")[0]
+
+    def search(self):
+        return self.request("GET", f"/api/products?search={self.rng.choice(SEARCH_TERMS)}")[0]
+
+    def featured(self):
+        return self.request("GET", "/api/products/featured")[0]
+
+    def related(self):
+        return self.request("GET", f"/api/products/{self._product_id()}/related")[0]
+
+    def categories(self):
+        return self.request("GET", "/api/categories")[0]
+
+    def login(self):
+        status, data = self.request("POST", "/api/auth/login", {"email": self.email, "password": self.password})
+        if status == 200:
+            self.token = json.loads(data)["token"]
+        return status
+
+    def cart_add(self):
+        product_id = self._product_id()
+        status = self.request("POST", "/api/cart/add", {"productId": product_id, "quantity": 1}, auth=True)[0]
+        if status == 200:
+            self.cart.add(product_id)
+        return status
+
+    def cart_update(self):
+        if not self.cart:
+            return self.cart_add()
+        product_id = self.rng.choice(sorted(self.cart))
+        return self.request("PUT", "/api/cart/update",
+                            {"productId": product_id, "quantity": self.rng.randint(1, 3)}, auth=True)[0]
+
+    def cart_remove(self):
+        if not self.cart:
+            return self.cart_add()
+        product_id = self.rng.choice(sorted(self.cart))
+        status = self.request("DELETE", f"/api/cart/remove?productId={product_id}", auth=True)[0]
+        self.cart.discard(product_id)
+        return status
+
+    def cart_view(self):
+        return self.request("GET", "/api/cart", auth=True)[0]
+
+    def checkout(self):
+        if not self.cart:
+            return self.cart_add()
+        status = self.request("POST", "/api/orders", {"address": "1 Load Test Lane", "paymentMethod": "card"},
+                              auth=True)[0]
+        if status == 201:
+            self.cart.clear()
+        return status
+
+    def _product_id(self):
+        # Popular products get most of the traffic
+        ids = self.catalog["products"]
+        return ids[min(int(self.rng.paretovariate(1.2)) - 1, len(ids) - 1)]
+
+
+def parse_mix(spec):
+    mix = dict(DEFAULT_MIX)
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, weight = item.split("=", 1)
+            if name.strip() not in DEFAULT_MIX:
+                raise SystemExit(f"unknown action in --mix: {name}")
+            mix[name.strip()] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def load_catalog(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("GET", "/api/products?limit=100")
+    products = json.loads(conn.getresponse().read())["products"]
+    conn.close()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("GET", "/api/categories")
+    categories = json.loads(conn.getresponse().read())["categories"]
+    conn.close()
+    return {"products": [p["id"] for p in products], "categories": [c["slug"] for c in categories]}
+
+
+def drive(shoppers, mix, duration):
+    """
+    Run every shopper on its own thread for duration seconds; return samples per action
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def run(shopper):
+        local = {name: [] for name in names}
+        failed = {name: 0 for name in names}
+        while time.monotonic() < deadline:
+            name = shopper.rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = getattr(shopper, name)()
+            except OSError:
+                status = None
+            elapsed = time.perf_counter() - start
+            if status is None or status >= 400:
+                failed[name] += 1
+            else:
+                local[name].append(elapsed)
+        with lock:
+            for name in names:
+                samples[name].extend(local[name])
+                errors[name] += failed[name]
+
+    threads = [threading.Thread(target=run, args=(shopper,)) for shopper in shoppers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2),
+        "meanMs": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50Ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95Ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def run_benchmark(args):
+    mix = parse_mix(args.mix)
+    with snapshot.isolated_database() as db_file:
+        # Enough stock that checkouts measure the write path, not sold-out errors
+        with sqlite3.connect(db_file) as conn:
+            conn.execute("UPDATE products SET stock = 1000000000")
+
+        env = {**os.environ, "PYTHONPATH": BACKEND_DIR, "LOG_LEVEL": "WARNING",
+               "BCRYPT_ROUNDS": str(args.bcrypt_rounds)}
+        code = SERVERS[args.server].format(port=args.port, workers=args.workers, threads=args.threads)
+        process = subprocess.Popen(
+            [sys.executable, "-c", code], cwd=os.path.dirname(db_file), env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_up(args.port)
+            catalog = load_catalog(args.port)
+            shoppers = [Shopper(args.port, n, args.seed, catalog) for n in range(args.concurrency)]
+            for shopper in shoppers:
+                shopper.register()
+
+            drive(shoppers, mix, args.warmup)
+            start = time.perf_counter()
+            samples, errors = drive(shoppers, mix, args.duration)
+            elapsed = time.perf_counter() - start
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+
+    everything = [value for values in samples.values() for value in values]
+    return {
+        "startedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "server": args.server,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "workers": args.workers,
+            "threads": args.threads,
+            "bcryptRounds": args.bcrypt_rounds,
+            "seed": args.seed,
+            "mix": mix,
+        },
+        "elapsed": round(elapsed, 3),
+        "total": summarize(everything, sum(errors.values()), elapsed),
+        "endpoints": {name: summarize(samples[name], errors[name], elapsed) for name in samples},
+    }
+
+
+def print_results(results):
+    print(f"{'action':<12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    rows = list(results["endpoints"].items()) + [("TOTAL", results["total"])]
+    for name, stats in rows:
+        print(f"{name:<12} {stats['rps']:>8.1f} {stats['p50Ms']:>8.2f} {stats['p95Ms']:>8.2f} "
+              f"{stats['p99Ms']:>8.2f} {stats['errors']:>7}")
+
+
+def compare(baseline, current, max_regression, min_ms=1.0):
+    """
+    Print per-action changes; return the actions that regressed beyond max_regression
+    """
+    regressions = []
+    print(f"{'action':<12} {'p95 ms':>17} {'change':>8} {'req/s':>17} {'change':>8}")
+    for name, stats in list(current["endpoints"].items()) + [("TOTAL", current["total"])]:
+        old = baseline["total"] if name == "TOTAL" else baseline["endpoints"].get(name)
+        if not old or not old["requests"] or not stats["requests"]:
+            continue
+        p95_change = (stats["p95Ms"] - old["p95Ms"]) / old["p95Ms"] if old["p95Ms"] else 0.0
+        rps_change = (stats["rps"] - old["rps"]) / old["rps"] if old["rps"] else 0.0
+        # Sub-millisecond p95s are mostly noise; require an absolute change too
+        slower = p95_change > max_regression and stats["p95Ms"] - old["p95Ms"] >= min_ms
+        fewer = rps_change < -max_regression
+        flag = "  REGRESSION" if slower or fewer else ""
+        print(f"{name:<12} {old['p95Ms']:>8.2f}->{stats['p95Ms']:<8.2f} {p95_change:>+8.1%} "
+              f"{old['rps']:>8.1f}->{stats['rps']:<8.1f} {rps_change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive mixed shopper traffic at the API and report latency per action")
+    parser.add_argument("--server", choices=sorted(SERVERS), default="dev")
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual shoppers")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds first")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="prefork workers")
+    parser.add_argument("--threads", type=int, default=8, help="prefork threads per worker")
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", help='action weights, e.g. "search=20,checkout=0"')
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="cost for registration and login (bench_login.py measures bcrypt itself)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with an earlier --output file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two saved runs without running the benchmark")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed fractional p95 growth or throughput drop (default 0.2)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        return 1 if compare(baseline, current, args.max_regression) else 0
+
+    results = run_benchmark(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, results, args.max_regression)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
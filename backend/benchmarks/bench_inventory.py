@@ -0,0 +1,198 @@
+"""
+Checkout contention on one hot SKU.
+
+Every thread is a shopper who repeatedly puts units of the same product in
+their cart and checks out, against a stock smaller than the total demand, so
+the product sells out mid-run. Afterwards the units sold are counted from
+order_items and compared with the starting stock: anything above it is
+oversell.
+
+Modes:
+    checked    place the order directly; stock is taken by a conditional decrement
+    reserved   hold stock at checkout start, then place the order
+    unchecked  the old unconditional decrement, for comparison
+
+The checked modes run once per --sold-counts mode: inline updates
+products.sold_count in every checkout, deferred appends to sold_count_deltas
+and folds them at the end of the run.
+
+Usage:
+    python benchmarks/bench_inventory.py [--threads 8] [--stock 500] [--attempts 100] [--sold-counts inline]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import logs
+import snapshot
+from checkout import CheckoutService, EmptyCartError
+from inventory import Inventory
+from models import Database, Cart, InsufficientStockError
+from sold_counts import SoldCounts, MODES as SOLD_COUNT_MODES
+
+MODES = ("checked", "reserved", "unchecked")
+
+
+def place_unchecked(db, user_id):
+    # What checkout did before stock was checked: take whatever the cart asks for
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(
+            "SELECT ci.product_id, p.name, p.price, ci.quantity FROM cart_items ci "
+            "JOIN products p ON ci.product_id = p.id WHERE ci.user_id = ?",
+            (user_id,)
+        )
+        items = cursor.fetchall()
+        cursor.execute(
+            "INSERT INTO orders (user_id, total, status, address, payment_method) VALUES (?, ?, 'to-pay', ?, 'cod')",
+            (user_id, sum(item["price"] * item["quantity"] for item in items), json.dumps({}))
+        )
+        order_id = cursor.lastrowid
+        for item in items:
+            cursor.execute(
+                "INSERT INTO order_items (order_id, product_id, name, price, quantity) VALUES (?, ?, ?, ?, ?)",
+                (order_id, item["product_id"], item["name"], item["price"], item["quantity"])
+            )
+            cursor.execute(
+                "UPDATE products SET sold_count = sold_count + ?, stock = stock - ? WHERE id = ?",
+                (item["quantity"], item["quantity"], item["product_id"])
+            )
+        cursor.execute("DELETE FROM cart_items WHERE user_id = ?", (user_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def run(db_file, mode, sold_count_mode, threads, stock, attempts, quantity, product_id):
+    db = Database(db_file, pool_size=threads + 1, pool_timeout=30)
+    cart = Cart(db)
+    inventory = Inventory(db, sweep_interval=0)
+    # No aggregator: the run is measured without folds, which happen once at the end
+    sold_counts = SoldCounts(db, mode=sold_count_mode)
+    checkout = CheckoutService(db, inventory, sold_counts)
+
+    conn = db.get_connection()
+    conn.execute("UPDATE products SET stock = ? WHERE id = ?", (stock, product_id))
+    conn.execute("DELETE FROM inventory_reservations")
+    start_sold = conn.execute("SELECT sold_count FROM products WHERE id = ?", (product_id,)).fetchone()[0]
+    start_orders = conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+    users = []
+    for index in range(threads):
+        cursor = conn.execute(
+            "INSERT INTO users (name, email, password) VALUES (?, ?, 'x')",
+            (f"Shopper {index}", f"hot-sku-{mode}-{index}-{time.time_ns()}@example.com")
+        )
+        users.append(cursor.lastrowid)
+    conn.commit()
+    db.release_connection()
+
+    counts = {"ok": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def shopper(user_id):
+        local = dict.fromkeys(counts, 0)
+        for _ in range(attempts):
+            cart.add_item(user_id, product_id, quantity)
+            try:
+                if mode == "unchecked":
+                    place_unchecked(db, user_id)
+                else:
+                    if mode == "reserved":
+                        checkout.reserve(user_id)
+                    checkout.place_order(user_id, {"street": "Bench"}, "cod")
+                local["ok"] += 1
+            except (InsufficientStockError, EmptyCartError):
+                local["rejected"] += 1
+                cart.clear(user_id)
+            except Exception:
+                local["errors"] += 1
+                cart.clear(user_id)
+        db.release_connection()
+        with lock:
+            for name, value in local.items():
+                counts[name] += value
+
+    workers = [threading.Thread(target=shopper, args=(user_id,)) for user_id in users]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    fold_started = time.perf_counter()
+    sold_counts.fold()
+    fold_ms = (time.perf_counter() - fold_started) * 1000
+
+    conn = db.get_connection()
+    sold = conn.execute(
+        "SELECT COALESCE(SUM(oi.quantity), 0) FROM order_items oi WHERE oi.order_id > ? AND oi.product_id = ?",
+        (start_orders, product_id)
+    ).fetchone()[0]
+    final_stock, sold_count = conn.execute(
+        "SELECT stock, sold_count FROM products WHERE id = ?", (product_id,)
+    ).fetchone()
+    db.close()
+    return {
+        "mode": mode,
+        "soldCounts": sold_count_mode,
+        "foldMs": fold_ms,
+        "soldCountDrift": sold_count - start_sold - sold,
+        "elapsed": elapsed,
+        "attempts": threads * attempts,
+        **counts,
+        "sold": sold,
+        "finalStock": final_stock,
+        "oversold": max(sold - stock, 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure checkout throughput and oversell on one hot SKU")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--attempts", type=int, default=100, help="checkouts per thread")
+    parser.add_argument("--quantity", type=int, default=1, help="units per checkout")
+    parser.add_argument("--product", type=int, default=1)
+    parser.add_argument("--sold-counts", nargs="+", choices=SOLD_COUNT_MODES, default=list(SOLD_COUNT_MODES),
+                        help="sold_count modes to run the checked modes under")
+    parser.add_argument("--profile", help="generate_data.py profile for the database")
+    args = parser.parse_args()
+
+    # Rejected orders are logged; keep the report readable
+    logs.configure(level="WARNING")
+
+    print(f"{args.threads} threads x {args.attempts} checkouts of {args.quantity} against stock {args.stock}")
+    print(f"{'mode':>10} {'sold_count':>10} {'checkouts/s':>12} {'ok':>6} {'rejected':>9} {'errors':>7} "
+          f"{'sold':>6} {'stock':>6} {'oversold':>9} {'fold ms':>8}")
+    failed = False
+    for mode in args.modes:
+        # The unchecked baseline always updates sold_count inline
+        for sold_count_mode in (["inline"] if mode == "unchecked" else args.sold_counts):
+            with snapshot.isolated_database(args.profile) as db_file:
+                result = run(db_file, mode, sold_count_mode, args.threads, args.stock, args.attempts,
+                             args.quantity, args.product)
+            print(f"{mode:>10} {sold_count_mode:>10} {result['attempts'] / result['elapsed']:>12.1f} "
+                  f"{result['ok']:>6} {result['rejected']:>9} {result['errors']:>7} {result['sold']:>6} "
+                  f"{result['finalStock']:>6} {result['oversold']:>9} {result['foldMs']:>8.2f}")
+            if mode != "unchecked" and (result["oversold"] or result["finalStock"] < 0):
+                failed = True
+            # Every unit sold must reach sold_count once the deltas are folded
+            if result["soldCountDrift"]:
+                print(f"  sold_count is off by {result['soldCountDrift']}")
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+# Add the backend directory to the path so we can import modules
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+
+class SlowStream:
+    """
+    File wrapper that stalls each write, like stdout piped to a busy collector
+    """
+
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def time_calls(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure logging overhead per request")
+    parser.add_argument("--iterations", type=int, default=3000)
+    parser.add_argument("--output", default=os.devnull, help="where log lines go (default: discard)")
+    parser.add_argument("--sink-latency-us", type=float, default=0.0,
+                        help="stall every log write this long to model a slow stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, open(args.output, "a") as sink:
+        output = SlowStream(sink, args.sink_latency_us / 1e6)
+        # app.py opens fertishop.db in the working directory
+        os.chdir(tmp)
+        import app as shop
+        import logs
+
+        category = shop.category_model.create("Bench", "bench", None)
+        product_id = shop.product_model.create("Bench product", "", 10, category["id"], None, 10 ** 9, "")
+        user = shop.user_model.create("Bench User", "bench@example.com", "not-a-real-hash")
+        headers = {"Authorization": f"Bearer {shop.create_access_token(shop.token_claims(user))}"}
+        client = shop.app.test_client()
+
+        # POST /api/cart/add writes one cart.add record per request
+        def request():
+            client.post("/api/cart/add", json={"productId": product_id}, headers=headers)
+
+        def synchronous(level):
+            # What print() amounted to: format and write on the request thread
+            logs.shutdown()
+            handler = logging.StreamHandler(output)
+            handler.setFormatter(logs.JSONFormatter())
+            root = logging.getLogger(logs.ROOT_LOGGER)
+            root.handlers = [handler]
+            root.setLevel(level)
+
+        scenarios = [
+            ("logging off (WARNING)", lambda: logs.configure(level="WARNING", stream=output)),
+            ("synchronous JSON", lambda: synchronous("INFO")),
+            ("queued JSON", lambda: logs.configure(level="INFO", stream=output)),
+            ("queued JSON, 10% sampled", lambda: logs.configure(
+                level="INFO", stream=output, sample_rates={"cart.add": 0.1})),
+        ]
+
+        print(f"{'scenario':<26} {'request us':>11} {'overhead us':>12} {'dropped':>8}")
+        baseline = None
+        for name, setup in scenarios:
+            setup()
+            time_calls(request, 200)
+            elapsed = time_calls(request, args.iterations)
+            baseline = baseline or elapsed
+            print(f"{name:<26} {elapsed * 1e6:>11.1f} {(elapsed - baseline) * 1e6:>12.1f} "
+                  f"{logs.stats()['dropped']:>8}")
+
+        logs.shutdown()
+        shop.db.close()
+        os.chdir(BACKEND_DIR)
+
+
+if __name__ == "__main__":
+    main()
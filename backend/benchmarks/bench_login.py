@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the backend directory to the path so we can import modules
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+
+def run_logins(shop, email, password, concurrency, duration):
+    """
+    Hammer /api/auth/login from concurrency threads; return (status counts, elapsed)
+    """
+    counts = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        client = shop.app.test_client()
+        local = {}
+        while time.perf_counter() < deadline:
+            status = client.post("/api/auth/login", json={"email": email, "password": password}).status_code
+            local[status] = local.get(status, 0) + 1
+        with lock:
+            for status, count in local.items():
+                counts[status] = counts.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure login throughput per bcrypt cost and hasher concurrency")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[8, 10, 12])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--max-pending", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per scenario")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py opens fertishop.db in the working directory
+        os.chdir(tmp)
+        import app as shop
+        import auth
+        import logs
+
+        # Login handlers log every attempt; keep the report readable
+        logs.configure(level="WARNING")
+
+        print(f"{'rounds':>6} {'workers':>7} {'logins/s':>9} {'ok':>6} {'503':>6} {'hash ms':>8}")
+        for rounds in args.rounds:
+            for workers in args.workers:
+                auth.password_hasher = auth.PasswordHasher(
+                    rounds=rounds, workers=workers, max_pending=args.max_pending
+                )
+
+                # Store the hash at the scenario's cost so logins never rehash
+                email = f"bench-{rounds}-{workers}@example.com"
+                shop.user_model.create("Bench User", email, auth.hash_password("bench-password"))
+
+                counts, elapsed = run_logins(shop, email, "bench-password", args.concurrency, args.duration)
+
+                ok = counts.get(200, 0)
+                stats = auth.password_hasher.stats()
+                print(f"{rounds:>6} {workers:>7} {ok / elapsed:>9.1f} {ok:>6} "
+                      f"{counts.get(503, 0):>6} {stats['avgMs']:>8.1f}")
+
+        shop.db.close()
+        os.chdir(BACKEND_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the backend directory to the path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Database, Product
+
+WORDS = [
+    "organic", "compost", "soil", "root", "growth", "nitrogen", "phosphorus", "potassium",
+    "iron", "chelated", "foliar", "spray", "bloom", "fruit", "yield", "harvest", "worm",
+    "castings", "bone", "meal", "balancer", "leaves", "yellowing", "deficiency", "drainage",
+    "aeration", "microbial", "flowering", "seedling", "transplant", "mulch", "kelp", "humic",
+    "calcium", "magnesium", "sulfur", "zinc", "boron", "manganese", "copper", "drought",
+]
+
+SYLLABLES = ["ba", "ko", "ri", "ten", "sul", "mag", "vor", "li", "pha", "den", "tro", "gan"]
+
+# Common, mid-frequency, rare, two-word, prefix and missing terms
+QUERIES = ["soil", "mulch", "boron", "chelated iron", "transpl", "xyzzy"]
+
+
+def make_vocabulary(rng, size=5000):
+    # Real fertilizer words first, then synthetic ones, so word frequency is Zipfian
+    vocabulary = list(WORDS)
+    while len(vocabulary) < size:
+        vocabulary.append("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    return vocabulary, weights
+
+
+def make_text(rng, vocabulary, length):
+    words, weights = vocabulary
+    return " ".join(rng.choices(words, weights=weights, k=length))
+
+
+def populate(db, size, seed):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO categories (name, slug, image) VALUES ('Bench', 'bench', NULL)")
+    category_id = cursor.lastrowid
+
+    batch = []
+    for i in range(size):
+        batch.append((
+            f"{make_text(rng, vocabulary, 2).title()} {i}",
+            make_text(rng, vocabulary, 30),
+            round(rng.uniform(100, 1000), 2),
+            category_id,
+            rng.randint(0, 5000),
+            rng.randint(0, 100),
+            make_text(rng, vocabulary, 6),
+        ))
+        if len(batch) == 10000:
+            cursor.executemany(
+                "INSERT INTO products (name, description, price, category_id, sold_count, stock, treatment_for) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            batch = []
+    if batch:
+        cursor.executemany(
+            "INSERT INTO products (name, description, price, category_id, sold_count, stock, treatment_for) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            batch
+        )
+    conn.commit()
+
+
+def time_search(product_model, search, limit, repeat):
+    best = None
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(product_model._load_all(limit, 0, None, None, search, None)[0])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LIKE and FTS5 product search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--limit", type=int, default=24, help="page size for each search")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'products':>10} {'query':<18} {'LIKE ms':>10} {'FTS ms':>10} {'speedup':>8} {'FTS rows':>9}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, "bench.db"))
+            populate(db, size, args.seed)
+            product_model = Product(db)
+
+            for query in QUERIES:
+                db.fts_enabled = False
+                like_time, _ = time_search(product_model, query, args.limit, args.repeat)
+                db.fts_enabled = True
+                fts_time, fts_rows = time_search(product_model, query, args.limit, args.repeat)
+                speedup = like_time / fts_time if fts_time else float("inf")
+                print(f"{size:>10} {query:<18} {like_time * 1000:>10.2f} {fts_time * 1000:>10.2f} "
+                      f"{speedup:>7.1f}x {fts_rows:>9}")
+
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to the path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+import serializers
+
+
+def make_products(count, seed=7):
+    # Same shape as Product.get_page() returns
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "name": f"Product {i} organic soil booster",
+            "description": "Slow-release fertilizer for healthy roots and greener leaves. " * 3,
+            "price": round(rng.uniform(50, 2000), 2),
+            "category_id": rng.randint(1, 4),
+            "image": None if i % 7 == 0 else f"/images/products/product-{i}.jpg",
+            "sold_count": rng.randint(0, 5000),
+            "stock": rng.randint(0, 300),
+            "treatment_for": "Yellowing leaves, poor soil",
+            "category_name": "Organic",
+            "category_slug": "organic",
+            "use_cases": [
+                {"id": uc, "name": f"Use case {uc}", "slug": f"use-case-{uc}"}
+                for uc in range(rng.randint(1, 3))
+            ],
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def format_with_dicts(products):
+    # The per-endpoint formatting app.py used before serializers.py
+    formatted_products = []
+    for product in products:
+        image = product.get("image") or "/placeholder.svg"
+        formatted_products.append({
+            "id": str(product["id"]),
+            "name": product["name"],
+            "description": product["description"],
+            "price": product["price"],
+            "category": product["category_slug"],
+            "useCase": [uc["slug"] for uc in product["use_cases"]],
+            "image": image,
+            "soldCount": product["sold_count"],
+            "stock": product["stock"],
+            "treatmentFor": product["treatment_for"]
+        })
+    return jsonify({"products": formatted_products, "nextCursor": None}).get_data()
+
+
+def time_per_call(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare product serialization cost per 1,000 products")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    app = Flask(__name__)
+
+    def shaped():
+        return serializers.respond(products=serializers.many(serializers.product, products), nextCursor=None).get_data()
+
+    scenarios = [("dicts + jsonify", lambda: format_with_dicts(products)), ("serializers", shaped)]
+
+    with app.app_context():
+        expected = format_with_dicts(products)
+        if shaped() != expected:
+            print("serializers output differs from jsonify")
+            return 1
+
+        if serializers.orjson is not None:
+            def shaped_orjson():
+                serializers.USE_ORJSON = True
+                try:
+                    return shaped()
+                finally:
+                    serializers.USE_ORJSON = False
+            scenarios.append(("serializers + orjson", shaped_orjson))
+
+        scale = 1000 / args.products
+        baseline = None
+        print(f"{'serializer':<20} {'ms per 1k products':>19} {'speedup':>8}")
+        for name, fn in scenarios:
+            elapsed = time_per_call(fn, args.iterations) * scale
+            baseline = baseline or elapsed
+            print(f"{name:<20} {elapsed * 1000:>19.3f} {baseline / elapsed:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
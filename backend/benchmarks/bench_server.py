@@ -0,0 +1,136 @@
+import argparse
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import snapshot
+
+# Catalog-heavy read traffic, roughly what a storefront sees
+PATHS = [
+    "/api/products",
+    "/api/products?limit=12",
+    "/api/products?category=organic",
+    "/api/products?search=soil",
+    "/api/products/featured",
+    "/api/products/3",
+    "/api/products/3/related",
+    "/api/categories",
+]
+
+SERVERS = {
+    # What run.py starts today, minus the reloader so the benchmark owns one process
+    "dev": "from app import app; app.run(debug=True, use_reloader=False, host='127.0.0.1', port={port})",
+    "prefork": "from server import serve; serve('127.0.0.1', {port}, workers={workers}, threads={threads})",
+}
+
+
+def wait_until_up(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def drive(port, concurrency, duration):
+    """
+    Send requests from concurrency threads for duration seconds; return latencies and errors
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        local, failed, i = [], 0, offset
+        while time.monotonic() < deadline:
+            path = PATHS[i % len(PATHS)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                conn.close()
+                if response.status != 200:
+                    failed += 1
+                    continue
+            except OSError:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the dev server with the pre-forking server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "PYTHONPATH": BACKEND_DIR}
+
+        print(f"{'server':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, command in SERVERS.items():
+            # Each run starts from the same seeded database
+            run_dir = os.path.join(tmp, name)
+            os.makedirs(run_dir)
+            snapshot.restore(os.path.join(run_dir, "fertishop.db"))
+
+            code = command.format(port=args.port, workers=args.workers, threads=args.threads)
+            process = subprocess.Popen(
+                [sys.executable, "-c", code], cwd=run_dir, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_until_up(args.port)
+                drive(args.port, args.concurrency, 1.0)  # warm caches
+                start = time.perf_counter()
+                latencies, errors = drive(args.port, args.concurrency, args.duration)
+                elapsed = time.perf_counter() - start
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=60)
+
+            print(f"{name:<10} {len(latencies) / elapsed:>8.1f} "
+                  f"{percentile(latencies, 0.50) * 1000:>8.2f} "
+                  f"{percentile(latencies, 0.95) * 1000:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Run EXPLAIN QUERY PLAN over every query the models issue and fail on full scans.
+
+The models are exercised against a throwaway database while a trace callback
+records each statement with its parameters bound. Any plan step that scans one
+of LARGE_TABLES without an index is reported, and the script exits non-zero.
+A scan is allowed only when it walks the index (or rowid) whose leading column
+is the query's ORDER BY column and a LIMIT stops it after one page. Any other
+scan of a large table is reported, filtered or not.
+
+Usage:
+    python check_query_plans.py [--verbose]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+from checkout import CheckoutService
+from inventory import Inventory
+from leaderboard import Leaderboard
+from sold_counts import SoldCounts
+from models import Database, User, Category, Product, UseCase, Order, Cart
+
+# Tables expected to grow with the business; small lookup tables may be scanned
+LARGE_TABLES = {
+    "users", "products", "product_use_cases", "orders", "order_items", "cart_items", "inventory_reservations",
+    "product_changes"
+}
+
+CHECKED_STATEMENTS = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+ALIAS_PATTERN = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+SQL_KEYWORDS = {"WHERE", "JOIN", "ON", "LEFT", "INNER", "ORDER", "GROUP", "LIMIT", "SET", "AND"}
+
+SCAN_PATTERN = re.compile(r"SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+ORDER_BY_PATTERN = re.compile(r"\bORDER BY\s+(?:(\w+)\.)?(\w+)", re.IGNORECASE)
+
+
+def exercise_models(db):
+    """
+    Call every model method once or more so the trace sees each query shape
+    """
+    users = User(db)
+    categories = Category(db)
+    use_cases = UseCase(db)
+    products = Product(db)
+    orders = Order(db)
+    cart = Cart(db)
+
+    user = users.create("Plan Check", "plan@example.com", "not-a-real-hash")
+    users.get_by_email("plan@example.com")
+    users.get_by_id(user["id"])
+
+    category = categories.create("Plans", "plans", None)
+    categories.get_all()
+    categories.get_by_slug("plans")
+    use_case = use_cases.create("Checks", "checks")
+    use_cases.get_all()
+    use_cases.get_by_slug("checks")
+
+    product_ids = []
+    for i in range(5):
+        product_id = products.create(
+            f"Plan product {i}", "Soil conditioner for plan checks", 100 + i,
+            category["id"], None, 10, "Poor soil"
+        )
+        products.add_use_case(product_id, use_case["id"])
+        product_ids.append(product_id)
+
+    products.get_by_id(product_ids[0])
+    products.get_featured()
+    products.get_related(product_ids[0])
+    for sort in Product.SORTS:
+        search = "soil" if sort == "relevance" else None
+        page, next_cursor = products.get_page(2, sort=sort, search=search)
+        products.get_page(2, cursor=next_cursor, sort=sort, search=search)
+    products.get_page(2, category_slug="plans", use_case_slug="checks", search="soil")
+    products.get_page(2, offset=2)
+    products.get_all(category_slug="plans")
+
+    cart.add_item(user["id"], product_ids[0], 1)
+    cart.add_item(user["id"], product_ids[0], 1)
+    cart.update_quantity(user["id"], product_ids[0], 3)
+    cart.get_items(user["id"])
+    cart.remove_item(user["id"], product_ids[0])
+    cart.clear(user["id"])
+
+    for _ in range(3):
+        order_id = orders.create(user["id"], 100, {"street": "1 Plan St"}, "cod")
+        orders.add_item(order_id, product_ids[1], "Plan product 1", 101, 1)
+    orders.get_by_id(order_id, user_id=user["id"])
+    orders.get_user_orders(user["id"])
+    for summary in (False, True):
+        page, next_cursor = orders.get_user_orders_page(user["id"], 2, summary=summary)
+        orders.get_user_orders_page(user["id"], 2, after=Order.decode_page_cursor(next_cursor),
+                                    summary=summary)
+    orders.update_status(order_id, "to-ship")
+
+    inventory = Inventory(db, sweep_interval=0)
+    checkout = CheckoutService(db, inventory, SoldCounts(db, mode="inline"))
+    cart.add_item(user["id"], product_ids[2], 1)
+    checkout.reserve(user["id"])
+    checkout.place_order(user["id"], {"street": "1 Plan St"}, "cod")
+    inventory.reserve(user["id"], [(product_ids[3], 1)])
+    inventory.release(user["id"])
+    inventory.sweep()
+
+    # Deferred mode records sales in the log and folds them into products
+    sold_counts = SoldCounts(db, mode="deferred")
+    deferred = Order(db, sold_counts)
+    deferred.add_item(order_id, product_ids[4], "Plan product 4", 104, 1)
+    Product(db, sold_counts).get_featured()
+    sold_counts.fold()
+
+    # Boards smaller than the plan catalog, so reads past them fall back to SQL
+    leaderboard = Leaderboard(db, size=2)
+    leaderboard.rebuild()
+    ranked = Product(db, leaderboard=leaderboard)
+    ranked.get_featured(3)
+    ranked.get_page(3, category_slug="plans")
+    cart.add_item(user["id"], product_ids[0], 1)
+    checkout.place_order(user["id"], {"street": "1 Plan St"}, "cod")
+    leaderboard.refresh()
+    leaderboard.check()
+    leaderboard.prune()
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in ALIAS_PATTERN.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(conn, sql):
+    """
+    Return the EXPLAIN QUERY PLAN steps that scan a large table without an index
+    """
+    aliases = table_aliases(sql)
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+
+    problems = []
+    for row in plan:
+        detail = row[-1]
+        match = SCAN_PATTERN.match(detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in LARGE_TABLES and not order_index_scan(conn, sql, plan, aliases, table, match.group(2)):
+            problems.append(detail)
+    return plan, problems
+
+
+def order_index_scan(conn, sql, plan, aliases, table, index):
+    """
+    Return True if scanning table through index (None for the rowid) reads it
+    in the outer ORDER BY order and a LIMIT stops the scan after one page
+    """
+    if " LIMIT " not in sql.upper() or any("TEMP B-TREE" in row[-1] for row in plan):
+        return False
+    orders = ORDER_BY_PATTERN.findall(sql)
+    if not orders:
+        return False
+    # The outer query's ORDER BY is the last one, just before its LIMIT
+    alias, column = orders[-1]
+    if alias and aliases.get(alias, alias) != table:
+        return False
+    if index is None:
+        leading = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+                   if row[5] == 1 and row[2].upper() == "INTEGER"]
+    else:
+        leading = [row[2] for row in conn.execute(f"PRAGMA index_info({index})") if row[0] == 0]
+    return leading == [column]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail on full scans in model queries")
+    parser.add_argument("--verbose", action="store_true", help="print every query plan")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A zero-size cache makes every read reach SQLite
+        db = Database(os.path.join(tmp, "plans.db"), cache_size=0)
+        conn = db.get_connection()
+
+        statements = []
+        conn.set_trace_callback(statements.append)
+        exercise_models(db)
+        conn.set_trace_callback(None)
+
+        seen = set()
+        failures = 0
+        for sql in statements:
+            normalized = " ".join(sql.split())
+            if not normalized.upper().startswith(CHECKED_STATEMENTS) or normalized in seen:
+                continue
+            seen.add(normalized)
+
+            plan, problems = full_scans(conn, normalized)
+            if args.verbose or problems:
+                print(normalized)
+                for row in plan:
+                    print(f"    {row[-1]}")
+            for detail in problems:
+                failures += 1
+                print(f"  FULL SCAN: {detail}")
+
+        db.close()
+
+    print(f"Checked {len(seen)} distinct queries: {failures} full scan(s) of large tables")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import json
+from datetime import datetime
+
+
+class EmptyCartError(Exception):
+    """
+    Raised when a user tries to check out with nothing in their cart
+    """
+
+
+class CheckoutService:
+    """
+    Turns a user's cart into an order in a single SQLite transaction.
+
+    The order row, its items, the stock and sold_count updates and the cart
+    clear either all commit together or not at all, with one fsync per checkout.
+    Stock is only taken when it covers the cart after other shoppers' holds;
+    see inventory.py. Units sold are counted through sold_counts.py.
+    """
+
+    def __init__(self, db, inventory, sold_counts):
+        self.db = db
+        self.inventory = inventory
+        self.sold_counts = sold_counts
+
+    def _cart(self, cursor, user_id):
+        cursor.execute("""
+            SELECT ci.product_id, p.name, p.price, ci.quantity, p.image
+            FROM cart_items ci
+            JOIN products p ON ci.product_id = p.id
+            WHERE ci.user_id = ?
+        """, (user_id,))
+        cart_items = cursor.fetchall()
+        if not cart_items:
+            raise EmptyCartError("Cart is empty")
+        return cart_items
+
+    def reserve(self, user_id):
+        """
+        Start checkout: hold stock for everything in the user's cart
+        """
+        cart_items = self._cart(self.db.get_connection().cursor(), user_id)
+        return self.inventory.reserve(user_id, [(item["product_id"], item["quantity"]) for item in cart_items])
+
+    def place_order(self, user_id, address, payment_method):
+        """
+        Create an order from the user's cart and return it in the Order.get_by_id shape
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+
+        # Take the write lock up front so the cart we read is the cart we sell
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cart_items = self._cart(cursor, user_id)
+
+            # Conditional stock decrements; raises InsufficientStockError
+            # before anything is written if a product falls short
+            sold = [(item["product_id"], item["quantity"]) for item in cart_items]
+            self.inventory.take(cursor, user_id, sold)
+            self.sold_counts.record(cursor, sold)
+
+            total = sum(item["price"] * item["quantity"] for item in cart_items)
+            status = "to-pay"
+            # Same format SQLite's CURRENT_TIMESTAMP default would store
+            created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+            cursor.execute(
+                "INSERT INTO orders (user_id, total, status, created_at, address, payment_method) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, total, status, created_at, json.dumps(address), payment_method)
+            )
+            order_id = cursor.lastrowid
+
+            items = [
+                {
+                    "order_id": order_id,
+                    "product_id": item["product_id"],
+                    "name": item["name"],
+                    "price": item["price"],
+                    "quantity": item["quantity"],
+                    "image": item["image"] or "/placeholder.svg"
+                }
+                for item in cart_items
+            ]
+            cursor.executemany(
+                "INSERT INTO order_items (order_id, product_id, name, price, quantity, image) "
+                "VALUES (:order_id, :product_id, :name, :price, :quantity, :image)",
+                items
+            )
+
+            cursor.execute("DELETE FROM cart_items WHERE user_id = ?", (user_id,))
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        self.db.bump_catalog_version()
+
+        return {
+            "id": order_id,
+            "user_id": user_id,
+            "total": total,
+            "status": status,
+            "created_at": created_at,
+            "address": address,
+            "payment_method": payment_method,
+            "items": items
+        }
@@ -0,0 +1,106 @@
+import gzip
+import threading
+
+from flask import request
+
+from cache import LRUCache
+from http_cache import encoded_etag
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html", "text/plain", "text/css", "application/javascript"}
+
+
+class ResponseCompressor:
+    """
+    Compresses response bodies with the best encoding the client accepts.
+
+    Responses that carry an ETag are immutable for that tag, so their compressed
+    bodies are cached under (ETag, encoding) and a hot catalog page is only
+    compressed once per catalog version.
+    """
+
+    def __init__(self, min_size=500, level=6, brotli_quality=5, cache_size=256):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+        self.cache = LRUCache(max_size=cache_size)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def negotiate(self):
+        """
+        Return the preferred encoding from Accept-Encoding, or None for identity
+        """
+        return request.accept_encodings.best_match(self.encodings)
+
+    def _encode(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        # A fixed mtime keeps the output identical for identical bodies
+        return gzip.compress(body, compresslevel=self.level, mtime=0)
+
+    def compress(self, response):
+        """
+        Compress a response in place when the client, status and body allow it
+        """
+        response.vary.add("Accept-Encoding")
+
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        encoding = self.negotiate()
+        if not encoding:
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        if etag:
+            key = (etag, encoding)
+            compressed = self.cache.get(key)
+            if compressed is None:
+                compressed = self._encode(body, encoding)
+                self.cache.set(key, compressed)
+        else:
+            compressed = self._encode(body, encoding)
+
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(encoded_etag(etag, encoding), weak=weak)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                "encodings": self.encodings,
+                "minSize": self.min_size,
+                "level": self.level,
+                "compressed": self.compressed,
+                "bytesIn": self.bytes_in,
+                "bytesOut": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+                "cache": self.cache.stats()
+            }
@@ -50,7 +50,7 @@ def create_test_user():
         else:
             print("Failed to create demo user")
     
-    db.close_connection()
+    db.close()
     print("Database initialization complete")
 
 if __name__ == "__main__":
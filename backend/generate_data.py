@@ -0,0 +1,391 @@
+"""
+Generate a large, realistic FertiShop database for load and scaling tests.
+
+Everything is driven by a JSON profile (see profiles/), so the same profile and
+seed always produce the same rows (only bcrypt salts differ). Product popularity follows a Zipf
+distribution, a minority of users place most orders, and repeat buyers come
+back for the same few products. sold_count is the sum of the generated order
+quantities.
+
+The load is fast because:
+- the schema comes from the migrations, then secondary indexes and triggers
+  are dropped
+- rows go in through executemany in large transactions
+- indexes and triggers are recreated afterwards, and the search index is
+  rebuilt in one pass
+
+Every generated user has the password "password"; demo@example.com is user 1.
+
+Usage:
+    python generate_data.py --profile profiles/medium.json --db bench.db
+    python generate_data.py --profile profiles/large.json --db big.db --set orders=2000000 --force
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from array import array
+
+import bcrypt
+
+import migrations
+
+DEFAULT_PROFILE = {
+    "seed": 42,
+    "categories": 4,
+    "use_cases": 8,
+    "use_cases_per_product": [1, 3],
+    "products": 1000,
+    "price": [99, 2499],
+    "stock": [0, 500],
+    "users": 1000,
+    "orders": 5000,
+    "items_per_order": [1, 6],
+    "cart_users": 0.2,  # share of users with a non-empty cart
+    "cart_items_per_user": [1, 5],
+    "product_zipf": 1.1,  # popularity skew over products
+    "buyer_zipf": 0.8,  # skew of orders over users
+    "buyer_offset": 100,  # flattens the head so no single user places a large share of orders
+    "repeat_rate": 0.3,  # chance an order line is one of the buyer's usual products
+    "history_days": 365,
+    "bcrypt_rounds": 4,
+    "batch_size": 50000,
+}
+
+CATEGORIES = [
+    ("Organic Fertilizers", "organic", "/images/products/organic-category.jpg"),
+    ("Soil Enhancers", "soil-enhancer", "/images/products/soil-enhancer-category.jpg"),
+    ("Plant Nutrients", "plant-nutrients", "/images/products/plant-nutrients-category.jpg"),
+    ("Growth Boosters", "growth-booster", "/images/products/growth-booster-category.jpg"),
+]
+
+USE_CASES = [
+    ("For Yellow Leaves", "yellow-leaves"), ("Root Growth", "root-growth"),
+    ("Boost Production", "boost-production"), ("Soil Health", "soil-health"),
+    ("Pest Control", "pest-control"), ("Disease Control", "disease-control"),
+    ("Nutrient Deficiency", "nutrient-deficiency"), ("Drought Resistance", "drought-resistance"),
+]
+
+BRANDS = ["EcoRich", "HarvestMax", "GreenRoot", "TerraPure", "BloomWise", "AgroVita", "SoilSmith", "LeafLine"]
+NOUNS = ["Compost", "Booster", "Blend", "Tonic", "Granules", "Feed", "Elixir", "Mix", "Concentrate", "Formula"]
+WORDS = [
+    "organic", "compost", "soil", "root", "growth", "nitrogen", "phosphorus", "potassium", "iron",
+    "chelated", "foliar", "bloom", "fruit", "yield", "harvest", "worm", "castings", "kelp", "humic",
+    "calcium", "magnesium", "sulfur", "zinc", "boron", "drought", "microbial", "seedling", "mulch",
+]
+PROBLEMS = ["yellow leaves", "weak roots", "poor soil structure", "low yield", "nutrient deficiency",
+            "slow growth", "drought stress", "leaf curl", "poor flowering"]
+# The statuses and payment methods the app itself uses; most history is complete
+STATUSES = (["completed"] * 80) + (["to-receive"] * 10) + (["to-ship"] * 7) + (["to-pay"] * 3)
+PAYMENT_METHODS = ["gcash", "gcash", "cod"]
+CITIES = [("Manila", "1000"), ("Quezon City", "1100"), ("Cebu City", "6000"), ("Davao City", "8000"),
+          ("Iloilo City", "5000"), ("Baguio", "2600")]
+
+
+def load_profile(path, overrides):
+    profile = dict(DEFAULT_PROFILE)
+    if path:
+        with open(path) as f:
+            profile.update(json.load(f))
+    for item in overrides:
+        name, value = item.split("=", 1)
+        if name not in DEFAULT_PROFILE:
+            raise SystemExit(f"unknown profile setting: {name}")
+        profile[name] = json.loads(value)
+    return profile
+
+
+def zipf_sampler(rng, size, exponent, offset=1):
+    """
+    Return a function drawing k indices in [0, size) with P(rank r) ~ 1 / (r + offset)^exponent
+    """
+    cumulative = list(itertools.accumulate(1.0 / (rank + offset) ** exponent for rank in range(size)))
+    total = cumulative[-1]
+    random_ = rng.random
+
+    def sample(k):
+        return [bisect.bisect(cumulative, random_() * total) for _ in range(k)]
+
+    return sample
+
+
+class Generator:
+    def __init__(self, conn, profile, log=print):
+        self.conn = conn
+        self.profile = profile
+        self.rng = random.Random(profile["seed"])
+        self.log = log
+        self.batch_size = profile["batch_size"]
+        self.now = 1_700_000_000  # fixed clock so output does not depend on when it runs
+        self.counts = {}
+
+    # Schema
+
+    def defer_indexes(self):
+        """
+        Drop secondary indexes and triggers; return their SQL for restore_indexes
+        """
+        deferred = self.conn.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+        ).fetchall()
+        for kind, name, _ in deferred:
+            self.conn.execute(f"DROP {kind.upper()} {name}")
+        return deferred
+
+    def restore_indexes(self, deferred):
+        for kind, name, sql in deferred:
+            if kind == "index":
+                self.conn.execute(sql)
+        # Search rows are built in one pass instead of by per-row triggers
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone():
+            self.conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+        for kind, name, sql in deferred:
+            if kind == "trigger":
+                self.conn.execute(sql)
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+
+    def insert(self, table, columns, rows):
+        """
+        executemany rows into table in batch_size chunks; the caller commits
+        """
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.conn.executemany(sql, batch)
+                self.counts[table] = self.counts.get(table, 0) + len(batch)
+                batch = []
+        if batch:
+            self.conn.executemany(sql, batch)
+            self.counts[table] = self.counts.get(table, 0) + len(batch)
+
+    def timestamp(self, seconds_ago):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(self.now - seconds_ago))
+
+    # Catalog
+
+    def catalog(self):
+        p, rng = self.profile, self.rng
+        categories = list(CATEGORIES)
+        for n in range(len(categories), p["categories"]):
+            name, slug, image = CATEGORIES[n % len(CATEGORIES)]
+            categories.append((f"{name} {n // len(CATEGORIES) + 1}", f"{slug}-{n}", image))
+        categories = categories[:p["categories"]]
+        self.insert("categories", ("id", "name", "slug", "image"),
+                    ((i + 1,) + c for i, c in enumerate(categories)))
+
+        use_cases = list(USE_CASES)
+        for n in range(len(use_cases), p["use_cases"]):
+            use_cases.append((f"Use Case {n + 1}", f"use-case-{n + 1}"))
+        use_cases = use_cases[:p["use_cases"]]
+        self.insert("use_cases", ("id", "name", "slug"), ((i + 1,) + u for i, u in enumerate(use_cases)))
+
+        low, high = p["price"]
+        stock_low, stock_high = p["stock"]
+        self.prices = array("d")
+        self.names = []
+        self.images = []
+
+        def products():
+            for product_id in range(1, p["products"] + 1):
+                category = rng.randrange(len(categories))
+                problem = rng.choice(PROBLEMS)
+                name = f"{rng.choice(BRANDS)} {rng.choice(WORDS).title()} {rng.choice(NOUNS)} {product_id}"
+                # Log-uniform prices: many cheap products, a long tail of expensive ones
+                price = round(low * (high / low) ** rng.random(), 0)
+                image = categories[category][2]
+                self.prices.append(price)
+                self.names.append(name)
+                self.images.append(image)
+                description = " ".join(rng.choices(WORDS, k=rng.randint(12, 30))).capitalize()
+                yield (product_id, name, f"{description}. TREATS: {problem}.", price, category + 1, image,
+                       0, rng.randint(stock_low, stock_high), problem.capitalize())
+
+        self.insert("products", ("id", "name", "description", "price", "category_id", "image",
+                                 "sold_count", "stock", "treatment_for"), products())
+
+        per_low, per_high = p["use_cases_per_product"]
+
+        def links():
+            for product_id in range(1, p["products"] + 1):
+                count = min(rng.randint(per_low, per_high), len(use_cases))
+                for use_case in sorted(rng.sample(range(1, len(use_cases) + 1), count)):
+                    yield product_id, use_case
+
+        self.insert("product_use_cases", ("product_id", "use_case_id"), links())
+        self.conn.commit()
+
+        # Popularity rank -> product id, shuffled so popular products are spread over the id range
+        self.by_rank = list(range(1, p["products"] + 1))
+        rng.shuffle(self.by_rank)
+        self.popular = zipf_sampler(rng, p["products"], p["product_zipf"])
+
+    # Users, orders and carts
+
+    def users(self):
+        p, rng = self.profile, self.rng
+        # One hash shared by every user keeps bcrypt out of the load time
+        password = bcrypt.hashpw(b"password", bcrypt.gensalt(rounds=p["bcrypt_rounds"])).decode("utf-8")
+        history = p["history_days"] * 86400
+
+        def rows():
+            yield 1, "Demo User", "demo@example.com", password, self.timestamp(history)
+            for user_id in range(2, p["users"] + 1):
+                yield (user_id, f"User {user_id}", f"user{user_id}@example.com", password,
+                       self.timestamp(rng.randrange(history)))
+
+        self.insert("users", ("id", "name", "email", "password", "created_at"), rows())
+        self.conn.commit()
+
+    def address(self, user_id):
+        # Stored as JSON with the fields the checkout form sends, as Order.create does
+        city, zip_code = CITIES[user_id % len(CITIES)]
+        return json.dumps({
+            "fullName": "Demo User" if user_id == 1 else f"User {user_id}",
+            "street": f"{user_id} Generated Street",
+            "city": city,
+            "zip": zip_code,
+            "phone": f"09{user_id:09d}",
+        })
+
+    def usual_products(self, user_id):
+        # A buyer's usual products: a few of the popular ones, fixed per user
+        top = min(len(self.by_rank), 200)
+        return [self.by_rank[(user_id * 7919 + n * 104729) % top] for n in range(3)]
+
+    def orders(self):
+        p, rng = self.profile, self.rng
+        buyers = zipf_sampler(rng, p["users"], p["buyer_zipf"], p["buyer_offset"])
+        # Buyer rank -> user id, so the heavy buyers are not simply the first users
+        buyer_ids = list(range(1, p["users"] + 1))
+        rng.shuffle(buyer_ids)
+        items_low, items_high = p["items_per_order"]
+        history = p["history_days"] * 86400
+        sold = array("q", bytes(8 * (p["products"] + 1)))
+
+        order_sql = ("INSERT INTO orders (id, user_id, total, status, created_at, address, payment_method) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)")
+        item_sql = ("INSERT INTO order_items (id, order_id, product_id, name, price, quantity, image) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)")
+        item_id = 0
+        orders, items = [], []
+        for order_id in range(1, p["orders"] + 1):
+            user_id = buyer_ids[buyers(1)[0]]
+            count = rng.randint(items_low, items_high)
+            chosen = set()
+            for rank in self.popular(count):
+                if rng.random() < p["repeat_rate"]:
+                    chosen.add(rng.choice(self.usual_products(user_id)))
+                else:
+                    chosen.add(self.by_rank[rank])
+            total = 0.0
+            for product_id in sorted(chosen):
+                quantity = 1 if rng.random() < 0.7 else rng.randint(2, 5)
+                price = self.prices[product_id - 1]
+                total += price * quantity
+                sold[product_id] += quantity
+                item_id += 1
+                items.append((item_id, order_id, product_id, self.names[product_id - 1], price, quantity,
+                              self.images[product_id - 1]))
+            orders.append((order_id, user_id, round(total, 2), rng.choice(STATUSES),
+                           self.timestamp(rng.randrange(history)), self.address(user_id),
+                           rng.choice(PAYMENT_METHODS)))
+            if len(items) >= self.batch_size:
+                self._flush_orders(order_sql, orders, item_sql, items)
+                orders, items = [], []
+        self._flush_orders(order_sql, orders, item_sql, items)
+
+        self.conn.executemany(
+            "UPDATE products SET sold_count = ? WHERE id = ?",
+            ((sold[product_id], product_id) for product_id in range(1, p["products"] + 1) if sold[product_id])
+        )
+        self.conn.commit()
+
+    def _flush_orders(self, order_sql, orders, item_sql, items):
+        self.conn.executemany(order_sql, orders)
+        self.conn.executemany(item_sql, items)
+        self.counts["orders"] = self.counts.get("orders", 0) + len(orders)
+        self.counts["order_items"] = self.counts.get("order_items", 0) + len(items)
+        self.log(f"  {self.counts['orders']:,} orders, {self.counts['order_items']:,} items")
+
+    def carts(self):
+        p, rng = self.profile, self.rng
+        low, high = p["cart_items_per_user"]
+        shoppers = sorted(rng.sample(range(1, p["users"] + 1), int(p["users"] * p["cart_users"])))
+
+        def rows():
+            for user_id in shoppers:
+                products = {self.by_rank[rank] for rank in self.popular(rng.randint(low, high))}
+                for product_id in sorted(products):
+                    yield user_id, product_id, rng.randint(1, 3)
+
+        self.insert("cart_items", ("user_id", "product_id", "quantity"), rows())
+        self.conn.commit()
+
+    def run(self):
+        started = time.perf_counter()
+        deferred = self.defer_indexes()
+        for step in (self.catalog, self.users, self.orders, self.carts):
+            step_started = time.perf_counter()
+            step()
+            self.log(f"{step.__name__}: {time.perf_counter() - step_started:.1f}s")
+        step_started = time.perf_counter()
+        self.restore_indexes(deferred)
+        self.log(f"indexes: {time.perf_counter() - step_started:.1f}s")
+        self.log(f"total: {time.perf_counter() - started:.1f}s")
+        return self.counts
+
+
+def generate(db_file, profile, log=print):
+    """
+    Build db_file from scratch for profile and return the row counts per table
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        migrations.upgrade(conn)
+        # Nobody else can see the file yet, so durability is pointless until the end
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -262144")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        counts = Generator(conn, profile, log=log).run()
+        conn.execute("PRAGMA journal_mode = WAL")
+        return counts
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic FertiShop database from a profile")
+    parser.add_argument("--profile", help="JSON profile (see profiles/); built-in defaults otherwise")
+    parser.add_argument("--db", default="fertishop.db", help="database file to create")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a profile setting, e.g. --set orders=100000")
+    parser.add_argument("--force", action="store_true", help="replace an existing database file")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.profile, args.set)
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f"{args.db} exists; pass --force to replace it", file=sys.stderr)
+            return 1
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    counts = generate(args.db, profile)
+    for table, count in counts.items():
+        print(f"{table:<18} {count:>12,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+
+# Revalidate on every use unless a route opts into a longer lifetime
+DEFAULT_CACHE_CONTROL = "no-cache"
+
+# Content codings the compressor may apply; each gets its own validator
+CONTENT_CODINGS = ("gzip", "br")
+
+
+def make_etag(version, path, args):
+    """
+    Build a strong ETag from a data version, the request path and its query parameters
+    """
+    query = "&".join(f"{key}={value}" for key, value in sorted(args.items(multi=True)))
+    digest = hashlib.blake2b(f"{version}|{path}|{query}".encode("utf-8"), digest_size=16)
+    return digest.hexdigest()
+
+
+def encoded_etag(etag, encoding):
+    """
+    The ETag of the body for etag once compressed with encoding. Every content
+    coding needs its own strong validator (RFC 9110, section 8.8.3).
+    """
+    return f"{etag}-{encoding}"
+
+
+def matching_etag(etag):
+    """
+    Return the tag in If-None-Match that names etag in any content coding, or None
+    """
+    for candidate in (etag, *(encoded_etag(etag, encoding) for encoding in CONTENT_CODINGS)):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def conditional(get_version, cache_control=DEFAULT_CACHE_CONTROL):
+    """
+    Decorate a GET view so a matching If-None-Match gets a 304 before the view runs.
+
+    get_version is called once per request and must change whenever the data the
+    view returns changes. It is read before the view runs, so a write that lands
+    mid-request only makes the ETag older than the body, never newer.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = make_etag(get_version(), request.path, request.args)
+
+            matched = matching_etag(etag)
+            if matched:
+                # The 304 names the representation the client holds
+                response = make_response("", 304)
+                etag = matched
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if cache_control:
+                response.headers['Cache-Control'] = cache_control
+            return response
+
+        return decorated_function
+    return decorator
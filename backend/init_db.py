@@ -3,16 +3,17 @@ import json
 from models import Database, User, Category, Product, UseCase
 from auth import hash_password
 import sqlite3
+import sys
 
-def main():
+def main(db_file='fertishop.db'):
     # Remove existing database if it exists
-    if os.path.exists('fertishop.db'):
+    if os.path.exists(db_file):
         print("Removing existing database...")
-        os.remove('fertishop.db')
+        os.remove(db_file)
     
     # Create a new database
     print("Creating new database...")
-    db = Database()
+    db = Database(db_file)
     
     # Initialize models
     user_model = User(db)
@@ -226,13 +227,13 @@ def main():
                 product_model.add_use_case(product_id, use_case_id)
     
     print("Database initialization completed!")
-    db.close_connection()
+    db.close()
 
-def create_test_user():
+def create_test_user(db_file='fertishop.db'):
     print("Initializing database and creating test user...")
     
     # Initialize DB
-    db = Database()
+    db = Database(db_file)
     user_model = User(db)
     
     # Check if test user already exists
@@ -253,9 +254,18 @@ def create_test_user():
         else:
             print("Failed to create test user")
     
-    db.close_connection()
+    db.close()
     print("Database initialization complete")
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Create and seed fertishop.db")
+    parser.add_argument("--profile", help="generate a synthetic dataset from this profile instead (see generate_data.py)")
+    args = parser.parse_args()
+    
+    if args.profile:
+        import generate_data
+        sys.exit(generate_data.main(["--profile", args.profile, "--db", "fertishop.db", "--force"]))
+    
     main()
     create_test_user() 
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+Stock reservations that keep concurrent checkouts from overselling.
+
+Starting checkout holds the cart's quantities for hold_seconds. A hold counts
+against availability for everyone else, so a shopper who got one can still
+buy when the last units sell out around them. Placing the order takes stock
+with a conditional decrement that only succeeds when the stock left, less
+other shoppers' live holds, covers the quantity; the order fails as a whole
+otherwise.
+
+Holds are rows in inventory_reservations. Expired ones are ignored by every
+check the moment they expire, so correctness never waits on the sweeper; it
+only deletes them so the table stays small.
+
+Environment:
+    INVENTORY_HOLD_SECONDS     how long a checkout holds stock (default 600)
+    INVENTORY_SWEEP_INTERVAL   seconds between sweeps of expired holds (default 30)
+"""
+import os
+import threading
+import time
+
+from logs import get_logger
+from models import InsufficientStockError
+
+log = get_logger("inventory")
+
+# Take stock only when what is left still covers other shoppers' live holds
+TAKE_STOCK = """
+    UPDATE products
+    SET stock = stock - :quantity
+    WHERE id = :product_id
+      AND stock - :quantity >= (
+          SELECT COALESCE(SUM(r.quantity), 0) FROM inventory_reservations r
+          WHERE r.product_id = :product_id AND r.expires_at > :now AND r.user_id != :user_id
+      )
+"""
+
+
+class Inventory:
+    HOLD_SECONDS = 600.0
+    SWEEP_INTERVAL = 30.0
+
+    def __init__(self, db, hold_seconds=None, sweep_interval=None):
+        self.db = db
+        if hold_seconds is None:
+            hold_seconds = float(os.getenv("INVENTORY_HOLD_SECONDS", self.HOLD_SECONDS))
+        if sweep_interval is None:
+            sweep_interval = float(os.getenv("INVENTORY_SWEEP_INTERVAL", self.SWEEP_INTERVAL))
+        self.hold_seconds = hold_seconds
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._counts = {"reserved": 0, "rejected": 0, "released": 0, "swept": 0}
+        self._sweeper = None
+        self._stop = threading.Event()
+        if hasattr(os, "register_at_fork"):  # not on Windows, which never forks
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # Threads do not survive a fork; a worker runs its own sweeper
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self._counts, 0)
+        running = self._sweeper is not None
+        self._sweeper = None
+        self._stop = threading.Event()
+        if running:
+            self.start_sweeper()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def available(self, cursor, user_id, product_ids, now=None):
+        """
+        Map product id -> stock left for user_id once other shoppers' live holds are taken out
+        """
+        if not product_ids:
+            return {}
+        now = time.time() if now is None else now
+        placeholders = ",".join("?" * len(product_ids))
+        cursor.execute(f"""
+            SELECT p.id, p.stock - COALESCE((
+                SELECT SUM(r.quantity) FROM inventory_reservations r
+                WHERE r.product_id = p.id AND r.expires_at > ? AND r.user_id != ?
+            ), 0) AS available
+            FROM products p
+            WHERE p.id IN ({placeholders})
+        """, [now, user_id, *product_ids])
+        return {row["id"]: max(row["available"], 0) for row in cursor.fetchall()}
+
+    def reserve(self, user_id, items):
+        """
+        Hold (product_id, quantity) items for user_id, replacing any holds they
+        had; raise InsufficientStockError and hold nothing if any cannot be covered
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        now = time.time()
+        expires_at = now + self.hold_seconds
+
+        # The write lock makes check-then-insert atomic across processes
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("DELETE FROM inventory_reservations WHERE user_id = ?", (user_id,))
+            available = self.available(cursor, user_id, [product_id for product_id, _ in items], now)
+            errors = [
+                {"product_id": product_id, "requested": quantity, "available": available.get(product_id, 0)}
+                for product_id, quantity in items
+                if quantity > available.get(product_id, 0)
+            ]
+            if errors:
+                raise InsufficientStockError(errors)
+
+            cursor.executemany(
+                "INSERT INTO inventory_reservations (user_id, product_id, quantity, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(user_id, product_id, quantity, expires_at) for product_id, quantity in items]
+            )
+            conn.commit()
+        except InsufficientStockError:
+            conn.rollback()
+            self._count("rejected")
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+
+        self._count("reserved")
+        return {
+            "expires_at": expires_at,
+            "items": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in items],
+        }
+
+    def take(self, cursor, user_id, items):
+        """
+        Decrement stock for (product_id, quantity) items inside the caller's
+        transaction and drop user_id's holds, which the order now replaces.
+        Raises InsufficientStockError, with nothing decremented, when any
+        product falls short.
+        """
+        now = time.time()
+        cursor.execute("SAVEPOINT take_stock")
+        cursor.executemany(TAKE_STOCK, [
+            {"product_id": product_id, "quantity": quantity, "user_id": user_id, "now": now}
+            for product_id, quantity in items
+        ])
+        # executemany reports the rows changed across every parameter set
+        if cursor.rowcount != len(items):
+            cursor.execute("ROLLBACK TO take_stock")
+            cursor.execute("RELEASE take_stock")
+            available = self.available(cursor, user_id, [product_id for product_id, _ in items], now)
+            self._count("rejected")
+            raise InsufficientStockError([
+                {"product_id": product_id, "requested": quantity, "available": available.get(product_id, 0)}
+                for product_id, quantity in items
+                if quantity > available.get(product_id, 0)
+            ])
+        cursor.execute("RELEASE take_stock")
+        cursor.execute("DELETE FROM inventory_reservations WHERE user_id = ?", (user_id,))
+
+    def release(self, user_id):
+        """
+        Drop user_id's holds, e.g. when they leave checkout
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM inventory_reservations WHERE user_id = ?", (user_id,))
+        released = cursor.rowcount
+        conn.commit()
+        if released:
+            self._count("released", released)
+        return released
+
+    def sweep(self, now=None):
+        """
+        Delete expired holds and return how many went
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM inventory_reservations WHERE expires_at <= ?",
+            (time.time() if now is None else now,)
+        )
+        swept = cursor.rowcount
+        conn.commit()
+        if swept:
+            self._count("swept", swept)
+        return swept
+
+    def start_sweeper(self):
+        # A sweep interval of 0 leaves expired holds in place; they are ignored anyway
+        if self.sweep_interval <= 0:
+            return
+        if self._sweeper is None or not self._sweeper.is_alive():
+            self._stop.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="inventory-sweep", daemon=True)
+            self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                swept = self.sweep()
+                if swept:
+                    log.info("inventory.swept", "Released expired stock holds", holds=swept)
+            except Exception:
+                log.exception("inventory.sweep_failed", "Error sweeping expired stock holds")
+            finally:
+                # The sweeper's connection goes back to the pool between sweeps
+                self.db.release_connection()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                "holdSeconds": self.hold_seconds,
+                "sweepInterval": self.sweep_interval,
+                "sweeperRunning": self._sweeper is not None and self._sweeper.is_alive(),
+            }
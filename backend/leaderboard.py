@@ -0,0 +1,448 @@
+"""
+In-memory best-seller rankings for the featured list and popular sort.
+
+Every order changes stock, and every change to products moves the catalog
+version. Without this module, each order would throw away the cached
+featured list and the first pages of /api/products, and the next reader
+would sort products by sold_count again. Instead, each process keeps boards
+of the top `size` products by (sold_count DESC, id ASC): one global board
+and one per category. Reads slice a board in O(K).
+
+The boards are built at startup and kept current incrementally. Triggers
+append the id of a product to product_changes when a column the boards serve
+changes, or its use cases do. When the catalog version moves, the process
+reads the new change rows, rereads just those products and moves them within
+the boards. That covers writes made by other processes too. A category or use
+case edit logs a NULL id and the boards are rebuilt.
+
+Stock is logged when it is restocked or reaches or leaves zero, so featured
+can skip out-of-stock products. A sale's plain decrement is not logged, so
+the stock on a board can be behind; reads take the stock of the products
+they return from the database by primary key before serving them.
+
+A board holds the exact top of its scope. A product that climbs past a
+board's last entry joins it, and a product that drops below the last entry
+leaves it. A board that is not complete (its scope has more products than
+it holds) is rebuilt from the database once it shrinks below half its size.
+Reads that need rows past the end of an incomplete board return None, and
+the caller falls back to SQL.
+
+Read paths never write. A pruner thread in each process records how far the
+process has read product_changes in leaderboard_progress and deletes the rows
+that every live process has read. A process that falls behind a prune (its
+progress row expired) rebuilds its boards.
+
+check() compares every board's ranking and in-stock flags with the database
+within one read transaction and reports any drift.
+
+Environment:
+    LEADERBOARD_SIZE             products per board (default 200); 0 disables the boards
+    LEADERBOARD_PRUNE_INTERVAL   seconds between prunes of product_changes (default 60; 0 disables)
+"""
+import bisect
+import os
+import threading
+import time
+
+from logs import get_logger
+from models import Product, encode_cursor, decode_cursor
+
+log = get_logger("leaderboard")
+
+SELECT_PRODUCTS = """
+    SELECT p.*, c.name as category_name, c.slug as category_slug
+    FROM products p
+    JOIN categories c ON p.category_id = c.id
+"""
+
+
+def rank_key(product):
+    return (-product["sold_count"], product["id"])
+
+
+class Board:
+    """
+    The top products of one scope, in rank order
+    """
+    __slots__ = ("keys", "products", "complete")
+
+    def __init__(self, products, complete):
+        self.products = products
+        self.keys = [rank_key(product) for product in products]
+        self.complete = complete  # holds every product in the scope
+
+    def remove(self, key):
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+            del self.products[index]
+
+    def offer(self, product, size):
+        """
+        Insert product if it belongs on the board; return whether it is on it
+        """
+        # Only a product that ranks above the last entry is known to belong
+        key = rank_key(product)
+        if not self.complete and (not self.keys or key > self.keys[-1]):
+            return False
+        index = bisect.bisect_left(self.keys, key)
+        self.keys.insert(index, key)
+        self.products.insert(index, product)
+        if len(self.keys) > size:
+            self.keys.pop()
+            self.products.pop()
+            self.complete = False
+        return index < size
+
+
+class Leaderboard:
+    SIZE = 200
+    PRUNE_INTERVAL = 60.0
+    # Progress rows not updated for this long, or for five prune intervals, belong to exited processes
+    PROGRESS_TIMEOUT = 300.0
+
+    def __init__(self, db, size=None, prune_interval=None):
+        self.db = db
+        self.size = int(os.getenv("LEADERBOARD_SIZE", self.SIZE)) if size is None else size
+        if prune_interval is None:
+            prune_interval = float(os.getenv("LEADERBOARD_PRUNE_INTERVAL", self.PRUNE_INTERVAL))
+        self.prune_interval = prune_interval
+        self.products = Product(db)  # plain model, for loading use cases
+
+        self._lock = threading.RLock()
+        self._boards = {}  # None for the global board, else category slug -> Board
+        self._ranked = {}  # product id -> (rank key, category slug) when it is on a board
+        self._version = None
+        self._last_change = 0
+        self._counts = {"hits": 0, "fallbacks": 0, "refreshes": 0, "changes": 0, "rebuilds": 0, "pruned": 0}
+        self._pruner = None
+        self._stop = threading.Event()
+        if hasattr(os, "register_at_fork"):  # not on Windows, which never forks
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked child keeps the boards it inherits current itself
+        self._lock = threading.RLock()
+        running = self._pruner is not None
+        self._pruner = None
+        self._stop = threading.Event()
+        if running:
+            self.start_pruner()
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _load(self, cursor, where="", params=(), limit=None):
+        query = SELECT_PRODUCTS + where + " ORDER BY p.sold_count DESC, p.id ASC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params = [*params, limit]
+        cursor.execute(query, params)
+        return self.products._with_use_cases(cursor, cursor.fetchall())
+
+    def _build_scope(self, cursor, category_slug):
+        # One row past the board tells whether the scope has more products
+        if category_slug is None:
+            products = self._load(cursor, limit=self.size + 1)
+        else:
+            products = self._load(cursor, "WHERE c.slug = ?", [category_slug], self.size + 1)
+            if not products:
+                self._boards.pop(category_slug, None)
+                return None
+        board = Board(products[:self.size], complete=len(products) <= self.size)
+        self._boards[category_slug] = board
+        for product in board.products:
+            self._ranked[product["id"]] = (rank_key(product), product["category_slug"])
+        return board
+
+    def rebuild(self):
+        """
+        Load every board from the database
+        """
+        with self._lock:
+            cursor = self.db.get_connection().cursor()
+            version = self.db.catalog_version
+            # Changes after this point are replayed by the next refresh
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM product_changes")
+            self._last_change = cursor.fetchone()[0]
+            self._boards = {}
+            self._ranked = {}
+            self._build_scope(cursor, None)
+            cursor.execute("SELECT slug FROM categories ORDER BY id")
+            for row in cursor.fetchall():
+                self._build_scope(cursor, row["slug"])
+            self._version = version
+            self._counts["rebuilds"] += 1
+
+    def refresh(self):
+        """
+        Apply product writes made since the last refresh if the catalog version moved
+        """
+        version = self.db.catalog_version
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            if self._version is None:
+                self.rebuild()
+                return
+            cursor = self.db.get_connection().cursor()
+            cursor.execute(
+                "SELECT id, product_id FROM product_changes WHERE id > ? ORDER BY id",
+                (self._last_change,)
+            )
+            changes = cursor.fetchall()
+            if changes and changes[0]["id"] != self._last_change + 1:
+                # Rows we never saw were pruned; start over
+                self.rebuild()
+                return
+            if any(row["product_id"] is None for row in changes):
+                # A category or use case changed; the names inside many products did too
+                self.rebuild()
+                return
+            if changes:
+                self._apply(cursor, {row["product_id"] for row in changes})
+                self._last_change = changes[-1]["id"]
+                self._counts["changes"] += len(changes)
+            self._version = version
+            self._counts["refreshes"] += 1
+
+    def _apply(self, cursor, product_ids):
+        product_ids = list(product_ids)
+        current = {}
+        for start in range(0, len(product_ids), Product.USE_CASE_BATCH_SIZE):
+            chunk = product_ids[start:start + Product.USE_CASE_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            for product in self._load(cursor, f"WHERE p.id IN ({placeholders})", chunk):
+                current[product["id"]] = product
+
+        new_scopes = set()
+        for product_id in product_ids:
+            ranked = self._ranked.pop(product_id, None)
+            if ranked is not None:
+                key, category_slug = ranked
+                for scope in (None, category_slug):
+                    board = self._boards.get(scope)
+                    if board is not None:
+                        board.remove(key)
+            product = current.get(product_id)
+            if product is None:
+                continue  # deleted
+            ranked = False
+            for scope in (None, product["category_slug"]):
+                board = self._boards.get(scope)
+                if board is None:
+                    new_scopes.add(scope)
+                elif board.offer(product, self.size):
+                    ranked = True
+            if ranked:
+                self._ranked[product_id] = (rank_key(product), product["category_slug"])
+
+        # New categories are loaded whole, and a board that lost entries it
+        # cannot replace is reloaded
+        for scope, board in list(self._boards.items()):
+            if not board.complete and len(board.keys) < self.size // 2:
+                new_scopes.add(scope)
+        for scope in new_scopes:
+            self._build_scope(cursor, scope)
+
+    def prune(self, now=None):
+        """
+        Record this process's progress through product_changes and delete the
+        rows every live process has read; return how many went
+        """
+        # Catch up first, so an idle process does not hold the log back
+        self.refresh()
+        with self._lock:
+            last_change = self._last_change
+        now = time.time() if now is None else now
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "INSERT INTO leaderboard_progress (pid, last_change, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (pid) DO UPDATE SET last_change = excluded.last_change, updated_at = excluded.updated_at",
+                (os.getpid(), last_change, now)
+            )
+            cursor.execute(
+                "DELETE FROM leaderboard_progress WHERE updated_at < ?",
+                (now - max(self.PROGRESS_TIMEOUT, self.prune_interval * 5),)
+            )
+            cursor.execute("SELECT MIN(last_change) FROM leaderboard_progress")
+            through = cursor.fetchone()[0]
+            cursor.execute("DELETE FROM product_changes WHERE id <= ?", (through,))
+            pruned = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if pruned:
+            with self._lock:
+                self._counts["pruned"] += pruned
+        return pruned
+
+    def start_pruner(self):
+        if not self.enabled or self.prune_interval <= 0:
+            return
+        if self._pruner is None or not self._pruner.is_alive():
+            self._stop.clear()
+            self._pruner = threading.Thread(target=self._prune_loop, name="leaderboard-prune", daemon=True)
+            self._pruner.start()
+
+    def stop_pruner(self):
+        self._stop.set()
+        if self._pruner is not None:
+            self._pruner.join()
+            self._pruner = None
+
+    def _prune_loop(self):
+        # The first pass runs at once, so siblings see this process's progress before pruning past it
+        while True:
+            try:
+                self.prune()
+            except Exception:
+                log.exception("leaderboard.prune_failed", "Error pruning product changes")
+            finally:
+                # The pruner's connection goes back to the pool between passes
+                self.db.release_connection()
+            if self._stop.wait(self.prune_interval):
+                return
+
+    def featured(self, limit):
+        """
+        The top limit in-stock products, or None if the board cannot say
+        """
+        if not self.enabled or limit < 1:
+            return None
+        self.refresh()
+        with self._lock:
+            board = self._boards.get(None)
+            candidates = [] if board is None else [product for product in board.products if product["stock"] > 0]
+            complete = board is not None and board.complete
+        result = []
+        for start in range(0, len(candidates), limit):
+            # A product can sell out after the refresh; keep looking down the board
+            result.extend(product for product in self._current_stock(candidates[start:start + limit])
+                          if product["stock"] > 0)
+            if len(result) >= limit:
+                break
+        result = result[:limit]
+        with self._lock:
+            if board is None or len(result) < limit and not complete:
+                self._counts["fallbacks"] += 1
+                return None
+            self._counts["hits"] += 1
+        return result
+
+    def page(self, limit, cursor=None, offset=0, category_slug=None):
+        """
+        One page of the popular sort as (products, next cursor), or None if the board cannot say
+        """
+        if not self.enabled:
+            return None
+        start_key = None
+        if cursor:
+            try:
+                sort, last_value, last_id = decode_cursor(cursor, 3)
+            except ValueError:
+                return None
+            if sort != "popular" or not isinstance(last_value, int) or not isinstance(last_id, int):
+                return None  # let the SQL path report it
+            start_key = (-last_value, last_id)
+        self.refresh()
+        with self._lock:
+            board = self._boards.get(category_slug)
+            if board is None:
+                self._counts["fallbacks"] += 1
+                return None
+            start = offset if start_key is None else bisect.bisect_right(board.keys, start_key)
+            # One row past the page tells whether there is a next page
+            rows = board.products[start:start + limit + 1]
+            if len(rows) <= limit and not board.complete:
+                self._counts["fallbacks"] += 1
+                return None
+            self._counts["hits"] += 1
+
+        products = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = products[-1]
+            next_cursor = encode_cursor("popular", last["sold_count"], last["id"])
+        return self._current_stock(products), next_cursor
+
+    def _current_stock(self, products):
+        """
+        Copies of board products carrying their committed stock. Sales take
+        stock without logging a change, so the board's copy can be behind.
+        """
+        if not products:
+            return []
+        product_ids = [product["id"] for product in products]
+        cursor = self.db.get_connection().cursor()
+        cursor.execute(
+            f"SELECT id, stock FROM products WHERE id IN ({', '.join('?' * len(product_ids))})",
+            product_ids
+        )
+        stock = {row["id"]: row["stock"] for row in cursor.fetchall()}
+        # A product deleted since the refresh is left out
+        return [{**product, "stock": stock[product["id"]]} for product in products if product["id"] in stock]
+
+    def check(self, repair=False):
+        """
+        Compare every board with the database and return the differences; with
+        repair, rebuild when there are any
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        with self._lock:
+            # One read transaction, so the boards and the queries see the same data
+            conn.commit()
+            cursor.execute("BEGIN")
+            try:
+                self.db.refresh_catalog_version()
+                self.refresh()
+                problems = []
+                for scope, board in self._boards.items():
+                    where, params = ("", []) if scope is None else ("WHERE c.slug = ?", [scope])
+                    limit = len(board.keys) + 1
+                    cursor.execute(
+                        "SELECT p.id, p.sold_count, p.stock > 0 FROM products p "
+                        f"JOIN categories c ON p.category_id = c.id {where} "
+                        "ORDER BY p.sold_count DESC, p.id ASC LIMIT ?",
+                        [*params, limit]
+                    )
+                    expected = [tuple(row) for row in cursor.fetchall()]
+                    actual = [(p["id"], p["sold_count"], int(p["stock"] > 0)) for p in board.products]
+                    if board.complete and len(expected) > len(actual):
+                        problems.append({"scope": scope, "error": "board is missing products"})
+                    expected = expected[:len(actual)]
+                    if expected != actual:
+                        first = next((i for i, (want, have) in enumerate(zip(expected, actual)) if want != have),
+                                     min(len(expected), len(actual)))
+                        problems.append({
+                            "scope": scope,
+                            "position": first,
+                            "expected": expected[first] if first < len(expected) else None,
+                            "actual": actual[first] if first < len(actual) else None,
+                        })
+            finally:
+                conn.rollback()
+            if problems:
+                log.warning("leaderboard.drift", "Leaderboard differs from the database", problems=problems)
+                if repair:
+                    self.rebuild()
+        return {"consistent": not problems, "boards": len(self._boards), "problems": problems,
+                "repaired": bool(problems) and repair}
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                "size": self.size,
+                "boards": len(self._boards),
+                "incomplete": sum(not board.complete for board in self._boards.values()),
+                "lastChange": self._last_change,
+            }
@@ -0,0 +1,230 @@
+"""
+Structured, non-blocking logging for the FertiShop backend.
+
+Request threads only put records on a queue; a background thread formats and
+writes them. When the queue is full, records are dropped and counted
+rather than making a request wait on stderr.
+
+Every record names an event ("auth.failed", "order.created", ...) and carries
+its details as fields instead of formatted text. Noisy events can be sampled.
+
+Environment:
+    LOG_LEVEL       DEBUG, INFO (default), WARNING or ERROR
+    LOG_FORMAT      json (default) or text
+    LOG_SAMPLE      per-event sample rates, e.g. "cart.add=0.1,auth.failed=0.5"
+    LOG_QUEUE_SIZE  records buffered before new ones are dropped (default 10000)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+ROOT_LOGGER = "fertishop"
+
+_state = {"handler": None, "listener": None, "configured": False}
+_lock = threading.Lock()
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None),
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        fields = " ".join(f"{key}={value}" for key, value in (getattr(record, "fields", None) or {}).items())
+        line = f"{stamp} {record.levelname:<7} {getattr(record, 'event', '-')} {record.getMessage()}"
+        if fields:
+            line += f" {fields}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records for events with a sample rate below 1
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, "event", None))
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: records that do not fit are counted and dropped
+    """
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only pin down exception text here
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample_rates(spec):
+    # "cart.add=0.1,auth.failed=0.5" -> {"cart.add": 0.1, "auth.failed": 0.5}
+    rates = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def configure(level=None, fmt=None, sample_rates=None, queue_size=None, stream=None):
+    """
+    Route the fertishop loggers through a bounded queue to a background writer
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.getenv("LOG_SAMPLE", ""))
+    if queue_size is None:
+        queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    with _lock:
+        shutdown()
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+
+        handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        handler.addFilter(SamplingFilter(sample_rates))
+        listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+        listener.start()
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers = [handler]
+        root.setLevel(level)
+        root.propagate = False
+
+        _state.update(handler=handler, listener=listener, configured=True,
+                      settings=(level, fmt, sample_rates, queue_size, stream))
+
+
+def ensure_configured():
+    if not _state["configured"]:
+        configure()
+
+
+def shutdown():
+    """
+    Flush queued records and stop the background writer
+    """
+    listener = _state.get("listener")
+    if listener is not None:
+        listener.stop()
+        _state["listener"] = None
+
+
+def stats():
+    handler = _state.get("handler")
+    if handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": handler.queue.qsize(), "dropped": handler.dropped}
+
+
+def _after_fork():
+    # The writer thread does not survive fork; give the child its own queue and writer
+    if _state["configured"]:
+        global _lock
+        _lock = threading.Lock()
+        _state["listener"] = None
+        level, fmt, sample_rates, queue_size, stream = _state["settings"]
+        configure(level, fmt, sample_rates, queue_size, stream)
+
+
+def _before_fork():
+    # Park the writer so no thread holds the stream or queue locks across the fork
+    listener = _state.get("listener")
+    if listener is not None:
+        listener.stop()
+
+
+def _after_fork_in_parent():
+    # Records queued while the writer was parked are still in its queue
+    listener = _state.get("listener")
+    if listener is not None:
+        listener.start()
+
+
+if hasattr(os, "register_at_fork"):  # not on Windows, which never forks
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent,
+                        after_in_child=_after_fork)
+
+# Write out whatever is still queued when the process exits
+atexit.register(shutdown)
+
+
+class EventLogger:
+    """
+    Thin wrapper that logs an event name, a fixed message and keyword fields
+    """
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+    def _log(self, level, event, message, fields, exc_info=False):
+        # Bail out before building anything when the level is off
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, extra={"event": event, "fields": fields}, exc_info=exc_info)
+
+    @property
+    def debug_enabled(self):
+        # For callers that would otherwise build costly fields just to drop them
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, event, message, **fields):
+        self._log(logging.DEBUG, event, message, fields)
+
+    def info(self, event, message, **fields):
+        self._log(logging.INFO, event, message, fields)
+
+    def warning(self, event, message, **fields):
+        self._log(logging.WARNING, event, message, fields)
+
+    def error(self, event, message, **fields):
+        self._log(logging.ERROR, event, message, fields)
+
+    def exception(self, event, message, **fields):
+        self._log(logging.ERROR, event, message, fields, exc_info=True)
+
+
+def get_logger(name):
+    ensure_configured()
+    return EventLogger(name)
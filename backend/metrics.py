@@ -0,0 +1,266 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+Each process keeps its own counters behind one lock; recording a request is a
+dictionary update and a bisect. With a metrics directory set (the pre-forking
+server sets one), every process also writes its counters to
+<dir>/metrics-<pid>.json about once a second, and a scrape adds up the files
+of every worker. Files of exited workers are folded into metrics-archive.json
+so counters never go backwards when a worker is recycled.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Latency buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ARCHIVE_FILE = "metrics-archive.json"
+LOCK_FILE = ".metrics.lock"
+
+
+def _empty():
+    return {
+        "latency": {},  # "route|method" -> [bucket counts..., +Inf count, sum]
+        "requests": {},  # "route|method|status" -> count
+        "bytes": {},  # "route|method" -> response bytes
+        "queries": {},  # "route|method" -> SQLite statements
+        "query_seconds": {},  # "route|method" -> seconds executing them
+    }
+
+
+def merge(into, other):
+    """
+    Add the counters in other to into
+    """
+    for name, series in other.items():
+        target = into.setdefault(name, {})
+        for key, value in series.items():
+            if isinstance(value, list):
+                current = target.get(key)
+                target[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                target[key] = target.get(key, 0) + value
+    return into
+
+
+class Metrics:
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._data = _empty()
+        self._in_flight = 0
+        self._dirty = False
+        self._flusher = None
+        self.directory = None
+        if directory:
+            self.set_directory(directory)
+        if hasattr(os, "register_at_fork"):  # not on Windows, which never forks
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def set_directory(self, directory):
+        """
+        Share counters with sibling processes through files in directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._start_flusher()
+
+    def _after_fork(self):
+        # A worker starts from zero; its parent's counts are already on disk
+        self._lock = threading.Lock()
+        self._data = _empty()
+        self._in_flight = 0
+        self._dirty = False
+        self._flusher = None
+        if self.directory:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def observe(self, route, method, status, duration, size, queries, query_seconds):
+        """
+        Record one finished request
+        """
+        key = f"{route}|{method}"
+        index = bisect.bisect_left(BUCKETS, duration)
+        data = self._data
+        with self._lock:
+            latency = data["latency"].get(key)
+            if latency is None:
+                latency = data["latency"][key] = [0] * (len(BUCKETS) + 2)
+            latency[index] += 1
+            latency[-1] += duration
+
+            status_key = f"{key}|{status}"
+            data["requests"][status_key] = data["requests"].get(status_key, 0) + 1
+            data["bytes"][key] = data["bytes"].get(key, 0) + size
+            data["queries"][key] = data["queries"].get(key, 0) + queries
+            data["query_seconds"][key] = data["query_seconds"].get(key, 0.0) + query_seconds
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._data)), self._in_flight
+
+    # Sharing between processes
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty or self._in_flight:
+                self.flush()
+
+    def flush(self):
+        """
+        Write this process's counters to its file, atomically
+        """
+        if not self.directory:
+            return
+        with self._lock:
+            payload = json.dumps({"data": self._data, "in_flight": self._in_flight})
+            self._dirty = False
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".metrics-")
+        with os.fdopen(fd, "w") as f:
+            f.write(payload)
+        os.replace(tmp, self._path(os.getpid()))
+
+    def collect(self):
+        """
+        Return (counters, in-flight) summed over every process sharing the directory
+        """
+        data, in_flight = self.snapshot()
+        if not self.directory:
+            return data, in_flight
+
+        # POSIX only, like the pre-forking server that shares a directory
+        import fcntl
+
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            archive = _read(archive_path) or {"data": _empty()}
+            archived = False
+
+            for name in os.listdir(self.directory):
+                pid = _worker_pid(name)
+                # Our own counters come from memory, which is fresher than our file
+                if pid is None or pid == os.getpid():
+                    continue
+                path = os.path.join(self.directory, name)
+                content = _read(path)
+                if content is None:
+                    continue
+                if _alive(pid):
+                    merge(data, content["data"])
+                    in_flight += content.get("in_flight", 0)
+                else:
+                    # Fold a finished worker into the archive so its counts survive
+                    merge(archive["data"], content["data"])
+                    os.remove(path)
+                    archived = True
+
+            if archived:
+                with open(archive_path + ".tmp", "w") as f:
+                    json.dump(archive, f)
+                os.replace(archive_path + ".tmp", archive_path)
+            merge(data, archive["data"])
+        return data, in_flight
+
+    def render(self):
+        """
+        Format the collected metrics in the Prometheus text exposition format
+        """
+        data, in_flight = self.collect()
+        lines = [
+            "# HELP fertishop_http_request_duration_seconds Request latency by route.",
+            "# TYPE fertishop_http_request_duration_seconds histogram",
+        ]
+        for key in sorted(data["latency"]):
+            labels = _labels(key, ("route", "method"))
+            counts = data["latency"][key]
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), counts[:-1]):
+                cumulative += count
+                lines.append(f'fertishop_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"fertishop_http_request_duration_seconds_sum{{{labels}}} {counts[-1]:.6f}")
+            lines.append(f"fertishop_http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+        lines += [
+            "# HELP fertishop_http_requests_total Requests by route and status.",
+            "# TYPE fertishop_http_requests_total counter",
+        ]
+        for key in sorted(data["requests"]):
+            lines.append(f"fertishop_http_requests_total{{{_labels(key, ('route', 'method', 'status'))}}} "
+                         f"{data['requests'][key]}")
+
+        lines += [
+            "# HELP fertishop_http_requests_in_flight Requests being served right now.",
+            "# TYPE fertishop_http_requests_in_flight gauge",
+            f"fertishop_http_requests_in_flight {in_flight}",
+        ]
+
+        for name, series, help_text in (
+            ("fertishop_http_response_bytes_total", "bytes", "Response body bytes by route."),
+            ("fertishop_db_queries_total", "queries", "SQLite statements by route."),
+            ("fertishop_db_query_seconds_total", "query_seconds", "Time spent executing SQLite statements by route."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for key in sorted(data[series]):
+                value = data[series][key]
+                value = f"{value:.6f}" if isinstance(value, float) else value
+                lines.append(f"{name}{{{_labels(key, ('route', 'method'))}}} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key, names):
+    # "/api/products|GET" -> route="/api/products",method="GET"
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, key.split("|")))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _worker_pid(name):
+    # "metrics-1234.json" -> 1234; None for the archive and anything else
+    if not (name.startswith("metrics-") and name.endswith(".json")):
+        return None
+    pid = name[len("metrics-"):-len(".json")]
+    return int(pid) if pid.isdigit() else None
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,476 @@
+"""
+Versioned schema migrations for the FertiShop database.
+
+Each migration runs in its own transaction together with the schema_version row
+that records it, so a failed migration leaves the database at the previous
+version. Add new migrations to the end of MIGRATIONS; never edit one that has
+shipped.
+
+Usage:
+    python migrations.py status [--db fertishop.db]
+    python migrations.py upgrade [--db fertishop.db] [--target VERSION]
+"""
+import argparse
+import sqlite3
+import sys
+
+
+class MigrationDeferred(Exception):
+    """
+    Raised by a migration that cannot apply on this SQLite build. It is left
+    unrecorded, so the next upgrade on a build that supports it applies it.
+    """
+
+
+def initial_schema(cursor):
+    # Create User table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Create Category table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        slug TEXT UNIQUE NOT NULL,
+        image TEXT
+    )
+    ''')
+
+    # Create Product table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        price REAL NOT NULL,
+        category_id INTEGER,
+        image TEXT,
+        sold_count INTEGER DEFAULT 0,
+        stock INTEGER DEFAULT 0,
+        treatment_for TEXT,
+        FOREIGN KEY (category_id) REFERENCES categories (id)
+    )
+    ''')
+
+    # Create UseCase table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS use_cases (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        slug TEXT UNIQUE NOT NULL
+    )
+    ''')
+
+    # Create Product-UseCase join table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS product_use_cases (
+        product_id INTEGER,
+        use_case_id INTEGER,
+        PRIMARY KEY (product_id, use_case_id),
+        FOREIGN KEY (product_id) REFERENCES products (id),
+        FOREIGN KEY (use_case_id) REFERENCES use_cases (id)
+    )
+    ''')
+
+    # Create Order table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        total REAL NOT NULL,
+        status TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        address TEXT NOT NULL,
+        payment_method TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+    # Create OrderItem table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        price REAL NOT NULL,
+        quantity INTEGER NOT NULL,
+        image TEXT,
+        FOREIGN KEY (order_id) REFERENCES orders (id),
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    ''')
+
+    # Create Cart table (to store cart items for users)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS cart_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (product_id) REFERENCES products (id),
+        UNIQUE(user_id, product_id)
+    )
+    ''')
+
+
+def product_search(cursor):
+    # Full-text index over the searchable product columns. It is an external
+    # content table, so triggers keep it in step with products. Stock and
+    # sold_count updates do not touch it.
+    try:
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description, treatment_for,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite was built without FTS5; product search falls back to LIKE
+        # until an upgrade runs on a build that has it
+        raise MigrationDeferred("SQLite was built without FTS5") from e
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, description, treatment_for)
+        VALUES (new.id, new.name, new.description, new.treatment_for);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description, treatment_for)
+        VALUES ('delete', old.id, old.name, old.description, old.treatment_for);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS products_fts_au
+    AFTER UPDATE OF name, description, treatment_for ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description, treatment_for)
+        VALUES ('delete', old.id, old.name, old.description, old.treatment_for);
+        INSERT INTO products_fts (rowid, name, description, treatment_for)
+        VALUES (new.id, new.name, new.description, new.treatment_for);
+    END
+    ''')
+
+    # Index products that existed before the search table did
+    cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+def hot_path_indexes(cursor):
+    # Items for a page of orders
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)")
+
+    # Order history, newest first, paged on (created_at, id)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_orders_user_created "
+        "ON orders (user_id, created_at DESC, id DESC)"
+    )
+
+    # Product listings in each sort order, with id as the keyset tiebreak
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_products_sold_count ON products (sold_count DESC, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_products_category_sold_count "
+        "ON products (category_id, sold_count DESC, id)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_price ON products (price, id)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_products_price_desc ON products (price DESC, id)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products (name, id)")
+
+    # Filtering products by use case; the primary key only covers product_id first
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_product_use_cases_use_case "
+        "ON product_use_cases (use_case_id, product_id)"
+    )
+
+    # cart_items(user_id) lookups are already served by the UNIQUE(user_id, product_id) index
+
+
+def token_revocations(cursor):
+    # Log of revoked access tokens. A row either names one token by jti (logout)
+    # or revokes every token a user was issued before revoked_before (password
+    # change). Rows can be purged once expires_at has passed.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS token_revocations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        jti TEXT,
+        user_id INTEGER,
+        revoked_before INTEGER,  -- milliseconds since the epoch
+        expires_at INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_token_revocations_expires_at "
+        "ON token_revocations (expires_at)"
+    )
+
+
+CATALOG_TABLES = ("products", "categories", "use_cases", "product_use_cases")
+
+
+def catalog_version(cursor):
+    # A single counter bumped by triggers on every catalog write, so processes
+    # sharing the database file can tell when their cached catalog is stale.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS catalog_meta (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 1)")
+
+    for table in CATALOG_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_catalog_version_{event.lower()}
+            AFTER {event} ON {table} BEGIN
+                UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+            END
+            ''')
+
+
+def inventory_reservations(cursor):
+    # Stock held for a shopper between checkout start and order placement. A
+    # hold counts against availability until expires_at; expired rows are
+    # ignored by every check and deleted by the sweeper.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_reservations (
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        expires_at REAL NOT NULL,  -- seconds since the epoch
+        PRIMARY KEY (user_id, product_id)
+    )
+    ''')
+    # Held quantity per product, read by every reservation and checkout
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_inventory_reservations_product "
+        "ON inventory_reservations (product_id, expires_at, user_id, quantity)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_inventory_reservations_expires_at "
+        "ON inventory_reservations (expires_at)"
+    )
+
+
+def sold_count_deltas(cursor):
+    # Append-only log of units sold, so checkouts do not rewrite the hot
+    # products rows' sold_count and its indexes. The aggregator folds the
+    # rows into products.sold_count and deletes them in one transaction.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sold_count_deltas (
+        id INTEGER PRIMARY KEY,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL
+    )
+    ''')
+
+
+# Product columns the in-memory rankings serve; a change to any is logged
+PRODUCT_CHANGE_COLUMNS = ("name", "description", "price", "category_id", "image", "sold_count", "treatment_for")
+
+
+def product_changes(cursor):
+    # Ids of products written since each process last looked, so in-memory
+    # rankings can apply other processes' writes without rereading the catalog.
+    # A NULL product_id means a category or use case changed under many
+    # products. AUTOINCREMENT keeps ids rising even after old rows are pruned.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS product_changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER
+    )
+    ''')
+    for table, column in (("products", "id"), ("product_use_cases", "product_id")):
+        for event, row in (("INSERT", "NEW"), ("DELETE", "OLD")):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()}
+            AFTER {event} ON {table} BEGIN
+                INSERT INTO product_changes (product_id) VALUES ({row}.{column});
+            END
+            ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS product_use_cases_changes_update
+    AFTER UPDATE ON product_use_cases BEGIN
+        INSERT INTO product_changes (product_id) VALUES (NEW.product_id);
+    END
+    ''')
+    # A sale only decrements stock; it is logged when its sold_count is
+    # folded, which rereads the whole row. Writing a row per order line here
+    # would undo what deferring sold_count saves. Restocks and stock reaching
+    # or leaving zero, which decides the featured list, are logged at once.
+    changed = " OR ".join(f"OLD.{name} IS NOT NEW.{name}" for name in PRODUCT_CHANGE_COLUMNS)
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS products_changes_update
+    AFTER UPDATE OF {", ".join(PRODUCT_CHANGE_COLUMNS)}, stock ON products
+    WHEN {changed}
+        OR NEW.stock > OLD.stock
+        OR (OLD.stock > 0) IS NOT (NEW.stock > 0)
+    BEGIN
+        INSERT INTO product_changes (product_id) VALUES (NEW.id);
+    END
+    ''')
+    for table in ("categories", "use_cases"):
+        for event in ("UPDATE", "DELETE"):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_changes_{event.lower()}
+            AFTER {event} ON {table} BEGIN
+                INSERT INTO product_changes (product_id) VALUES (NULL);
+            END
+            ''')
+
+
+def leaderboard_progress(cursor):
+    # How far each process has read product_changes. Rows are pruned only
+    # once every live process has read them; a process whose row has not been
+    # updated for a while is taken to have exited.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS leaderboard_progress (
+        pid INTEGER PRIMARY KEY,
+        last_change INTEGER NOT NULL,
+        updated_at REAL NOT NULL  -- seconds since the epoch
+    )
+    ''')
+
+
+def sold_count_delta_index(cursor):
+    # Lets the fold sum each product's deltas with a correlated subquery,
+    # which older SQLite builds support where UPDATE ... FROM is missing
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sold_count_deltas_product ON sold_count_deltas (product_id, quantity)"
+    )
+
+
+# (version, name, function) in the order they must be applied
+MIGRATIONS = [
+    (1, "initial_schema", initial_schema),
+    (2, "product_search", product_search),
+    (3, "hot_path_indexes", hot_path_indexes),
+    (4, "token_revocations", token_revocations),
+    (5, "catalog_version", catalog_version),
+    (6, "inventory_reservations", inventory_reservations),
+    (7, "sold_count_deltas", sold_count_deltas),
+    (8, "product_changes", product_changes),
+    (9, "leaderboard_progress", leaderboard_progress),
+    (10, "sold_count_delta_index", sold_count_delta_index),
+]
+
+
+def ensure_version_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.commit()
+
+
+def current_version(conn):
+    """
+    Return the highest applied migration version, or 0 for an empty database
+    """
+    ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def pending(conn):
+    """
+    Return the migrations that have not been applied yet, in order, including
+    deferred ones that a later migration has already overtaken
+    """
+    ensure_version_table(conn)
+    applied = {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def upgrade(conn, target=None):
+    """
+    Apply pending migrations up to target (default: latest) and return the new
+    version. A migration that raises MigrationDeferred is rolled back and
+    skipped without being recorded.
+    """
+    for version, name, migrate in pending(conn):
+        if target is not None and version > target:
+            break
+
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the write lock
+            cursor.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,))
+            if cursor.fetchone():
+                conn.commit()
+                continue
+
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (version, name)
+            )
+            conn.commit()
+        except MigrationDeferred:
+            conn.rollback()
+            continue
+        except Exception:
+            conn.rollback()
+            raise
+
+    return current_version(conn)
+
+
+def status(conn):
+    """
+    Return (version, name, applied_at or None) for every known migration
+    """
+    ensure_version_table(conn)
+    applied = {
+        row[0]: row[1]
+        for row in conn.execute("SELECT version, applied_at FROM schema_version")
+    }
+    return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the FertiShop database schema")
+    parser.add_argument("command", choices=["status", "upgrade"])
+    parser.add_argument("--db", default="fertishop.db", help="database file")
+    parser.add_argument("--target", type=int, help="stop after this migration version")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == "upgrade":
+            before = current_version(conn)
+            after = upgrade(conn, target=args.target)
+            print(f"Schema upgraded from version {before} to {after}")
+        else:
+            for version, name, applied_at in status(conn):
+                state = f"applied {applied_at}" if applied_at else "pending"
+                print(f"{version:>4}  {name:<24} {state}")
+            remaining = len(pending(conn))
+            print(f"Current version: {current_version(conn)} ({remaining} pending)")
+            return 1 if remaining else 0
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
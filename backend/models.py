@@ -1,137 +1,339 @@
 import sqlite3
 import json
 import os
+import base64
+import re
 from datetime import datetime, timedelta
 import threading
+import time
+import weakref
+
+import migrations
+from cache import LRUCache
+from pool import ConnectionPool
+from profiler import QueryProfiler
+from logs import get_logger
+
+log = get_logger("models")
+
+
+def encode_cursor(*values):
+    # Opaque continuation token for keyset pagination
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, size):
+    # Inverse of encode_cursor; raises ValueError for anything we did not issue
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+class CountingCursor(sqlite3.Cursor):
+    # Counts and times every statement run through the cursor on its connection
+    def execute(self, *args, **kwargs):
+        connection = self.connection
+        connection.query_count += 1
+        start = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            connection.query_time += time.perf_counter() - start
+    
+    def executemany(self, *args, **kwargs):
+        connection = self.connection
+        connection.query_count += 1
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            connection.query_time += time.perf_counter() - start
+
+
+class CountingConnection(sqlite3.Connection):
+    # Connection whose cursors report how many statements they ran and for how long
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_count = 0
+        self.query_time = 0.0
+    
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+
+class ProfilingCursor(CountingCursor):
+    # Adds rows and fetch time to the statement the profiler traced for each execute
+    _statement = None
+    
+    def _executed(self, profile):
+        statement = profile.current
+        self._statement = statement
+        if statement is not None and not profile.paused:
+            statement.finished = time.perf_counter()
+            if self.rowcount > 0:
+                statement.rows += self.rowcount
+    
+    def _fetched(self, count):
+        statement = self._statement
+        if statement is not None:
+            statement.rows += count
+            statement.finished = time.perf_counter()
+    
+    def _run(self, method, batch, args, kwargs):
+        profile = self.connection.profile
+        profile.executing = True
+        profile.batch = batch
+        profile.opened = None
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            profile.executing = profile.batch = False
+        self._executed(profile)
+        return result
+    
+    def execute(self, *args, **kwargs):
+        return self._run(super().execute, False, args, kwargs)
+    
+    def executemany(self, *args, **kwargs):
+        return self._run(super().executemany, True, args, kwargs)
+    
+    def fetchone(self):
+        row = super().fetchone()
+        self._fetched(row is not None)
+        return row
+    
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        self._fetched(len(rows))
+        return rows
+    
+    def fetchall(self):
+        rows = super().fetchall()
+        self._fetched(len(rows))
+        return rows
+    
+    def __next__(self):
+        row = super().__next__()
+        self._fetched(1)
+        return row
+
+
+class ProfilingConnection(CountingConnection):
+    # Connection hooked up to a QueryProfiler; see profiler.py
+    profile = None
+    
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
+
 
 class Database:
-    def __init__(self, db_file="fertishop.db"):
+    # Applied to every new connection; WAL lets readers run alongside a writer
+    DEFAULT_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,  # KiB, so about 16 MB per connection
+        "mmap_size": 134217728,
+        "temp_store": "MEMORY",
+    }
+    
+    def __init__(self, db_file="fertishop.db", cache_size=None, cache_ttl=None,
+                 pool_size=None, pool_timeout=None, pragmas=None, profiler=None):
         self.db_file = db_file
         self.conn = None
-        self._local = threading.local()  # Thread-local storage for connections
+        self._local = threading.local()  # Connection checked out by each thread
+        
+        # Debug mode: trace every statement on every connection (SQL_PROFILE=1)
+        if profiler is None and os.getenv("SQL_PROFILE", "0") == "1":
+            profiler = QueryProfiler()
+        self.profiler = profiler
+        
+        # Connections come from a bounded pool. A thread keeps the one it checked
+        # out until release_connection(), which the Flask app calls at teardown.
+        self.pragmas = {**self.DEFAULT_PRAGMAS, **self._pragmas_from_env(), **(pragmas or {})}
+        if pool_size is None:
+            pool_size = int(os.getenv("DB_POOL_SIZE", "8"))
+        if pool_timeout is None:
+            pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+        self.pool = ConnectionPool(self._connect, max_size=pool_size, timeout=pool_timeout)
+        
+        # Catalog reads are cached under the catalog version they were read at.
+        # Triggers bump the version stored in catalog_meta with every catalog
+        # write. This process re-reads it straight after its own writes and at
+        # most catalog_version_ttl seconds apart otherwise, which bounds how long
+        # another process's write can go unseen.
+        if cache_size is None:
+            cache_size = int(os.getenv("CATALOG_CACHE_SIZE", "512"))
+        if cache_ttl is None:
+            cache_ttl = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+        self.catalog_cache = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self.catalog_version_ttl = float(os.getenv("CATALOG_VERSION_TTL", "1"))
+        self._catalog_version = 0
+        self._version_checked_at = None
+        self._catalog_lock = threading.Lock()
+        
+        # Connections must never cross a fork; a child starts with an empty pool
+        self._inherited_pools = []
+        self_ref = weakref.ref(self)
+        if hasattr(os, "register_at_fork"):  # not on Windows, which never forks
+            os.register_at_fork(after_in_child=lambda: self_ref() and self_ref()._after_fork())
+        
+        self.fts_enabled = False
         self.initialize_db()
         
+    @staticmethod
+    def _pragmas_from_env():
+        # SQLITE_PRAGMAS="synchronous=FULL,cache_size=-64000" overrides the defaults
+        pragmas = {}
+        for item in os.getenv("SQLITE_PRAGMAS", "").split(","):
+            if "=" in item:
+                name, value = item.split("=", 1)
+                pragmas[name.strip()] = value.strip()
+        return pragmas
+    
+    def _connect(self):
+        # Pooled connections move between threads, so the same-thread check is off
+        factory = ProfilingConnection if self.profiler else CountingConnection
+        conn = sqlite3.connect(self.db_file, factory=factory, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if self.profiler:
+            self.profiler.install(conn)
+        return conn
+    
+    def _after_fork(self):
+        # Keep the parent's connections referenced so they are never closed here
+        self._inherited_pools.append(self.pool)
+        self.pool = ConnectionPool(
+            self._connect,
+            max_size=self.pool.max_size,
+            timeout=self.pool.timeout,
+            health_check_interval=self.pool.health_check_interval
+        )
+        self._local = threading.local()
+        self._catalog_lock = threading.Lock()
+        self._version_checked_at = None
+    
     def get_connection(self):
-        # Create a new connection for each thread if it doesn't exist
-        if not hasattr(self._local, 'conn') or self._local.conn is None:
-            self._local.conn = sqlite3.connect(self.db_file)
-            self._local.conn.row_factory = sqlite3.Row
+        # Check a connection out of the pool the first time this thread needs one
+        if getattr(self._local, 'conn', None) is None:
+            self._local.conn = self.pool.acquire()
         return self._local.conn
-        
+    
+    def release_connection(self):
+        # Hand this thread's connection back to the pool
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            self.pool.release(conn)
+    
+    def reset_query_count(self):
+        # Start a fresh per-request query count on this thread's connection
+        conn = self.get_connection()
+        conn.query_count = 0
+        conn.query_time = 0.0
+        if self.profiler:
+            conn.profile.reset()
+    
+    def held_connection(self):
+        # This thread's checked-out connection, or None; never waits on the pool
+        return getattr(self._local, 'conn', None)
+    
+    def get_query_count(self):
+        # Number of statements run on this thread's connection since the last reset
+        conn = self.held_connection()
+        return conn.query_count if conn is not None else 0
+    
+    def get_query_time(self):
+        # Seconds spent executing those statements
+        conn = self.held_connection()
+        return conn.query_time if conn is not None else 0.0
+    
+    def profile_summary(self, label=None):
+        # Profile of the statements since the last reset, or None when profiling is off
+        conn = self.held_connection()
+        if not self.profiler or conn is None:
+            return None
+        return self.profiler.summarize(conn, label)
+        
+    @property
+    def catalog_version(self):
+        checked_at = self._version_checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.catalog_version_ttl:
+            self.refresh_catalog_version()
+        return self._catalog_version
+    
+    def refresh_catalog_version(self):
+        # Read the committed catalog version, dropping cached reads if it moved
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT version FROM catalog_meta WHERE id = 1")
+        version = cursor.fetchone()[0]
+        
+        with self._catalog_lock:
+            if version != self._catalog_version:
+                self._catalog_version = version
+                self.catalog_cache.clear()
+            self._version_checked_at = time.monotonic()
+        return version
+    
+    def bump_catalog_version(self):
+        # Call after committing any write to products, categories or use cases;
+        # the triggers have already moved the stored version
+        return self.refresh_catalog_version()
+    
+    def cached(self, key, loader):
+        # Read the version before loading so a concurrent write can only make the
+        # stored entry unreachable, never stale
+        version = self.catalog_version
+        return self.catalog_cache.get_or_load((version,) + key, loader)
+    
     def close_connection(self):
-        if hasattr(self._local, 'conn') and self._local.conn:
-            self._local.conn.close()
+        # Close this thread's connection rather than returning it to the pool
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
             self._local.conn = None
+            self.pool.discard(conn)
+    
+    def close(self):
+        # Release this thread's connection and close every pooled connection
+        self.release_connection()
+        self.pool.close()
     
     def initialize_db(self):
+        # Bring the schema up to date; see migrations.py for the DDL itself
         conn = self.get_connection()
-        cursor = conn.cursor()
+        migrations.upgrade(conn)
         
-        # Create User table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create Category table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            slug TEXT UNIQUE NOT NULL,
-            image TEXT
-        )
-        ''')
-        
-        # Create Product table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            price REAL NOT NULL,
-            category_id INTEGER,
-            image TEXT,
-            sold_count INTEGER DEFAULT 0,
-            stock INTEGER DEFAULT 0,
-            treatment_for TEXT,
-            FOREIGN KEY (category_id) REFERENCES categories (id)
-        )
-        ''')
-        
-        # Create UseCase table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS use_cases (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            slug TEXT UNIQUE NOT NULL
-        )
-        ''')
-        
-        # Create Product-UseCase join table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS product_use_cases (
-            product_id INTEGER,
-            use_case_id INTEGER,
-            PRIMARY KEY (product_id, use_case_id),
-            FOREIGN KEY (product_id) REFERENCES products (id),
-            FOREIGN KEY (use_case_id) REFERENCES use_cases (id)
-        )
-        ''')
-        
-        # Create Order table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            total REAL NOT NULL,
-            status TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            address TEXT NOT NULL,
-            payment_method TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
-        
-        # Create OrderItem table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS order_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id INTEGER NOT NULL,
-            product_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            price REAL NOT NULL,
-            quantity INTEGER NOT NULL,
-            image TEXT,
-            FOREIGN KEY (order_id) REFERENCES orders (id),
-            FOREIGN KEY (product_id) REFERENCES products (id)
-        )
-        ''')
-        
-        # Create Cart table (to store cart items for users)
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cart_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            product_id INTEGER NOT NULL,
-            quantity INTEGER NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (product_id) REFERENCES products (id),
-            UNIQUE(user_id, product_id)
-        )
-        ''')
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")
+        self.fts_enabled = cursor.fetchone() is not None
         
-        conn.commit()
+        self.release_connection()
 
 
 class User:
-    def __init__(self, db):
+    def __init__(self, db, cache_size=None, cache_ttl=None):
         self.db = db
+        
+        # Optional cache of public user records for the auth path; disabled unless
+        # USER_CACHE_TTL (seconds) is set. Every write to a user invalidates it.
+        if cache_ttl is None:
+            cache_ttl = float(os.getenv("USER_CACHE_TTL", "0"))
+        if cache_size is None:
+            cache_size = int(os.getenv("USER_CACHE_SIZE", "10000"))
+        self.cache = LRUCache(max_size=cache_size, ttl=cache_ttl) if cache_ttl > 0 else None
+    
+    def invalidate(self, user_id):
+        if self.cache is not None:
+            self.cache.delete(str(user_id))
     
     def create(self, name, email, password):
         conn = self.db.get_connection()
@@ -147,6 +349,32 @@ class User:
         except sqlite3.IntegrityError:
             return None
     
+    def update(self, user_id, name=None, email=None):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(
+                "UPDATE users SET name = COALESCE(?, name), email = COALESCE(?, email) WHERE id = ?",
+                (name, email, user_id)
+            )
+            conn.commit()
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False
+        finally:
+            self.invalidate(user_id)
+        return cursor.rowcount > 0
+    
+    def update_password(self, user_id, password):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("UPDATE users SET password = ? WHERE id = ?", (password, user_id))
+        conn.commit()
+        self.invalidate(user_id)
+        return cursor.rowcount > 0
+    
     def get_by_email(self, email):
         conn = self.db.get_connection()
         cursor = conn.cursor()
@@ -161,7 +389,18 @@ class User:
     def get_by_id(self, user_id):
         if not user_id:
             return None
-            
+        
+        if self.cache is None:
+            return self._load_by_id(user_id)
+        
+        user = self.cache.get(str(user_id))
+        if user is None:
+            user = self._load_by_id(user_id)
+            if user:
+                self.cache.set(str(user_id), user)
+        return user
+    
+    def _load_by_id(self, user_id):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -173,11 +412,135 @@ class User:
         return None
 
 
+class TokenRevocation:
+    """
+    Revoked access tokens, held in memory for O(1) checks and persisted in
+    token_revocations so they survive restarts and reach other processes.
+    """
+    
+    # How often (seconds) to pick up revocations written by other processes
+    REFRESH_INTERVAL = 5.0
+    # How often (seconds) a revocation also deletes rows whose tokens have expired
+    PURGE_INTERVAL = 3600.0
+    
+    def __init__(self, db, refresh_interval=None, purge_interval=None):
+        self.db = db
+        self.refresh_interval = self.REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        self.purge_interval = self.PURGE_INTERVAL if purge_interval is None else purge_interval
+        self._jtis = {}  # jti -> expires_at
+        self._cutoffs = {}  # user id -> (revoked_before in ms, expires_at)
+        self._last_id = 0
+        self._last_refresh = None
+        self._last_purge = None
+        self._purged = 0
+        self._lock = threading.Lock()
+    
+    def is_revoked(self, payload):
+        """
+        Return True if the decoded token payload has been revoked
+        """
+        if self._last_refresh is None or time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+        
+        if payload.get("jti") in self._jtis:
+            return True
+        cutoff = self._cutoffs.get(payload.get("sub"))
+        return cutoff is not None and payload.get("iat", 0) * 1000 < cutoff[0]
+    
+    def revoke_token(self, payload):
+        """
+        Revoke one token by its jti until it would have expired anyway
+        """
+        jti = payload.get("jti")
+        if not jti:
+            return False
+        self._record(jti=jti, expires_at=int(payload["exp"]))
+        return True
+    
+    def revoke_user_tokens(self, user_id, expires_at):
+        """
+        Revoke every token issued to a user before now; expires_at is when the
+        last of those tokens would have expired
+        """
+        revoked_before = int(time.time() * 1000)
+        self._record(user_id=user_id, revoked_before=revoked_before, expires_at=int(expires_at))
+    
+    def _record(self, jti=None, user_id=None, revoked_before=None, expires_at=None):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "INSERT INTO token_revocations (jti, user_id, revoked_before, expires_at) "
+            "VALUES (?, ?, ?, ?)",
+            (jti, user_id, revoked_before, expires_at)
+        )
+        conn.commit()
+        # Rows are only ever added here, so purging here keeps the table bounded
+        if self._last_purge is None or time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+        self.refresh()
+    
+    def refresh(self):
+        """
+        Load revocations recorded since the last refresh and forget expired ones
+        """
+        with self._lock:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT id, jti, user_id, revoked_before, expires_at FROM token_revocations "
+                "WHERE id > ? ORDER BY id",
+                (self._last_id,)
+            )
+            now = int(time.time())
+            for row in cursor.fetchall():
+                self._last_id = row["id"]
+                if row["expires_at"] <= now:
+                    continue
+                if row["jti"]:
+                    self._jtis[row["jti"]] = row["expires_at"]
+                else:
+                    previous = self._cutoffs.get(row["user_id"], (0, 0))
+                    self._cutoffs[row["user_id"]] = (
+                        max(previous[0], row["revoked_before"]),
+                        max(previous[1], row["expires_at"])
+                    )
+            
+            # Expired tokens are rejected by their signature check already
+            self._jtis = {jti: expires_at for jti, expires_at in self._jtis.items() if expires_at > now}
+            self._cutoffs = {
+                user_id: cutoff for user_id, cutoff in self._cutoffs.items() if cutoff[1] > now
+            }
+            self._last_refresh = time.monotonic()
+    
+    def purge_expired(self):
+        """
+        Delete revocations whose tokens have expired; return how many rows went
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM token_revocations WHERE expires_at <= ?", (int(time.time()),))
+        conn.commit()
+        if cursor.rowcount:
+            log.info("tokens.purged", "Deleted expired token revocations", rows=cursor.rowcount)
+            self._purged += cursor.rowcount
+        return cursor.rowcount
+    
+    def stats(self):
+        return {"revokedTokens": len(self._jtis), "revokedUsers": len(self._cutoffs), "purged": self._purged}
+
+
 class Category:
     def __init__(self, db):
         self.db = db
     
     def get_all(self):
+        return self.db.cached(("categories",), self._load_all)
+    
+    def _load_all(self):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -187,6 +550,9 @@ class Category:
         return [dict(category) for category in categories]
     
     def get_by_slug(self, slug):
+        return self.db.cached(("category", slug), lambda: self._load_by_slug(slug))
+    
+    def _load_by_slug(self, slug):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -207,6 +573,7 @@ class Category:
                 (name, slug, image)
             )
             conn.commit()
+            self.db.bump_catalog_version()
             return {"id": cursor.lastrowid, "name": name, "slug": slug, "image": image}
         except sqlite3.IntegrityError:
             return None
@@ -217,6 +584,9 @@ class UseCase:
         self.db = db
     
     def get_all(self):
+        return self.db.cached(("use_cases",), self._load_all)
+    
+    def _load_all(self):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -226,6 +596,9 @@ class UseCase:
         return [dict(use_case) for use_case in use_cases]
     
     def get_by_slug(self, slug):
+        return self.db.cached(("use_case", slug), lambda: self._load_by_slug(slug))
+    
+    def _load_by_slug(self, slug):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -246,14 +619,39 @@ class UseCase:
                 (name, slug)
             )
             conn.commit()
+            self.db.bump_catalog_version()
             return {"id": cursor.lastrowid, "name": name, "slug": slug}
         except sqlite3.IntegrityError:
             return None
 
 
 class Product:
-    def __init__(self, db):
+    # Maximum number of product ids bound into a single use-case lookup
+    USE_CASE_BATCH_SIZE = 500
+    
+    # Sort name -> (column, row key, direction); ties always break on ascending id
+    SORTS = {
+        "popular": ("p.sold_count", "sold_count", "DESC"),
+        "price-asc": ("p.price", "price", "ASC"),
+        "price-desc": ("p.price", "price", "DESC"),
+        "name": ("p.name", "name", "ASC"),
+        "newest": ("p.id", "id", "DESC"),
+        "relevance": ("m.search_rank", "search_rank", "ASC"),
+    }
+    
+    def __init__(self, db, sold_counts=None, leaderboard=None):
         self.db = db
+        self.sold_counts = sold_counts
+        self.leaderboard = leaderboard  # serves featured and popular pages from memory
+    
+    def _ensure_fresh(self):
+        # Fold deferred sales first if they could be older than the staleness bound
+        if self.sold_counts is not None:
+            self.sold_counts.ensure_fresh()
+    
+    def _cached(self, key, loader):
+        self._ensure_fresh()
+        return self.db.cached(key, loader)
     
     def create(self, name, description, price, category_id, image, stock, treatment_for):
         conn = self.db.get_connection()
@@ -265,6 +663,7 @@ class Product:
             (name, description, price, category_id, image, stock, treatment_for)
         )
         conn.commit()
+        self.db.bump_catalog_version()
         return cursor.lastrowid
     
     def add_use_case(self, product_id, use_case_id):
@@ -277,11 +676,46 @@ class Product:
                 (product_id, use_case_id)
             )
             conn.commit()
+            self.db.bump_catalog_version()
             return True
         except sqlite3.IntegrityError:
             return False
     
+    def _with_use_cases(self, cursor, products):
+        # Load the use cases for a whole result set in one query instead of one per product
+        result = [dict(product) for product in products]
+        if not result:
+            return result
+        
+        by_id = {}
+        for product_dict in result:
+            product_dict['use_cases'] = []
+            by_id[product_dict['id']] = product_dict
+        
+        # Chunk the id list so very large result sets stay under SQLite's bound-parameter limit
+        product_ids = list(by_id)
+        for start in range(0, len(product_ids), self.USE_CASE_BATCH_SIZE):
+            chunk = product_ids[start:start + self.USE_CASE_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"""
+                SELECT puc.product_id, uc.id, uc.name, uc.slug
+                FROM product_use_cases puc
+                JOIN use_cases uc ON uc.id = puc.use_case_id
+                WHERE puc.product_id IN ({placeholders})
+                ORDER BY puc.product_id, puc.use_case_id
+            """, chunk)
+            
+            for row in cursor.fetchall():
+                by_id[row['product_id']]['use_cases'].append(
+                    {"id": row['id'], "name": row['name'], "slug": row['slug']}
+                )
+        
+        return result
+    
     def get_by_id(self, product_id):
+        return self._cached(("product", str(product_id)), lambda: self._load_by_id(product_id))
+    
+    def _load_by_id(self, product_id):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -297,82 +731,159 @@ class Product:
         if not product:
             return None
         
-        product_dict = dict(product)
-        
-        # Get use cases for this product
-        cursor.execute("""
-            SELECT uc.id, uc.name, uc.slug
-            FROM use_cases uc
-            JOIN product_use_cases puc ON uc.id = puc.use_case_id
-            WHERE puc.product_id = ?
-        """, (product_id,))
-        
-        use_cases = cursor.fetchall()
-        product_dict['use_cases'] = [dict(uc) for uc in use_cases]
+        return self._with_use_cases(cursor, [product])[0]
+    
+    def get_all(self, limit=None, offset=0, category_slug=None, use_case_slug=None, search=None,
+                sort=None):
+        key = ("products", limit, offset, category_slug, use_case_slug, search, sort)
+        return self._cached(
+            key,
+            lambda: self._load_all(limit, offset, category_slug, use_case_slug, search, sort)[0]
+        )
+    
+    def get_page(self, limit, cursor=None, category_slug=None, use_case_slug=None, search=None,
+                 sort=None, offset=0):
+        """
+        Return one page of products plus the cursor for the next page (None on the last page).
         
-        return product_dict
+        Pages are keyed on (sort column, id), so a deep page costs the same as the
+        first one and products with equal sort values never repeat or go missing.
+        offset is only honoured without a cursor, for older clients.
+        """
+        if cursor:
+            offset = 0
+        if (self.leaderboard is not None and (sort or "popular") == "popular"
+                and not use_case_slug and not search):
+            self._ensure_fresh()
+            page = self.leaderboard.page(limit, cursor=cursor, offset=offset, category_slug=category_slug)
+            if page is not None:
+                return page
+        key = ("product_page", limit, cursor, offset, category_slug, use_case_slug, search, sort)
+        return self._cached(
+            key,
+            lambda: self._load_all(limit, offset, category_slug, use_case_slug, search, sort, cursor)
+        )
     
-    def get_all(self, limit=None, offset=0, category_slug=None, use_case_slug=None, search=None):
+    def resolve_sort(self, sort, search):
+        # Searches rank by relevance unless the client picks another order
+        if not sort:
+            return "relevance" if search and self.db.fts_enabled else "popular"
+        if sort not in self.SORTS or sort == "relevance" and not (search and self.db.fts_enabled):
+            raise ValueError(f"Invalid sort: {sort}")
+        return sort
+    
+    def _load_all(self, limit, offset, category_slug, use_case_slug, search, sort, after=None):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
-        query = """
-            SELECT p.*, c.name as category_name, c.slug as category_slug 
-            FROM products p
-            JOIN categories c ON p.category_id = c.id
-        """
+        sort = self.resolve_sort(sort, search)
+        sort_column, sort_key, direction = self.SORTS[sort]
         
         params = []
         where_clauses = []
         
+        match = self.search_expression(search) if search and self.db.fts_enabled else None
+        
+        if match:
+            # Rank matches with BM25, weighting name over treatment over description
+            query = """
+                WITH matches AS (
+                    SELECT rowid AS product_id,
+                           bm25(products_fts, 10.0, 1.0, 5.0) AS search_rank,
+                           snippet(products_fts, -1, '<mark>', '</mark>', '...', 16) AS search_snippet
+                    FROM products_fts
+                    WHERE products_fts MATCH ?
+                )
+                SELECT p.*, c.name as category_name, c.slug as category_slug,
+                       m.search_rank, m.search_snippet
+                FROM matches m
+                JOIN products p ON p.id = m.product_id
+                JOIN categories c ON p.category_id = c.id
+            """
+            params.append(match)
+        elif sort == "relevance":
+            # Free text with no searchable words; nothing to rank
+            return [], None
+        else:
+            query = """
+                SELECT p.*, c.name as category_name, c.slug as category_slug 
+                FROM products p
+                JOIN categories c ON p.category_id = c.id
+            """
+        
         if category_slug:
             where_clauses.append("c.slug = ?")
             params.append(category_slug)
         
         if use_case_slug:
-            query += """
-                JOIN product_use_cases puc ON p.id = puc.product_id
+            # A subquery rather than a join, so each product appears once without a
+            # GROUP BY that would stop the sort indexes (and FTS5 ranking) being used
+            where_clauses.append("""p.id IN (
+                SELECT puc.product_id FROM product_use_cases puc
                 JOIN use_cases uc ON puc.use_case_id = uc.id
-            """
-            where_clauses.append("uc.slug = ?")
+                WHERE uc.slug = ?
+            )""")
             params.append(use_case_slug)
         
-        if search:
+        if search and not match:
             where_clauses.append("(p.name LIKE ? OR p.description LIKE ?)")
             params.extend([f"%{search}%", f"%{search}%"])
         
+        if after:
+            # Continue strictly after the last row of the previous page. Ties on the
+            # sort column are broken by ascending id.
+            cursor_sort, last_value, last_id = decode_cursor(after, 3)
+            if cursor_sort != sort:
+                raise ValueError("Cursor does not match the requested sort")
+            comparison = "<" if direction == "DESC" else ">"
+            # The leading inclusive bound lets SQLite seek into the sort index
+            where_clauses.append(
+                f"{sort_column} {comparison}= ? "
+                f"AND ({sort_column} {comparison} ? OR p.id > ?)"
+            )
+            params.extend([last_value, last_value, last_id])
+        
         if where_clauses:
             query += " WHERE " + " AND ".join(where_clauses)
         
-        query += " GROUP BY p.id ORDER BY p.sold_count DESC"
+        query += f" ORDER BY {sort_column} {direction}"
+        if sort_column != "p.id":
+            query += ", p.id ASC"
         
         if limit:
+            # Fetch one extra row to learn whether another page exists
             query += " LIMIT ? OFFSET ?"
-            params.extend([limit, offset])
+            params.extend([limit + 1, offset])
         
         cursor.execute(query, params)
         products = cursor.fetchall()
         
-        result = []
-        for product in products:
-            product_dict = dict(product)
-            
-            # Get use cases for this product
-            cursor.execute("""
-                SELECT uc.id, uc.name, uc.slug
-                FROM use_cases uc
-                JOIN product_use_cases puc ON uc.id = puc.use_case_id
-                WHERE puc.product_id = ?
-            """, (product_dict['id'],))
-            
-            use_cases = cursor.fetchall()
-            product_dict['use_cases'] = [dict(uc) for uc in use_cases]
-            
-            result.append(product_dict)
+        next_cursor = None
+        if limit and len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = encode_cursor(sort, last[sort_key], last['id'])
         
-        return result
+        return self._with_use_cases(cursor, products), next_cursor
+    
+    @staticmethod
+    def search_expression(search):
+        # Turn free text into an FTS5 query: every word must match, as a prefix.
+        # Words are quoted so user input can never inject FTS operators.
+        terms = re.findall(r"\w+", search.lower())
+        if not terms:
+            return None
+        return " ".join(f'"{term}"*' for term in terms)
     
     def get_featured(self, limit=6):
+        if self.leaderboard is not None:
+            self._ensure_fresh()
+            products = self.leaderboard.featured(limit)
+            if products is not None:
+                return products
+        return self._cached(("featured", limit), lambda: self._load_featured(limit))
+    
+    def _load_featured(self, limit):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -380,32 +891,19 @@ class Product:
             SELECT p.*, c.name as category_name, c.slug as category_slug 
             FROM products p
             JOIN categories c ON p.category_id = c.id
-            ORDER BY p.sold_count DESC
+            WHERE p.stock > 0
+            ORDER BY p.sold_count DESC, p.id ASC
             LIMIT ?
         """, (limit,))
         
         products = cursor.fetchall()
         
-        result = []
-        for product in products:
-            product_dict = dict(product)
-            
-            # Get use cases for this product
-            cursor.execute("""
-                SELECT uc.id, uc.name, uc.slug
-                FROM use_cases uc
-                JOIN product_use_cases puc ON uc.id = puc.use_case_id
-                WHERE puc.product_id = ?
-            """, (product_dict['id'],))
-            
-            use_cases = cursor.fetchall()
-            product_dict['use_cases'] = [dict(uc) for uc in use_cases]
-            
-            result.append(product_dict)
-        
-        return result
+        return self._with_use_cases(cursor, products)
     
     def get_related(self, product_id, limit=4):
+        return self._cached(("related", str(product_id), limit), lambda: self._load_related(product_id, limit))
+    
+    def _load_related(self, product_id, limit):
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -430,29 +928,16 @@ class Product:
         
         products = cursor.fetchall()
         
-        result = []
-        for product in products:
-            product_dict = dict(product)
-            
-            # Get use cases for this product
-            cursor.execute("""
-                SELECT uc.id, uc.name, uc.slug
-                FROM use_cases uc
-                JOIN product_use_cases puc ON uc.id = puc.use_case_id
-                WHERE puc.product_id = ?
-            """, (product_dict['id'],))
-            
-            use_cases = cursor.fetchall()
-            product_dict['use_cases'] = [dict(uc) for uc in use_cases]
-            
-            result.append(product_dict)
-        
-        return result
+        return self._with_use_cases(cursor, products)
 
 
 class Order:
-    def __init__(self, db):
+    # Maximum number of order ids bound into a single item lookup
+    ITEM_BATCH_SIZE = 500
+    
+    def __init__(self, db, sold_counts=None):
         self.db = db
+        self.sold_counts = sold_counts  # counts units sold; inline on the product row without one
     
     def create(self, user_id, total, address, payment_method):
         conn = self.db.get_connection()
@@ -490,13 +975,28 @@ class Order:
             (order_id, product_id, name, price, quantity, image)
         )
         
-        # Update product sold_count and stock
-        cursor.execute(
-            "UPDATE products SET sold_count = sold_count + ?, stock = stock - ? WHERE id = ?",
-            (quantity, quantity, product_id)
-        )
+        # Only take stock that is there; the row is left alone when it is not
+        if self.sold_counts is None:
+            cursor.execute(
+                "UPDATE products SET sold_count = sold_count + ?, stock = stock - ? WHERE id = ? AND stock >= ?",
+                (quantity, quantity, product_id, quantity)
+            )
+        else:
+            cursor.execute(
+                "UPDATE products SET stock = stock - ? WHERE id = ? AND stock >= ?",
+                (quantity, product_id, quantity)
+            )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            cursor.execute("SELECT stock FROM products WHERE id = ?", (product_id,))
+            product = cursor.fetchone()
+            raise InsufficientStockError([{"product_id": product_id, "requested": quantity,
+                                           "available": max(product["stock"], 0) if product else 0}])
+        if self.sold_counts is not None:
+            self.sold_counts.record(cursor, [(product_id, quantity)])
         
         conn.commit()
+        self.db.bump_catalog_version()
         return cursor.lastrowid
     
     def get_by_id(self, order_id, user_id=None):
@@ -523,32 +1023,107 @@ class Order:
         cursor.execute("SELECT * FROM order_items WHERE order_id = ?", (order_id,))
         items = cursor.fetchall()
         
-        order_dict['items'] = [dict(item) for item in items]
+        order_dict['items'] = items
         
         return order_dict
     
-    def get_user_orders(self, user_id):
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-        orders = cursor.fetchall()
-        
+    def _with_items(self, cursor, orders):
+        # Load the items for a whole page of orders in one query instead of one per order
         result = []
+        by_id = {}
         for order in orders:
             order_dict = dict(order)
             order_dict['address'] = json.loads(order_dict['address'])
-            
-            # Get order items
-            cursor.execute("SELECT * FROM order_items WHERE order_id = ?", (order_dict['id'],))
-            items = cursor.fetchall()
-            
-            order_dict['items'] = [dict(item) for item in items]
-            
+            order_dict['items'] = []
+            by_id[order_dict['id']] = order_dict
             result.append(order_dict)
         
+        order_ids = list(by_id)
+        for start in range(0, len(order_ids), self.ITEM_BATCH_SIZE):
+            chunk = order_ids[start:start + self.ITEM_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(
+                f"SELECT * FROM order_items WHERE order_id IN ({placeholders}) ORDER BY order_id, id",
+                chunk
+            )
+            for item in cursor.fetchall():
+                by_id[item['order_id']]['items'].append(item)
+        
         return result
     
+    def get_user_orders(self, user_id):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC, id DESC", (user_id,))
+        orders = cursor.fetchall()
+        
+        return self._with_items(cursor, orders)
+    
+    @staticmethod
+    def decode_page_cursor(token):
+        """
+        Turn a cursor from get_user_orders_page into the (created_at, id) it
+        continues after; raises ValueError for anything we did not issue
+        """
+        created_at, order_id = decode_cursor(token, 2)
+        if not isinstance(created_at, str) or not isinstance(order_id, int):
+            raise ValueError("Invalid cursor")
+        return created_at, order_id
+    
+    def get_user_orders_page(self, user_id, limit, after=None, summary=False):
+        """
+        Return one page of a user's orders, newest first, plus the cursor for the next page.
+        
+        Pages are keyed on (created_at, id) so each page costs the same no matter how
+        deep it is; after is the decoded cursor of the previous page. In summary mode
+        the orders carry item counts instead of item rows.
+        """
+        conn = self.db.get_connection()
+        db_cursor = conn.cursor()
+        
+        params = [user_id]
+        where = "o.user_id = ?"
+        
+        if after:
+            created_at, order_id = after
+            where += " AND (o.created_at < ? OR (o.created_at = ? AND o.id < ?))"
+            params.extend([created_at, created_at, order_id])
+        
+        # Fetch one extra row to learn whether another page exists
+        params.append(limit + 1)
+        
+        if summary:
+            db_cursor.execute(f"""
+                SELECT o.id, o.user_id, o.total, o.status, o.created_at, o.payment_method,
+                       COUNT(oi.id) AS item_count,
+                       COALESCE(SUM(oi.quantity), 0) AS item_quantity
+                FROM orders o
+                LEFT JOIN order_items oi ON oi.order_id = o.id
+                WHERE {where}
+                GROUP BY o.id
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT ?
+            """, params)
+        else:
+            db_cursor.execute(f"""
+                SELECT o.* FROM orders o
+                WHERE {where}
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT ?
+            """, params)
+        
+        rows = db_cursor.fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+        
+        if summary:
+            return rows, next_cursor
+        return self._with_items(db_cursor, rows), next_cursor
+    
     def update_status(self, order_id, status):
         conn = self.db.get_connection()
         cursor = conn.cursor()
@@ -562,7 +1137,29 @@ class Order:
         return cursor.rowcount > 0
 
 
+class CartOperationError(Exception):
+    """
+    Raised when a batch of cart operations cannot be applied; nothing was written
+    """
+    
+    def __init__(self, errors):
+        super().__init__("Cart operations rejected")
+        self.errors = errors  # [{"product_id": ..., "error": ...}]
+
+
+class InsufficientStockError(Exception):
+    """
+    Raised when stock, less other shoppers' holds, cannot cover an order or a reservation
+    """
+    
+    def __init__(self, errors):
+        super().__init__("Not enough stock available")
+        self.errors = errors  # [{"product_id": ..., "requested": ..., "available": ...}]
+
+
 class Cart:
+    OPERATIONS = ("add", "set", "remove")
+    
     def __init__(self, db):
         self.db = db
     
@@ -571,32 +1168,111 @@ class Cart:
         cursor = conn.cursor()
         
         try:
-            # Check if item already exists in cart
-            cursor.execute(
-                "SELECT * FROM cart_items WHERE user_id = ? AND product_id = ?",
-                (user_id, product_id)
-            )
-            existing_item = cursor.fetchone()
-            
-            if existing_item:
-                # Update quantity
-                cursor.execute(
-                    "UPDATE cart_items SET quantity = quantity + ? WHERE user_id = ? AND product_id = ?",
-                    (quantity, user_id, product_id)
-                )
-            else:
-                # Insert new item
-                cursor.execute(
-                    "INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, ?)",
-                    (user_id, product_id, quantity)
-                )
+            # One statement whether or not the product is already in the cart
+            cursor.execute("""
+                INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            """, (user_id, product_id, quantity))
             
             conn.commit()
             return True
-        except Exception as e:
-            print(f"Error adding item to cart: {e}")
+        except Exception:
+            log.exception("cart.add_failed", "Error adding item to cart", user_id=user_id, product_id=product_id)
             return False
     
+    def apply(self, user_id, operations, lenient=False):
+        """
+        Apply (op, product_id, quantity) operations in order, in one transaction.
+        
+        "add" adds to the quantity in the cart, "set" replaces it and "remove"
+        drops the product. Every affected product is checked for existence and
+        stock in a single query. By default any failure raises
+        CartOperationError and nothing is written; with lenient=True unknown
+        products are skipped and quantities are capped at the stock instead.
+        Returns the adjustments lenient mode made.
+        """
+        product_ids = sorted({product_id for _, product_id, _ in operations})
+        if not product_ids:
+            return []
+        
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        # Take the write lock first so the quantities we check are the ones we write
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            placeholders = ",".join("?" * len(product_ids))
+            cursor.execute(f"""
+                SELECT p.id, p.stock, ci.quantity
+                FROM products p
+                LEFT JOIN cart_items ci ON ci.user_id = ? AND ci.product_id = p.id
+                WHERE p.id IN ({placeholders})
+            """, (user_id, *product_ids))
+            stock = {}
+            current = {}
+            for row in cursor.fetchall():
+                stock[row["id"]] = row["stock"]
+                current[row["id"]] = row["quantity"] or 0
+            
+            errors = []
+            adjustments = []
+            quantities = dict(current)
+            for op, product_id, quantity in operations:
+                if product_id not in stock:
+                    if lenient:
+                        adjustments.append({"product_id": product_id, "requested": quantity, "quantity": 0})
+                    else:
+                        errors.append({"product_id": product_id, "error": "Product not found"})
+                    continue
+                if op == "add":
+                    quantities[product_id] += quantity
+                elif op == "set":
+                    quantities[product_id] = quantity
+                else:
+                    quantities[product_id] = 0
+            
+            for product_id, quantity in quantities.items():
+                if quantity > stock[product_id]:
+                    if lenient:
+                        adjustments.append({"product_id": product_id, "requested": quantity,
+                                            "quantity": stock[product_id]})
+                        quantities[product_id] = stock[product_id]
+                    else:
+                        errors.append({"product_id": product_id, "error": "Not enough stock available",
+                                       "available": stock[product_id]})
+            
+            if errors:
+                raise CartOperationError(errors)
+            
+            upserts = [
+                (user_id, product_id, quantity) for product_id, quantity in quantities.items()
+                if quantity > 0 and quantity != current[product_id]
+            ]
+            deletes = [
+                (user_id, product_id) for product_id, quantity in quantities.items()
+                if quantity <= 0 and current[product_id] > 0
+            ]
+            if upserts:
+                cursor.executemany("""
+                    INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = excluded.quantity
+                """, upserts)
+            if deletes:
+                cursor.executemany("DELETE FROM cart_items WHERE user_id = ? AND product_id = ?", deletes)
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        return adjustments
+    
+    def merge(self, user_id, items):
+        """
+        Add a guest cart's (product_id, quantity) items to a user's cart, capped at stock
+        """
+        return self.apply(user_id, [("add", product_id, quantity) for product_id, quantity in items], lenient=True)
+    
     def update_quantity(self, user_id, product_id, quantity):
         conn = self.db.get_connection()
         cursor = conn.cursor()
@@ -640,8 +1316,7 @@ class Cart:
             WHERE ci.user_id = ?
         """, (user_id,))
         
-        items = cursor.fetchall()
-        return [dict(item) for item in items]
+        return cursor.fetchall()
     
     def clear(self, user_id):
         conn = self.db.get_connection()
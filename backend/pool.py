@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """
+    Raised when no connection frees up within the pool's checkout timeout
+    """
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections shared by all threads.
+
+    Connections are created lazily up to max_size. Idle ones are reused
+    most-recently-released first, so a quiet pool keeps a small warm set. A
+    connection idle for longer than health_check_interval is pinged before
+    it is handed out and replaced if it no longer works.
+    """
+
+    def __init__(self, connect, max_size=8, timeout=5.0, health_check_interval=30.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = deque()  # (connection, released_at)
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        # Metrics
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.failed_health_checks = 0
+
+    def acquire(self):
+        """
+        Check out a connection, waiting up to timeout for one to be released
+        """
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        waited = False
+
+        with self._available:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    conn, released_at = None, None
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout("Timed out waiting for a database connection")
+                waited = True
+                self._available.wait(remaining)
+
+            self._in_use += 1
+            self.checkouts += 1
+            wait = time.perf_counter() - start
+            if waited:
+                self.waits += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        # Connect and health-check outside the lock
+        try:
+            if conn is not None and time.monotonic() - released_at > self.health_check_interval:
+                if not self._is_healthy(conn):
+                    self._close_quietly(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._available:
+                self._size -= 1
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+        return conn
+
+    def release(self, conn):
+        """
+        Return a connection to the pool, rolling back anything left uncommitted
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            healthy = True
+        except sqlite3.Error:
+            healthy = False
+
+        with self._available:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+                self._close_quietly(conn)
+            self._available.notify()
+
+    def discard(self, conn):
+        """
+        Close a checked-out connection instead of returning it, freeing its slot
+        """
+        self._close_quietly(conn)
+        with self._available:
+            self._in_use -= 1
+            self._size -= 1
+            self._available.notify()
+
+    def health_check(self):
+        """
+        Ping every idle connection, dropping broken ones; return how many were dropped
+        """
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+
+        healthy = []
+        for conn, _ in idle:
+            if self._is_healthy(conn):
+                healthy.append((conn, time.monotonic()))
+            else:
+                self._close_quietly(conn)
+
+        dropped = len(idle) - len(healthy)
+        with self._available:
+            self._idle.extend(healthy)
+            self._size -= dropped
+            self._available.notify(dropped)
+        return dropped
+
+    def close(self):
+        """
+        Close idle connections and refuse further checkouts
+        """
+        with self._available:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._available.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self._size,
+                "maxSize": self.max_size,
+                "inUse": self._in_use,
+                "idle": len(self._idle),
+                "utilization": round(self._in_use / self.max_size, 4) if self.max_size else 0.0,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "totalWaitMs": round(self.total_wait * 1000, 3),
+                "avgWaitMs": round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "maxWaitMs": round(self.max_wait * 1000, 3),
+                "failedHealthChecks": self.failed_health_checks,
+            }
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            self.failed_health_checks += 1
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,247 @@
+"""
+SQL profiling for debugging query behaviour per request.
+
+When enabled, every pooled connection gets sqlite3 trace and progress
+callbacks. The trace callback marks where each statement starts and captures
+its SQL with parameters expanded; the progress handler counts virtual machine
+steps; the profiling cursor adds rows fetched and the time until the last
+fetch. At the end of a request the profile is summarised:
+
+- statements slower than slow_ms are logged with their EXPLAIN QUERY PLAN
+- a normalized statement run more than n_plus_one times is flagged as a
+  suspected N+1 query
+- totals go in the X-SQL-Profile response header
+
+Environment:
+    SQL_PROFILE        1 to enable (default off)
+    SQL_SLOW_MS        slow-query threshold in milliseconds (default 100)
+    SQL_N_PLUS_ONE     repeats of one statement per request that count as N+1 (default 10)
+    SQL_PROFILE_STEPS  VM instructions between progress callbacks (default 1000)
+"""
+import os
+import re
+import threading
+import time
+
+from logs import get_logger
+
+log = get_logger("profiler")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_BLOB = re.compile(r"\b[xX]\?")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+# Statements EXPLAIN QUERY PLAN can describe
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def normalize(sql):
+    """
+    Reduce a statement to its shape: literals become ?, IN lists collapse
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _BLOB.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?+)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class Statement:
+    __slots__ = ("sql", "started", "finished", "rows", "steps", "nested", "executions")
+
+    def __init__(self, sql, started):
+        self.sql = sql
+        self.started = started
+        self.finished = started
+        self.rows = 0
+        self.steps = 0
+        self.nested = 0  # trigger statements it fired
+        self.executions = 1  # parameter sets, for executemany
+
+    @property
+    def duration(self):
+        return self.finished - self.started
+
+
+class ConnectionProfile:
+    """
+    Statements run on one connection since the last reset; a pooled connection
+    serves one request at a time, so this is that request's profile
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.statements = []
+        self.current = None
+        self.executing = False  # inside Cursor.execute/executemany
+        self.batch = False  # inside executemany
+        self.opened = None  # statement the running execute call started
+        self.paused = False
+        self.dropped = 0
+
+    def reset(self):
+        self.statements = []
+        self.current = None
+        self.dropped = 0
+
+    def trace(self, sql):
+        if self.paused:
+            return
+        current = self.current
+        if self.executing and current is not None and current is self.opened:
+            # Triggers re-trace the statement that fired them while it executes
+            if sql == current.sql or sql.startswith("--"):
+                current.nested += 1
+                return
+            # executemany traces every parameter set; the implicit BEGIN comes first
+            if self.batch and not current.sql.startswith("BEGIN"):
+                current.executions += 1
+                return
+        if len(self.statements) >= self.profiler.max_statements:
+            self.current = None
+            self.dropped += 1
+            return
+        self.current = Statement(sql, time.perf_counter())
+        self.statements.append(self.current)
+        if self.executing:
+            self.opened = self.current
+
+    def progress(self):
+        current = self.current
+        if current is not None and not self.paused:
+            current.steps += self.profiler.progress_steps
+        return 0  # never abort the statement
+
+
+class QueryProfiler:
+    def __init__(self, slow_ms=None, n_plus_one=None, progress_steps=None, max_statements=10000):
+        self.slow_ms = float(os.getenv("SQL_SLOW_MS", "100")) if slow_ms is None else slow_ms
+        self.n_plus_one = int(os.getenv("SQL_N_PLUS_ONE", "10")) if n_plus_one is None else n_plus_one
+        self.progress_steps = int(os.getenv("SQL_PROFILE_STEPS", "1000")) if progress_steps is None else progress_steps
+        self.max_statements = max_statements
+
+        self._lock = threading.Lock()
+        self.totals = {}  # normalized sql -> [count, seconds, rows, max seconds]
+        self.requests = 0
+        self.slow_queries = 0
+        self.n_plus_one_requests = 0
+
+    def install(self, conn):
+        """
+        Attach trace and progress callbacks to a new connection
+        """
+        profile = ConnectionProfile(self)
+        conn.profile = profile
+        conn.set_trace_callback(profile.trace)
+        conn.set_progress_handler(profile.progress, self.progress_steps)
+        return profile
+
+    def summarize(self, conn, label=None):
+        """
+        Close out the statements run on conn since its last reset: log slow and
+        repeated ones, fold them into the totals and return the request summary
+        """
+        profile = conn.profile
+        statements = profile.statements
+        dropped = profile.dropped
+        profile.reset()
+        slow_ms = self.slow_ms
+        groups = {}
+        slow = []
+        total_time = 0.0
+        total_rows = 0
+
+        for statement in statements:
+            shape = normalize(statement.sql)
+            duration = statement.duration
+            total_time += duration
+            total_rows += statement.rows
+            group = groups.get(shape)
+            if group is None:
+                group = groups[shape] = [0, 0.0, 0, 0.0]
+            group[0] += 1
+            group[1] += duration
+            group[2] += statement.rows
+            group[3] = max(group[3], duration)
+            if duration * 1000 >= slow_ms:
+                slow.append((shape, statement))
+
+        repeated = sorted(
+            ((count, shape) for shape, (count, _, _, _) in groups.items() if count > self.n_plus_one),
+            reverse=True
+        )
+
+        for shape, statement in slow:
+            log.warning("sql.slow", "Slow query", route=label, sql=shape,
+                        ms=round(statement.duration * 1000, 3), rows=statement.rows,
+                        executions=statement.executions, vm_steps=statement.steps, plan=self.explain(conn, statement.sql))
+        for count, shape in repeated:
+            log.warning("sql.n_plus_one", "Statement repeated within one request", route=label,
+                        sql=shape, count=count)
+
+        with self._lock:
+            self.requests += 1
+            self.slow_queries += len(slow)
+            self.n_plus_one_requests += bool(repeated)
+            for shape, (count, seconds, rows, longest) in groups.items():
+                total = self.totals.get(shape)
+                if total is None:
+                    self.totals[shape] = [count, seconds, rows, longest]
+                else:
+                    total[0] += count
+                    total[1] += seconds
+                    total[2] += rows
+                    total[3] = max(total[3], longest)
+
+        return {
+            "statements": len(statements) + dropped,
+            "ms": round(total_time * 1000, 3),
+            "rows": total_rows,
+            "slow": len(slow),
+            "repeated": [{"sql": shape, "count": count} for count, shape in repeated],
+        }
+
+    def explain(self, conn, sql):
+        """
+        Return EXPLAIN QUERY PLAN lines for sql, which has its parameters inlined
+        """
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        profile = conn.profile
+        profile.paused = True
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            return [row[3] for row in rows]
+        except Exception as e:
+            return [f"unavailable: {e}"]
+        finally:
+            profile.paused = False
+
+    @staticmethod
+    def header(summary):
+        """
+        Format a request summary for the X-SQL-Profile header
+        """
+        value = (f"statements={summary['statements']}; ms={summary['ms']}; rows={summary['rows']}; "
+                 f"slow={summary['slow']}; repeated={len(summary['repeated'])}")
+        if summary["repeated"]:
+            top = summary["repeated"][0]
+            value += f"; top={top['count']}x {top['sql'][:200]}"
+        return value.encode("ascii", "replace").decode("ascii")
+
+    def stats(self, top=10):
+        with self._lock:
+            heaviest = sorted(self.totals.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            return {
+                "requests": self.requests,
+                "slowQueries": self.slow_queries,
+                "nPlusOneRequests": self.n_plus_one_requests,
+                "slowMs": self.slow_ms,
+                "top": [
+                    {"sql": shape, "count": count, "totalMs": round(seconds * 1000, 3),
+                     "maxMs": round(longest * 1000, 3), "rows": rows}
+                    for shape, (count, seconds, rows, longest) in heaviest
+                ],
+            }
@@ -1,27 +1,49 @@
+import argparse
 import os
-import subprocess
+import time
+
+import snapshot
 
 def main():
     """
     Helper script to run the Flask application.
     
     This will:
-    1. Check if the database exists, if not initialize it
-    2. Start the Flask application
+    1. Check if the database exists, if not restore it from a seeded snapshot
+    2. Start the Flask development server, or the pre-forking server with --production
     """
-    # Check if database exists
+    parser = argparse.ArgumentParser(description="Run the FertiShop API")
+    parser.add_argument("--production", action="store_true",
+                        help="serve with pre-forked workers instead of the debug server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, help="worker processes (production only)")
+    parser.add_argument("--threads", type=int, help="request threads per worker (production only)")
+    parser.add_argument("--max-requests", type=int, help="recycle workers after this many requests (production only)")
+    parser.add_argument("--profile", help="seed a new database from a generate_data.py profile")
+    args = parser.parse_args()
+    
+    # Check if database exists; the snapshot is seeded once and copied after that
     if not os.path.exists('fertishop.db'):
         print("Initializing database...")
+        start = time.perf_counter()
         try:
-            subprocess.run(["python", "init_db.py"], check=True)
-        except subprocess.CalledProcessError:
-            print("Error initializing database!")
+            snapshot.bootstrap('fertishop.db', profile=args.profile)
+        except Exception as e:
+            print(f"Error initializing database: {e}")
             return
+        print(f"Database ready in {time.perf_counter() - start:.2f}s")
+    
+    if args.production:
+        print("Starting production server...")
+        from server import serve
+        serve(args.host, args.port, args.workers, args.threads, args.max_requests)
+        return
     
     # Start Flask app
     print("Starting Flask application...")
     from app import app
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host=args.host, port=args.port)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
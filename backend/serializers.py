@@ -0,0 +1,140 @@
+"""
+Wire-format builders for the shapes the frontend consumes.
+
+Each shape is a plain function from a sqlite3.Row or dict to the dict the
+frontend reads. respond() encodes the response once with the same settings
+jsonify uses outside debug mode (sorted keys, compact separators, ASCII only),
+so responses match what jsonify produced before. In debug mode it hands the
+body to jsonify, which pretty-prints it.
+
+Set JSON_BACKEND=orjson to encode with orjson when it is installed. Its
+output differs only in leaving non-ASCII characters unescaped.
+"""
+import json
+import os
+
+from flask import current_app, jsonify
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+PLACEHOLDER_IMAGE = "/placeholder.svg"
+
+# Same settings as Flask's JSON provider outside debug mode
+_encode = json.JSONEncoder(ensure_ascii=True, separators=(",", ":"), sort_keys=True).encode
+
+USE_ORJSON = os.getenv("JSON_BACKEND", "json").lower() == "orjson" and orjson is not None
+
+
+def product(row):
+    return {
+        "id": str(row["id"]),
+        "name": row["name"],
+        "description": row["description"],
+        "price": row["price"],
+        "category": row["category_slug"],
+        "useCase": [use_case["slug"] for use_case in row["use_cases"]],
+        "image": row["image"] or PLACEHOLDER_IMAGE,
+        "soldCount": row["sold_count"],
+        "stock": row["stock"],
+        "treatmentFor": row["treatment_for"],
+    }
+
+
+def search_result(row):
+    # Search results carry a highlighted excerpt of the best matching field
+    data = product(row)
+    if row.get("search_snippet"):
+        data["snippet"] = row["search_snippet"]
+    return data
+
+
+def cart_item(row):
+    return {
+        "id": str(row["product_id"]),
+        "name": row["name"],
+        "price": row["price"],
+        "quantity": row["quantity"],
+        "image": row["image"] or PLACEHOLDER_IMAGE,
+        "stock": row["stock"],
+    }
+
+
+def _order(row, order_prefix="", product_prefix=""):
+    return {
+        "id": f"{order_prefix}{row['id']}",
+        "userId": str(row["user_id"]),
+        "items": [
+            {
+                "productId": f"{product_prefix}{item['product_id']}",
+                "name": item["name"],
+                "price": item["price"],
+                "quantity": item["quantity"],
+                "image": item["image"] or PLACEHOLDER_IMAGE,
+            }
+            for item in row["items"]
+        ],
+        "total": row["total"],
+        "status": row["status"],
+        "createdAt": row["created_at"],
+        "address": row["address"],
+        "paymentMethod": row["payment_method"],
+    }
+
+
+def order(row):
+    return _order(row)
+
+
+def placed_order(row):
+    # Freshly placed orders use the prefixed ids the checkout page expects
+    return _order(row, "order-", "prod-")
+
+
+def order_summary(row):
+    return {
+        "id": str(row["id"]),
+        "userId": str(row["user_id"]),
+        "itemCount": row["item_count"],
+        "itemQuantity": row["item_quantity"],
+        "total": row["total"],
+        "status": row["status"],
+        "createdAt": row["created_at"],
+        "paymentMethod": row["payment_method"],
+    }
+
+
+def one(shape, value):
+    """
+    Build the wire form of one row
+    """
+    return shape(value)
+
+
+def many(shape, values):
+    """
+    Build the wire form of a sequence of rows
+    """
+    return [shape(value) for value in values]
+
+
+def dumps(**members):
+    """
+    Encode a top-level JSON object the way jsonify does outside debug mode
+    """
+    if USE_ORJSON:
+        return orjson.dumps(members, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+    return _encode(members)
+
+
+def respond(status=200, **members):
+    """
+    Build a JSON response the same way jsonify would
+    """
+    if current_app.debug:
+        response = jsonify(members)
+        response.status_code = status
+        return response
+    return current_app.response_class(dumps(**members) + "\n", status=status, mimetype="application/json")
@@ -0,0 +1,376 @@
+"""
+Pre-forking production server for the FertiShop API.
+
+The master process opens the listening socket and forks worker processes that
+all accept from it. The master never imports the app: importing it opens
+database connections and starts background threads (the stock hold sweeper,
+the sold_count aggregator), and neither survives a fork safely. Each worker
+imports the app after it is forked. Each worker serves requests on a
+bounded thread pool and only accepts a connection when a thread is free, so a
+busy worker leaves new connections to its siblings.
+
+Signals to the master:
+    SIGTERM, SIGINT  drain every worker and exit
+    SIGHUP           rolling restart: replace workers one at a time
+
+Workers exit after max_requests requests (plus jitter) and are replaced, which
+caps slow memory growth.
+
+Workers share request metrics through files in METRICS_DIR (a fresh temporary
+directory when unset), so /api/metrics on any worker reports the whole server.
+
+Usage:
+    python server.py [--host 0.0.0.0] [--port 5000] [--workers 4] [--threads 8]
+                     [--max-requests 10000] [--graceful-timeout 30]
+"""
+import argparse
+import os
+import random
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import logs
+from logs import get_logger
+
+log = get_logger("server")
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # One connection per request keeps every pool thread free for new work
+    protocol_version = "HTTP/1.0"
+
+    def log_request(self, code="-", size="-"):
+        # Per-request access lines cost a synchronous write each; errors still log
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server for one worker: accepts from a shared socket onto a thread pool
+    """
+
+    multithread = True
+
+    def __init__(self, app, listener, threads=8, max_requests=0, on_recycle=None):
+        host = listener.getsockname()[0]
+        super().__init__(host, 0, app, handler=QuietRequestHandler, fd=listener.fileno())
+        # Siblings accept from the same socket, so a wake-up may find nothing to accept
+        self.socket.setblocking(False)
+
+        self.threads = threads
+        self.max_requests = max_requests
+        self.on_recycle = on_recycle
+        self.handled = 0
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self._slots = threading.BoundedSemaphore(threads)
+        self._count_lock = threading.Lock()
+
+    def get_request(self):
+        # Only take a connection off the shared backlog when a thread can serve it
+        self._slots.acquire()
+        try:
+            return super().get_request()
+        except OSError:
+            self._slots.release()
+            raise
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+            self._count_request()
+
+    def _count_request(self):
+        with self._count_lock:
+            self.handled += 1
+            recycle = self.max_requests and self.handled == self.max_requests
+        if recycle and self.on_recycle:
+            self.on_recycle()
+
+    def drain(self):
+        """
+        Stop accepting, then wait for in-flight requests to finish
+        """
+        self._executor.shutdown(wait=True)
+        self.server_close()
+
+
+def load_app():
+    """
+    Import the API in a worker; return (app, db, metrics)
+    """
+    from app import app, db, metrics
+    return app, db, metrics
+
+
+class Worker:
+    def __init__(self, load_app, listener, threads, max_requests, ready_fd):
+        self.load_app = load_app
+        self.app = None
+        self.db = None
+        self.metrics = None
+        self.listener = listener
+        self.threads = threads
+        self.max_requests = max_requests
+        self.ready_fd = ready_fd
+        self.server = None
+        self.stopping = False
+
+    def run(self):
+        # The master decides when workers stop; ignore terminal and reload signals
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+
+        self.app, self.db, self.metrics = self.load_app()
+        self.server = PooledWSGIServer(
+            self.app,
+            self.listener,
+            threads=self.threads,
+            max_requests=self.max_requests,
+            on_recycle=self.stop
+        )
+        if self.stopping:
+            # SIGTERM arrived while the app was loading
+            self.stop()
+
+        # Tell the master we are accepting
+        os.write(self.ready_fd, b".")
+        os.close(self.ready_fd)
+
+        self.server.serve_forever(poll_interval=0.5)
+        self.server.drain()
+        # Leave final counts behind; the next scrape folds them into the archive
+        self.metrics.flush()
+        self.db.close()
+
+    def stop(self):
+        self.stopping = True
+        if self.server is None:
+            return  # run() stops the server once it exists
+        self.app.config["DRAINING"] = True
+        # shutdown() blocks until serve_forever returns, so it cannot run on the serving thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class Master:
+    """
+    Owns the listening socket and keeps the configured number of workers alive
+    """
+
+    def __init__(self, load_app=load_app, host="0.0.0.0", port=5000, workers=4, threads=8,
+                 max_requests=10000, max_requests_jitter=None, graceful_timeout=30.0,
+                 ready_timeout=30.0):
+        self.load_app = load_app
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        # Spread recycling out so workers do not all restart at once
+        self.max_requests_jitter = max_requests // 10 if max_requests_jitter is None else max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+
+        self.listener = None
+        self.workers = {}  # pid -> start time
+        self.retiring = {}  # pid -> time SIGTERM was sent
+        self._stopping = False
+        self._reloading = False
+
+    def bind(self):
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen(2048)
+        listener.set_inheritable(True)
+        self.listener = listener
+        self.port = listener.getsockname()[1]
+
+    def run(self):
+        if self.listener is None:
+            self.bind()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        log.info("server.start", "Serving", host=self.host, port=self.port,
+                 workers=self.worker_count, threads=self.threads)
+        for _ in range(self.worker_count):
+            self.spawn()
+
+        while not self._stopping:
+            self.reap()
+            if self._reloading:
+                self._reloading = False
+                self.rolling_restart()
+            time.sleep(0.2)
+
+        self.stop()
+
+    def spawn(self):
+        """
+        Fork a worker and wait until it is accepting; return its pid
+        """
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            status = 0
+            try:
+                Worker(self.load_app, self.listener, self.threads, max_requests, ready_write).run()
+            except BaseException:
+                log.exception("server.worker_failed", "Worker failed")
+                status = 1
+            finally:
+                # os._exit skips atexit, so flush queued log records first
+                logs.shutdown()
+                os._exit(status)
+
+        os.close(ready_write)
+        readable, _, _ = select.select([ready_read], [], [], self.ready_timeout)
+        ready = bool(readable) and os.read(ready_read, 1) == b"."
+        os.close(ready_read)
+
+        self.workers[pid] = time.monotonic()
+        if not ready:
+            log.error("server.worker_not_ready", "Worker did not become ready", worker=pid,
+                      timeout=self.ready_timeout)
+        return pid
+
+    def reap(self):
+        """
+        Collect exited workers and replace any that were not retired on purpose
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                break
+
+            self.workers.pop(pid, None)
+            if self.retiring.pop(pid, None) is None and not self._stopping:
+                code = os.waitstatus_to_exitcode(status)
+                if code != 0:
+                    log.warning("server.worker_exited", "Worker exited; replacing it", worker=pid, status=code)
+                self.spawn()
+
+        # Workers that ignore SIGTERM past the graceful timeout are killed
+        now = time.monotonic()
+        for pid, sent_at in list(self.retiring.items()):
+            if now - sent_at > self.graceful_timeout:
+                self._signal(pid, signal.SIGKILL)
+
+    def rolling_restart(self):
+        """
+        Replace each worker in turn, starting its successor before retiring it
+        """
+        log.info("server.reload", "Rolling restart", workers=len(self.workers))
+        for pid in list(self.workers):
+            self.spawn()
+            self.retire(pid)
+            self.reap()
+
+    def retire(self, pid):
+        self.retiring[pid] = time.monotonic()
+        self.workers.pop(pid, None)
+        self._signal(pid, signal.SIGTERM)
+
+    def stop(self):
+        """
+        Drain every worker, kill stragglers after the graceful timeout, and exit
+        """
+        for pid in list(self.workers):
+            self.retire(pid)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.retiring and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.retiring):
+            self._signal(pid, signal.SIGKILL)
+        self.reap()
+
+        self.listener.close()
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self._reloading = True
+
+    @staticmethod
+    def _signal(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def serve(host="0.0.0.0", port=5000, workers=None, threads=None, max_requests=None,
+          graceful_timeout=None):
+    """
+    Run the API under the pre-forking server; settings default from the environment
+    """
+    metrics_dir = os.getenv("METRICS_DIR")
+    own_dir = metrics_dir is None
+    if own_dir:
+        # Workers read it when they import the app
+        metrics_dir = tempfile.mkdtemp(prefix="fertishop-metrics-")
+        os.environ["METRICS_DIR"] = metrics_dir
+
+    master = Master(
+        host=host,
+        port=port,
+        workers=workers or int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 2))),
+        threads=threads or int(os.getenv("SERVER_THREADS", "8")),
+        max_requests=int(os.getenv("SERVER_MAX_REQUESTS", "10000")) if max_requests is None else max_requests,
+        graceful_timeout=graceful_timeout or float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+    )
+    try:
+        master.run()
+    finally:
+        if own_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the FertiShop API with pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--threads", type=int, help="request threads per worker (default 8)")
+    parser.add_argument("--max-requests", type=int, help="recycle a worker after this many requests (0: never)")
+    parser.add_argument("--graceful-timeout", type=float, help="seconds a draining worker may take")
+    args = parser.parse_args(argv)
+
+    serve(args.host, args.port, args.workers, args.threads, args.max_requests, args.graceful_timeout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
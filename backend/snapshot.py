@@ -0,0 +1,235 @@
+"""
+Prebuilt database snapshots for fast bootstrap.
+
+Seeding a database means running every migration, hashing the demo passwords
+with bcrypt and inserting the catalog. Doing that once per container or test
+run is wasted time. Instead, the seeded database is built once and written to
+a template file with SQLite's online backup API. New databases are copies of
+the template, which takes milliseconds.
+
+Templates are cached under SNAPSHOT_DIR (default: fertishop/snapshots in the
+user's cache directory). The directory is created private (mode 0700), and a
+directory or template that another user owns or can write to is refused,
+since a planted template would seed its accounts into every new database.
+Templates are keyed by a hash of every input that shapes the seeded rows: the
+schema (migrations.py) and either the hand-written seed (init_db.py, models.py,
+auth.py and BCRYPT_ROUNDS) or generate_data.py plus the profile. Changing any
+of them builds a new template on the next use.
+
+Usage:
+    python snapshot.py restore [--db fertishop.db] [--profile profiles/small.json]
+    python snapshot.py build [--profile ...]
+    python snapshot.py list
+    python snapshot.py clear
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Code that decides the seeded rows, per seed
+SEED_SOURCES = ("migrations.py", "init_db.py", "models.py", "auth.py")
+PROFILE_SOURCES = ("migrations.py", "generate_data.py")
+
+
+def snapshot_dir():
+    cache = (os.getenv("XDG_CACHE_HOME") or os.getenv("LOCALAPPDATA")
+             or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.getenv("SNAPSHOT_DIR", os.path.join(cache, "fertishop", "snapshots"))
+
+
+def _check_private(path):
+    # Only trust files and directories that no other user could have written
+    if not hasattr(os, "getuid"):  # Windows: per-user profile directories already are
+        return
+    info = os.lstat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} is writable by another user; refusing to use it for snapshots")
+
+
+def _private_dir():
+    directory = snapshot_dir()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_private(directory)
+    return directory
+
+
+def _read(name):
+    with open(os.path.join(BACKEND_DIR, name), "rb") as f:
+        return f.read()
+
+
+@contextlib.contextmanager
+def _build_lock(path):
+    # Parallel test runs wait for one builder instead of all seeding at once.
+    # Without flock they each seed; os.replace keeps the template whole either way.
+    with open(path + ".lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def load_profile(profile):
+    # A path to a profile file, a dict of settings, or None for the hand-written seed
+    if profile is None or isinstance(profile, dict):
+        return profile
+    import generate_data
+    return generate_data.load_profile(profile, [])
+
+
+def snapshot_key(profile=None):
+    """
+    Hash of everything that decides the template's contents
+    """
+    digest = hashlib.sha256()
+    for name in (SEED_SOURCES if profile is None else PROFILE_SOURCES):
+        digest.update(_read(name))
+    if profile is None:
+        # Password hashes are stored at the cost they were made with
+        digest.update(os.getenv("BCRYPT_ROUNDS", "12").encode("utf-8"))
+    else:
+        digest.update(json.dumps(profile, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def template_path(profile=None):
+    profile = load_profile(profile)
+    return os.path.join(snapshot_dir(), f"fertishop-{snapshot_key(profile)}.db")
+
+
+def _seed(db_file, profile):
+    if profile is None:
+        import init_db
+        with contextlib.redirect_stdout(sys.stderr):
+            init_db.main(db_file)
+            init_db.create_test_user(db_file)
+    else:
+        import generate_data
+        generate_data.generate(db_file, profile, log=lambda message: print(message, file=sys.stderr))
+
+
+def build(profile=None, force=False):
+    """
+    Return the template for profile, seeding and saving it first if it is not cached
+    """
+    profile = load_profile(profile)
+    _private_dir()
+    path = template_path(profile)
+    if os.path.exists(path) and not force:
+        _check_private(path)
+        return path
+
+    with _build_lock(path):
+        if os.path.exists(path) and not force:
+            _check_private(path)
+            return path
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as work:
+            seeded = os.path.join(work, "seed.db")
+            _seed(seeded, profile)
+
+            # The backup API copies a consistent image even though the seed ran in WAL mode
+            partial = os.path.join(work, "template.db")
+            source = sqlite3.connect(seeded)
+            target = sqlite3.connect(partial)
+            try:
+                source.backup(target)
+                # One self-contained file, so a plain copy of it is a complete database
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+                source.close()
+            os.chmod(partial, 0o600)
+            os.replace(partial, path)
+    return path
+
+
+def restore(db_file="fertishop.db", profile=None):
+    """
+    Create db_file as a copy of the template, building the template if needed
+    """
+    template = build(profile)
+    for suffix in ("-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(db_file + suffix)
+    # Copy next to the destination and rename, so nobody opens a half-written file
+    directory = os.path.dirname(os.path.abspath(db_file))
+    fd, partial = tempfile.mkstemp(dir=directory, prefix=".restore-")
+    os.close(fd)
+    shutil.copyfile(template, partial)
+    os.replace(partial, db_file)
+    return db_file
+
+
+def restore_into(conn, profile=None):
+    """
+    Load the template into an open connection, e.g. an in-memory database
+    """
+    source = sqlite3.connect(build(profile))
+    try:
+        source.backup(conn)
+    finally:
+        source.close()
+    return conn
+
+
+@contextlib.contextmanager
+def isolated_database(profile=None):
+    """
+    Yield the path of a private seeded database that is deleted afterwards
+    """
+    with tempfile.TemporaryDirectory(prefix="fertishop-db-") as directory:
+        yield restore(os.path.join(directory, "fertishop.db"), profile)
+
+
+def bootstrap(db_file="fertishop.db", profile=None):
+    """
+    Make sure db_file exists, restoring it from a snapshot when it does not
+    """
+    if os.path.exists(db_file):
+        return False
+    restore(db_file, profile)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage seeded database snapshots")
+    parser.add_argument("command", choices=["restore", "build", "list", "clear"])
+    parser.add_argument("--db", default="fertishop.db", help="database to create (restore)")
+    parser.add_argument("--profile", help="generate_data.py profile instead of the init_db.py seed")
+    parser.add_argument("--force", action="store_true", help="rebuild the template (build)")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        directory = snapshot_dir()
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        for name in names:
+            if name.endswith(".db"):
+                path = os.path.join(directory, name)
+                print(f"{path}  {os.path.getsize(path):>12,} bytes")
+    elif args.command == "clear":
+        shutil.rmtree(snapshot_dir(), ignore_errors=True)
+    elif args.command == "build":
+        print(build(args.profile, force=args.force))
+    else:
+        start = time.perf_counter()
+        restore(args.db, args.profile)
+        print(f"Restored {args.db} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
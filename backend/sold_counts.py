@@ -0,0 +1,169 @@
+"""
+Deferred sold_count accounting.
+
+Every order used to add its quantities to products.sold_count inline, which
+rewrites the best sellers' rows and both sold_count indexes once per order
+line. In deferred mode an order appends (product_id, quantity) rows to
+sold_count_deltas instead, and an aggregator folds them into
+products.sold_count in one statement per pass.
+
+Reads stay within max_staleness: the aggregator runs twice per bound, and a
+catalog read in a process that has not folded for max_staleness folds first.
+Sales in another process reach this process's cached catalog reads within
+CATALOG_VERSION_TTL after that.
+
+Environment:
+    SOLD_COUNT_MODE            deferred (default) or inline, the old per-order update
+    SOLD_COUNT_MAX_STALENESS   seconds a sale may be missing from sold_count (default 5)
+"""
+import os
+import threading
+import time
+
+from logs import get_logger
+
+log = get_logger("sold_counts")
+
+MODES = ("deferred", "inline")
+
+# A correlated subquery rather than UPDATE ... FROM, which needs SQLite 3.33
+FOLD = """
+    UPDATE products SET sold_count = sold_count + (
+        SELECT SUM(d.quantity) FROM sold_count_deltas d WHERE d.product_id = products.id
+    )
+    WHERE id IN (SELECT product_id FROM sold_count_deltas)
+"""
+
+
+class SoldCounts:
+    MAX_STALENESS = 5.0
+
+    def __init__(self, db, mode=None, max_staleness=None):
+        mode = mode or os.getenv("SOLD_COUNT_MODE", "deferred")
+        if mode not in MODES:
+            raise ValueError(f"SOLD_COUNT_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+        if max_staleness is None:
+            max_staleness = float(os.getenv("SOLD_COUNT_MAX_STALENESS", self.MAX_STALENESS))
+        self.db = db
+        self.mode = mode
+        self.max_staleness = max_staleness
+
+        self._lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+        self._folded_at = time.monotonic()
+        self._counts = {"recorded": 0, "folds": 0, "folded": 0, "readFolds": 0}
+        self._aggregator = None
+        self._stop = threading.Event()
+        if hasattr(os, "register_at_fork"):  # not on Windows, which never forks
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def inline(self):
+        return self.mode == "inline"
+
+    def _after_fork(self):
+        # Threads do not survive a fork; a worker runs its own aggregator
+        self._lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+        self._counts = dict.fromkeys(self._counts, 0)
+        running = self._aggregator is not None
+        self._aggregator = None
+        self._stop = threading.Event()
+        if running:
+            self.start_aggregator()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def record(self, cursor, items):
+        """
+        Count (product_id, quantity) sales inside the caller's transaction
+        """
+        if self.inline:
+            cursor.executemany(
+                "UPDATE products SET sold_count = sold_count + ? WHERE id = ?",
+                [(quantity, product_id) for product_id, quantity in items]
+            )
+        else:
+            cursor.executemany(
+                "INSERT INTO sold_count_deltas (product_id, quantity) VALUES (?, ?)",
+                items
+            )
+        self._count("recorded", len(items))
+
+    def fold(self):
+        """
+        Move pending deltas into products.sold_count; return how many were folded
+        """
+        started = time.monotonic()
+        with self._fold_lock:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            # Read first so an idle pass never takes the write lock
+            cursor.execute("SELECT COUNT(*) FROM sold_count_deltas")
+            pending = cursor.fetchone()[0]
+            if pending:
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM sold_count_deltas")
+                    pending = cursor.fetchone()[0]
+                    cursor.execute(FOLD)
+                    cursor.execute("DELETE FROM sold_count_deltas")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            # Everything recorded before this pass started is now in sold_count
+            self._folded_at = started
+        if pending:
+            self.db.bump_catalog_version()
+            with self._lock:
+                self._counts["folds"] += 1
+                self._counts["folded"] += pending
+        return pending
+
+    def ensure_fresh(self):
+        """
+        Fold before a read if this process has not folded within max_staleness
+        """
+        if self.inline or time.monotonic() - self._folded_at < self.max_staleness:
+            return
+        # One reader folds; the others read while it does, as they would have anyway
+        if self._fold_lock.locked():
+            return
+        self._count("readFolds")
+        self.fold()
+
+    def start_aggregator(self):
+        if self.inline:
+            return
+        if self._aggregator is None or not self._aggregator.is_alive():
+            self._stop.clear()
+            self._aggregator = threading.Thread(target=self._aggregate_loop, name="sold-count-fold", daemon=True)
+            self._aggregator.start()
+
+    def stop_aggregator(self):
+        self._stop.set()
+        if self._aggregator is not None:
+            self._aggregator.join()
+            self._aggregator = None
+
+    def _aggregate_loop(self):
+        while not self._stop.wait(self.max_staleness / 2):
+            try:
+                self.fold()
+            except Exception:
+                log.exception("sold_counts.fold_failed", "Error folding sold_count deltas")
+            finally:
+                # The aggregator's connection goes back to the pool between passes
+                self.db.release_connection()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                "mode": self.mode,
+                "maxStaleness": self.max_staleness,
+                "sinceFold": round(time.monotonic() - self._folded_at, 3),
+            }
@@ -0,0 +1,116 @@
+"""
+Shared fixtures for the API tests.
+
+The app is a module with one database, so the whole run shares a private
+copy of the seeded snapshot in a temporary directory. Tests stay independent
+by registering their own shoppers and creating the products they buy.
+"""
+import itertools
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+# Settings read when the backend modules are imported, which test modules may
+# do at collection time, before any fixture runs
+os.environ.update({
+    # Cheap hashes; the snapshot key includes the cost, so the seed matches
+    "BCRYPT_ROUNDS": "4",
+    "LOG_LEVEL": "WARNING",
+    "INVENTORY_SWEEP_INTERVAL": "0",
+    "LEADERBOARD_PRUNE_INTERVAL": "0",
+    # Tests fold sold_count deltas themselves rather than racing the aggregator
+    "SOLD_COUNT_MAX_STALENESS": "3600",
+})
+for name in ("ADMIN_TOKEN", "METRICS_DIR"):
+    os.environ.pop(name, None)
+
+_serial = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def shop(tmp_path_factory):
+    """
+    The app module, imported against a fresh seeded database
+    """
+    directory = tmp_path_factory.mktemp("shop")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("SNAPSHOT_DIR", str(directory / "snapshots"))
+        patch.chdir(directory)
+
+        import snapshot
+        snapshot.restore("fertishop.db")
+        import app as shop_app
+        yield shop_app
+
+        shop_app.sold_counts.stop_aggregator()
+        shop_app.db.close()
+
+
+@pytest.fixture
+def client(shop):
+    return shop.app.test_client()
+
+
+@pytest.fixture
+def make_shopper(client):
+    """
+    Register a new user and return (user, Authorization headers)
+    """
+    def make():
+        serial = next(_serial)
+        response = client.post("/api/auth/register", json={
+            "name": f"Shopper {serial}",
+            "email": f"shopper{serial}@example.com",
+            "password": "secret",
+        })
+        assert response.status_code == 201
+        return response.json["user"], {"Authorization": f"Bearer {response.json['token']}"}
+    return make
+
+
+@pytest.fixture
+def shopper(make_shopper):
+    return make_shopper()
+
+
+@pytest.fixture
+def make_product(shop):
+    """
+    Insert a product and return its id; the catalog version moves with it
+    """
+    def make(stock=10, price=100.0, sold_count=0, category="organic"):
+        serial = next(_serial)
+        conn = shop.db.get_connection()
+        cursor = conn.execute(
+            "INSERT INTO products (name, description, price, category_id, sold_count, stock, treatment_for) "
+            "SELECT ?, ?, ?, id, ?, ?, ? FROM categories WHERE slug = ?",
+            (f"Test Product {serial}", "Made for a test", price, sold_count, stock, "testing", category)
+        )
+        conn.commit()
+        shop.db.bump_catalog_version()
+        shop.db.release_connection()
+        return cursor.lastrowid
+    return make
+
+
+ADDRESS = {"fullName": "Test Shopper", "street": "1 Test Street", "city": "Manila", "zip": "1000",
+           "phone": "09000000000"}
+
+
+@pytest.fixture
+def checkout(client):
+    """
+    Put (product_id, quantity) items in the cart and place the order; return the response
+    """
+    def place(headers, items, payment_method="cod"):
+        for product_id, quantity in items:
+            response = client.post("/api/cart/add", json={"productId": product_id, "quantity": quantity},
+                                   headers=headers)
+            assert response.status_code == 200
+        return client.post("/api/orders", json={"address": ADDRESS, "paymentMethod": payment_method},
+                           headers=headers)
+    return place
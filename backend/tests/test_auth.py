@@ -0,0 +1,66 @@
+import time
+
+from models import TokenRevocation
+
+
+def login(client, email, password):
+    return client.post("/api/auth/login", json={"email": email, "password": password})
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_logout_revokes_only_that_token(client, shopper):
+    user, headers = shopper
+    other = bearer(login(client, user["email"], "secret").json["token"])
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+    assert client.get("/api/cart", headers=headers).status_code == 401
+    assert client.get("/api/auth/me", headers=other).status_code == 200
+
+
+def test_password_change_revokes_every_earlier_token(client, shopper):
+    user, headers = shopper
+    other = bearer(login(client, user["email"], "secret").json["token"])
+
+    response = client.post("/api/auth/password", headers=headers,
+                           json={"currentPassword": "secret", "newPassword": "changed"})
+    assert response.status_code == 200
+    fresh = bearer(response.json["token"])
+
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+    assert client.get("/api/auth/me", headers=other).status_code == 401
+    assert client.get("/api/auth/me", headers=fresh).status_code == 200
+    assert login(client, user["email"], "secret").status_code == 401
+    response = login(client, user["email"], "changed")
+    assert client.get("/api/auth/me", headers=bearer(response.json["token"])).status_code == 200
+
+
+def test_password_change_needs_the_current_password(client, shopper):
+    _, headers = shopper
+    response = client.post("/api/auth/password", headers=headers,
+                           json={"currentPassword": "wrong", "newPassword": "changed"})
+    assert response.status_code == 401
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+
+def test_revocations_reach_other_processes(shop, shopper):
+    # A second TokenRevocation over the same database stands in for another worker
+    user, _ = shopper
+    other = TokenRevocation(shop.db, refresh_interval=0)
+    payload = {"sub": user["id"], "jti": "other-process", "iat": time.time(), "exp": time.time() + 60}
+    assert not other.is_revoked(payload)
+
+    shop.token_revocation.revoke_token(payload)
+    assert other.is_revoked(payload)
+
+
+def test_expired_revocations_are_purged(shop):
+    revocation = TokenRevocation(shop.db)
+    revocation.revoke_token({"jti": "long-gone", "exp": time.time() - 10})
+    conn = shop.db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM token_revocations WHERE jti = 'long-gone'").fetchone()[0] == 0
+    assert revocation.stats()["purged"] >= 1
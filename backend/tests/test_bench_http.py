@@ -0,0 +1,85 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import bench_http  # noqa: E402
+
+
+def stats(p95, rps, requests=100):
+    return {"requests": requests, "errors": 0, "rps": rps, "meanMs": p95 / 2, "p50Ms": p95 / 2,
+            "p95Ms": p95, "p99Ms": p95 * 2}
+
+
+def run(endpoints, total):
+    return {"endpoints": endpoints, "total": total}
+
+
+class FakeShopper:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def browse(self):
+        return 200
+
+    def checkout(self):
+        return 409
+
+
+def test_summary_reports_percentiles_and_throughput():
+    summary = bench_http.summarize([n / 1000 for n in range(100, 0, -1)], errors=3, elapsed=2.0)
+    assert (summary["requests"], summary["errors"], summary["rps"]) == (100, 3, 50.0)
+    assert (summary["p50Ms"], summary["p95Ms"], summary["p99Ms"]) == (51.0, 96.0, 100.0)
+    assert bench_http.summarize([], errors=0, elapsed=1.0)["p95Ms"] == 0.0
+
+
+def test_mix_overrides_weights_and_drops_disabled_actions():
+    mix = bench_http.parse_mix("search=20, checkout=0")
+    assert mix["search"] == 20
+    assert "checkout" not in mix
+    assert mix["browse"] == bench_http.DEFAULT_MIX["browse"]
+    with pytest.raises(SystemExit):
+        bench_http.parse_mix("teleport=5")
+
+
+def test_drive_separates_samples_from_errors():
+    samples, errors = bench_http.drive([FakeShopper(n) for n in range(3)], {"browse": 1, "checkout": 1}, 0.05)
+    assert samples["browse"] and not samples["checkout"]
+    assert errors["browse"] == 0 and errors["checkout"] > 0
+
+
+def test_compare_flags_slower_p95_and_lower_throughput(capsys):
+    baseline = run({"browse": stats(10.0, 100.0), "search": stats(20.0, 50.0), "login": stats(5.0, 10.0)},
+                   stats(15.0, 160.0))
+    current = run({"browse": stats(11.0, 100.0), "search": stats(30.0, 50.0), "login": stats(5.0, 7.0),
+                   "checkout": stats(40.0, 5.0)},
+                  stats(16.0, 150.0))
+
+    assert bench_http.compare(baseline, current, max_regression=0.2) == ["search", "login"]
+    output = capsys.readouterr().out
+    # Actions missing from the baseline are not compared
+    assert "checkout" not in output
+    assert output.count("REGRESSION") == 2
+
+
+def test_compare_ignores_sub_millisecond_noise():
+    baseline = run({"cart_view": stats(0.4, 500.0)}, stats(0.4, 500.0))
+    current = run({"cart_view": stats(0.9, 500.0)}, stats(0.9, 500.0))
+    assert bench_http.compare(baseline, current, max_regression=0.2) == []
+    assert bench_http.compare(baseline, current, max_regression=0.2, min_ms=0.1) == ["cart_view", "TOTAL"]
+
+
+def test_comparing_saved_runs_fails_on_a_regression(tmp_path, monkeypatch):
+    baseline, current = tmp_path / "old.json", tmp_path / "new.json"
+    baseline.write_text(json.dumps(run({"browse": stats(10.0, 100.0)}, stats(10.0, 100.0))))
+
+    current.write_text(json.dumps(run({"browse": stats(10.5, 98.0)}, stats(10.5, 98.0))))
+    monkeypatch.setattr(sys, "argv", ["bench_http.py", "--compare", str(baseline), str(current)])
+    assert bench_http.main() == 0
+
+    current.write_text(json.dumps(run({"browse": stats(25.0, 40.0)}, stats(25.0, 40.0))))
+    assert bench_http.main() == 1
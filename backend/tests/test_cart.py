@@ -0,0 +1,85 @@
+def cart(client, headers):
+    response = client.get("/api/cart", headers=headers)
+    assert response.status_code == 200
+    return {item["id"]: item["quantity"] for item in response.json["items"]}
+
+
+def test_adding_a_product_twice_sums_the_quantity(client, shopper, make_product):
+    _, headers = shopper
+    product_id = make_product()
+    for quantity in (2, 3):
+        response = client.post("/api/cart/add", json={"productId": f"prod-{product_id}", "quantity": quantity},
+                               headers=headers)
+        assert response.status_code == 200
+    assert cart(client, headers) == {str(product_id): 5}
+
+
+def test_batch_applies_every_operation(client, shopper, make_product):
+    _, headers = shopper
+    kept, replaced, removed = make_product(), make_product(), make_product()
+    client.post("/api/cart/add", json={"productId": removed, "quantity": 1}, headers=headers)
+
+    response = client.post("/api/cart/batch", headers=headers, json={"operations": [
+        {"op": "add", "productId": kept, "quantity": 2},
+        {"op": "add", "productId": kept, "quantity": 1},
+        {"op": "add", "productId": replaced, "quantity": 4},
+        {"op": "set", "productId": f"prod-{replaced}", "quantity": 1},
+        {"op": "remove", "productId": removed},
+    ]})
+    assert response.status_code == 200
+    assert {item["id"]: item["quantity"] for item in response.json["items"]} == {str(kept): 3, str(replaced): 1}
+    assert cart(client, headers) == {str(kept): 3, str(replaced): 1}
+
+
+def test_batch_changes_nothing_when_one_operation_fails(client, shopper, make_product):
+    _, headers = shopper
+    product_id, scarce = make_product(), make_product(stock=2)
+    client.post("/api/cart/add", json={"productId": product_id, "quantity": 1}, headers=headers)
+
+    response = client.post("/api/cart/batch", headers=headers, json={"operations": [
+        {"op": "set", "productId": product_id, "quantity": 5},
+        {"op": "add", "productId": scarce, "quantity": 3},
+        {"op": "add", "productId": 999999, "quantity": 1},
+    ]})
+    assert response.status_code == 400
+    details = {item["productId"]: item for item in response.json["details"]}
+    assert details[f"prod-{scarce}"]["available"] == 2
+    assert details["prod-999999"]["error"] == "Product not found"
+    assert cart(client, headers) == {str(product_id): 1}
+
+
+def test_batch_rejects_malformed_operations(client, shopper):
+    _, headers = shopper
+    for operations in (None, [{"op": "swap", "productId": 1}], [{"op": "add", "productId": 1, "quantity": 0}]):
+        response = client.post("/api/cart/batch", json={"operations": operations}, headers=headers)
+        assert response.status_code == 400
+
+
+def test_merge_adds_to_the_cart_and_caps_at_stock(client, shopper, make_product):
+    _, headers = shopper
+    owned, scarce = make_product(), make_product(stock=3)
+    client.post("/api/cart/add", json={"productId": owned, "quantity": 2}, headers=headers)
+
+    response = client.post("/api/cart/merge", headers=headers, json={"items": [
+        {"productId": f"prod-{owned}", "quantity": 1},
+        {"productId": scarce, "quantity": 5},
+        {"productId": 999999, "quantity": 1},
+    ]})
+    assert response.status_code == 200
+    assert cart(client, headers) == {str(owned): 3, str(scarce): 3}
+    adjusted = {item["productId"]: item["quantity"] for item in response.json["adjusted"]}
+    assert adjusted == {f"prod-{scarce}": 3, "prod-999999": 0}
+
+
+def test_login_merges_the_guest_cart(client, shopper, make_product):
+    user, headers = shopper
+    product_id = make_product()
+    response = client.post("/api/auth/login", json={
+        "email": user["email"],
+        "password": "secret",
+        "guestCart": [{"productId": product_id, "quantity": 2}],
+    })
+    assert response.status_code == 200
+    assert [(item["id"], item["quantity"]) for item in response.json["cart"]] == [(str(product_id), 2)]
+    assert response.json["cartAdjusted"] == []
+    assert cart(client, headers) == {str(product_id): 2}
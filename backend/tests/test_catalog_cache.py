@@ -0,0 +1,59 @@
+import sqlite3
+
+
+def catalog_version(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_repeat_reads_come_from_the_cache(client, make_product):
+    product_id = make_product()
+    first = client.get(f"/api/products/{product_id}")
+    second = client.get(f"/api/products/{product_id}")
+    assert int(first.headers["X-Query-Count"]) > 0
+    assert second.headers["X-Query-Count"] == "0"
+    assert second.json == first.json
+
+
+def test_catalog_writes_move_the_version(shop, make_product):
+    product_id = make_product()
+    before = catalog_version(shop.db.db_file)
+    # Written by another process: only the triggers know about it
+    conn = sqlite3.connect(shop.db.db_file)
+    conn.execute("UPDATE products SET price = price + 1 WHERE id = ?", (product_id,))
+    conn.commit()
+    conn.close()
+    assert catalog_version(shop.db.db_file) > before
+
+
+def test_another_process_write_invalidates_cached_reads(client, shop, make_product, monkeypatch):
+    # Check the stored version on every read instead of every CATALOG_VERSION_TTL
+    monkeypatch.setattr(shop.db, "catalog_version_ttl", 0)
+    product_id = make_product()
+    path = f"/api/products/{product_id}"
+    cached = client.get(path)
+    etag = cached.headers["ETag"]
+
+    conn = sqlite3.connect(shop.db.db_file)
+    conn.execute("UPDATE products SET name = 'Renamed Elsewhere' WHERE id = ?", (product_id,))
+    conn.commit()
+    conn.close()
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json["product"]["name"] == "Renamed Elsewhere"
+
+
+def test_cart_writes_leave_the_catalog_cached(client, shop, shopper, make_product):
+    _, headers = shopper
+    product_id = make_product()
+    client.get(f"/api/products/{product_id}")
+    before = shop.db.catalog_version
+    client.post("/api/cart/add", json={"productId": product_id, "quantity": 1}, headers=headers)
+    shop.db.refresh_catalog_version()
+    assert shop.db.catalog_version == before
+    assert client.get(f"/api/products/{product_id}").headers["X-Query-Count"] == "0"
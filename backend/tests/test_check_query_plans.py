@@ -0,0 +1,38 @@
+import sqlite3
+
+import pytest
+
+import check_query_plans
+import migrations
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = sqlite3.connect(":memory:")
+    migrations.upgrade(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM products p WHERE p.category_id = 1 AND p.treatment_for = 'x' ORDER BY p.id LIMIT 5",
+    "SELECT * FROM products p ORDER BY p.sold_count DESC, p.id ASC LIMIT 5",
+    "SELECT * FROM products p ORDER BY p.id DESC LIMIT 5",
+    "SELECT * FROM products WHERE id = 1",
+])
+def test_index_reads_and_ordered_pages_pass(conn, sql):
+    _, problems = check_query_plans.full_scans(conn, sql)
+    assert problems == []
+
+
+@pytest.mark.parametrize("sql", [
+    # A filter with no usable index reads the whole table, LIMIT or not
+    "SELECT * FROM products p WHERE p.treatment_for = 'x' LIMIT 5",
+    "SELECT * FROM products p WHERE p.treatment_for = 'x'",
+    # Walking the ORDER BY index without a LIMIT reads all of it
+    "SELECT p.name FROM products p ORDER BY p.name",
+    "SELECT * FROM orders o WHERE o.status = 'to-pay' ORDER BY o.total LIMIT 5",
+])
+def test_full_scans_are_reported(conn, sql):
+    _, problems = check_query_plans.full_scans(conn, sql)
+    assert problems
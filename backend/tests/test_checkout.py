@@ -0,0 +1,78 @@
+def stock(shop, product_id):
+    conn = shop.db.get_connection()
+    return conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()[0]
+
+
+def order_count(shop, user_id):
+    conn = shop.db.get_connection()
+    return conn.execute("SELECT COUNT(*) FROM orders WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+
+def test_order_takes_the_stock(shop, shopper, make_product, checkout):
+    _, headers = shopper
+    product_id = make_product(stock=3)
+    response = checkout(headers, [(product_id, 3)])
+    assert response.status_code == 201
+    assert response.json["order"]["items"][0]["productId"] == f"prod-{product_id}"
+    assert stock(shop, product_id) == 0
+
+
+def test_order_beyond_stock_is_rejected_whole(client, shop, shopper, make_product, checkout):
+    user, headers = shopper
+    plenty, scarce = make_product(stock=10), make_product(stock=2)
+
+    response = checkout(headers, [(plenty, 1), (scarce, 3)])
+    assert response.status_code == 409
+    assert response.json["details"] == [{"productId": f"prod-{scarce}", "requested": 3, "available": 2}]
+    # Nothing was written: no order, no stock taken, and the cart is intact
+    assert order_count(shop, user["id"]) == 0
+    assert (stock(shop, plenty), stock(shop, scarce)) == (10, 2)
+    items = client.get("/api/cart", headers=headers).json["items"]
+    assert {item["id"]: item["quantity"] for item in items} == {str(plenty): 1, str(scarce): 3}
+
+
+def test_sold_out_product_is_rejected(shop, make_shopper, make_product, checkout):
+    _, first = make_shopper()
+    _, second = make_shopper()
+    product_id = make_product(stock=1)
+    assert checkout(first, [(product_id, 1)]).status_code == 201
+    response = checkout(second, [(product_id, 1)])
+    assert response.status_code == 409
+    assert response.json["details"][0]["available"] == 0
+    assert stock(shop, product_id) == 0
+
+
+def test_held_stock_goes_to_the_holder(client, shop, make_shopper, make_product, checkout):
+    _, holder = make_shopper()
+    _, other = make_shopper()
+    product_id = make_product(stock=2)
+
+    client.post("/api/cart/add", json={"productId": product_id, "quantity": 2}, headers=holder)
+    response = client.post("/api/checkout/reserve", headers=holder)
+    assert response.status_code == 200
+    assert response.json["reservation"]["items"] == [{"productId": f"prod-{product_id}", "quantity": 2}]
+
+    # The holder's units are not available to anyone else, to reserve or to buy
+    client.post("/api/cart/add", json={"productId": product_id, "quantity": 1}, headers=other)
+    assert client.post("/api/checkout/reserve", headers=other).status_code == 409
+    assert checkout(other, []).status_code == 409
+
+    assert checkout(holder, []).status_code == 201
+    assert stock(shop, product_id) == 0
+
+
+def test_released_hold_frees_the_stock(client, make_shopper, make_product, checkout):
+    _, holder = make_shopper()
+    _, other = make_shopper()
+    product_id = make_product(stock=1)
+
+    client.post("/api/cart/add", json={"productId": product_id, "quantity": 1}, headers=holder)
+    assert client.post("/api/checkout/reserve", headers=holder).status_code == 200
+    assert client.delete("/api/checkout/reserve", headers=holder).json["released"] == 1
+
+    assert checkout(other, [(product_id, 1)]).status_code == 201
+
+
+def test_empty_cart_cannot_be_ordered(shopper, checkout):
+    _, headers = shopper
+    assert checkout(headers, []).status_code == 400
@@ -0,0 +1,90 @@
+import pytest
+
+from models import CountingConnection
+
+
+def row_counts(shop, user_id, product_id):
+    conn = shop.db.get_connection()
+    return (
+        conn.execute("SELECT COUNT(*) FROM orders WHERE user_id = ?", (user_id,)).fetchone()[0],
+        conn.execute("SELECT COUNT(*) FROM cart_items WHERE user_id = ?", (user_id,)).fetchone()[0],
+        conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()[0],
+    )
+
+
+@pytest.fixture
+def commits(monkeypatch):
+    """
+    Count commits on every database connection
+    """
+    made = []
+    commit = CountingConnection.commit
+
+    def counting(conn):
+        made.append(conn)
+        return commit(conn)
+    monkeypatch.setattr(CountingConnection, "commit", counting)
+    return made
+
+
+def test_order_commits_once(client, shopper, make_product, commits):
+    _, headers = shopper
+    products = [make_product() for _ in range(5)]
+    for product_id in products:
+        client.post("/api/cart/add", json={"productId": product_id, "quantity": 2}, headers=headers)
+
+    commits.clear()
+    response = client.post("/api/orders", json={"address": {"city": "Manila"}, "paymentMethod": "cod"},
+                           headers=headers)
+    assert response.status_code == 201
+    assert len(response.json["order"]["items"]) == 5
+    assert len(commits) == 1
+
+
+def test_failed_order_writes_nothing(client, shop, shopper, make_product, checkout, monkeypatch):
+    user, headers = shopper
+    product_id = make_product(stock=5)
+
+    def fail(cursor, items):
+        raise RuntimeError("disk full")
+    # Fails after the stock decrement, before the order rows are inserted
+    monkeypatch.setattr(shop.sold_counts, "record", fail)
+
+    response = checkout(headers, [(product_id, 2)])
+    assert response.status_code == 500
+    assert row_counts(shop, user["id"], product_id) == (0, 1, 5)
+
+    monkeypatch.undo()
+    assert checkout(headers, []).status_code == 201
+    assert row_counts(shop, user["id"], product_id) == (1, 0, 3)
+
+
+def test_placed_order_matches_the_stored_order(client, shopper, make_product, checkout):
+    _, headers = shopper
+    first, second = make_product(price=12.5), make_product(price=40.0)
+    placed = checkout(headers, [(first, 2), (second, 1)]).json["order"]
+
+    order_id = placed["id"].removeprefix("order-")
+    stored = client.get(f"/api/orders/{order_id}", headers=headers).json["order"]
+    # The placed order keeps its prefixed ids, which the frontend expects
+    assert stored["id"] == order_id
+    for key in ("total", "status", "createdAt", "address", "paymentMethod"):
+        assert placed[key] == stored[key]
+    assert [(item["productId"].removeprefix("prod-"), item["quantity"], item["price"]) for item in placed["items"]] \
+        == [(item["productId"], item["quantity"], item["price"]) for item in stored["items"]]
+    assert placed["total"] == 65.0
+
+
+def test_orders_change_the_product_etag(client, shopper, make_product, checkout, monkeypatch, shop):
+    _, headers = shopper
+    product_id = make_product(stock=4)
+    path = f"/api/products/{product_id}"
+    etag = client.get(path).headers["ETag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    monkeypatch.setattr(shop.db, "catalog_version_ttl", 0)
+    assert checkout(headers, [(product_id, 3)]).status_code == 201
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json["product"]["stock"] == 1
@@ -0,0 +1,39 @@
+import gzip
+import json
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+def test_large_json_is_gzipped(client):
+    response = client.get("/api/products", headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    plain = client.get("/api/products")
+    assert json.loads(gzip.decompress(response.data)) == plain.json
+
+
+def test_each_encoding_has_its_own_etag(client):
+    plain = client.get("/api/products").headers["ETag"]
+    gzipped = client.get("/api/products", headers=GZIP).headers["ETag"]
+    assert gzipped != plain
+    assert gzipped == plain[:-1] + '-gzip"'
+
+
+def test_either_etag_revalidates(client):
+    plain = client.get("/api/products").headers["ETag"]
+    gzipped = client.get("/api/products", headers=GZIP).headers["ETag"]
+
+    response = client.get("/api/products", headers={**GZIP, "If-None-Match": gzipped})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == gzipped
+
+    response = client.get("/api/products", headers={"If-None-Match": plain})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == plain
+
+
+def test_small_bodies_are_sent_as_is(client):
+    response = client.get("/api/health", headers=GZIP)
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
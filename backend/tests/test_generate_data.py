@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import generate_data
+import serializers
+from auth import verify_password
+from models import Database, Order
+
+PROFILE = generate_data.load_profile(None, ["products=40", "users=20", "orders=200", "batch_size=64"])
+STATUSES = {"to-pay", "to-ship", "to-receive", "completed"}
+
+
+@pytest.fixture(scope="module")
+def generated(tmp_path_factory):
+    db_file = str(tmp_path_factory.mktemp("generated") / "fertishop.db")
+    counts = generate_data.generate(db_file, PROFILE, log=lambda message: None)
+    db = Database(db_file, pool_size=2)
+    yield db, counts
+    db.close()
+
+
+def test_profile_sizes_are_met(generated):
+    db, counts = generated
+    conn = db.get_connection()
+    for table in ("products", "users", "orders"):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == PROFILE[table]
+    assert counts["orders"] == PROFILE["orders"]
+
+
+def test_generated_orders_read_like_placed_ones(shop, generated):
+    db, _ = generated
+    orders = Order(db)
+    buyers = [row[0] for row in db.get_connection().execute("SELECT DISTINCT user_id FROM orders")]
+    with shop.app.test_request_context():
+        for user_id in buyers:
+            page, _ = orders.get_user_orders_page(user_id, limit=100)
+            for order in serializers.many(serializers.order, page):
+                assert order["status"] in STATUSES
+                assert order["paymentMethod"] in ("gcash", "cod")
+                assert set(order["address"]) == {"fullName", "street", "city", "zip", "phone"}
+                assert order["items"]
+                assert order["total"] == pytest.approx(sum(i["price"] * i["quantity"] for i in order["items"]))
+            summaries, _ = orders.get_user_orders_page(user_id, limit=100, summary=True)
+            json.loads(serializers.dumps(orders=serializers.many(serializers.order_summary, summaries)))
+
+
+def test_sold_counts_match_the_order_lines(generated):
+    db, _ = generated
+    conn = db.get_connection()
+    drift = conn.execute("""
+        SELECT COUNT(*) FROM products p
+        WHERE p.sold_count != (SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE product_id = p.id)
+    """).fetchone()[0]
+    assert drift == 0
+
+
+def test_generated_users_can_log_in(generated):
+    db, _ = generated
+    stored = db.get_connection().execute("SELECT password FROM users WHERE email = 'demo@example.com'").fetchone()[0]
+    assert verify_password(stored, "password")
@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/api/products", "/api/products/featured", "/api/products/1",
+                                  "/api/products/1/related", "/api/categories", "/api/usecases"])
+def test_catalog_responses_revalidate_with_a_304(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.data == b""
+
+
+def test_etags_change_with_the_catalog(client, make_product):
+    before = client.get("/api/products").headers["ETag"]
+    make_product()
+
+    response = client.get("/api/products", headers={"If-None-Match": before})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != before
+
+
+def test_etags_depend_on_the_query(client):
+    first = client.get("/api/products", query_string={"limit": 2}).headers["ETag"]
+    second = client.get("/api/products", query_string={"limit": 3}).headers["ETag"]
+    assert first != second
+
+
+@pytest.mark.parametrize("path, method", [
+    ("/api/products", "get_page"),
+    ("/api/products/featured", "get_featured"),
+    ("/api/products/1", "get_by_id"),
+    ("/api/products/1/related", "get_related"),
+])
+def test_catalog_errors_are_not_cached(client, shop, monkeypatch, path, method):
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is gone")
+    monkeypatch.setattr(shop.product_model, method, fail)
+
+    response = client.get(path)
+    assert response.status_code == 500
+    assert "error" in response.json
+    assert "ETag" not in response.headers
+
+
+def test_missing_product_is_not_cached(client):
+    response = client.get("/api/products/999999")
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
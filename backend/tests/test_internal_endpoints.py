@@ -0,0 +1,30 @@
+import pytest
+
+INTERNAL = ["/api/stats", "/api/metrics", "/api/leaderboard/check"]
+REMOTE = {"REMOTE_ADDR": "203.0.113.7"}
+
+
+@pytest.mark.parametrize("path", INTERNAL)
+def test_loopback_clients_get_in(client, path):
+    assert client.get(path).status_code == 200
+
+
+@pytest.mark.parametrize("path", INTERNAL)
+def test_remote_clients_are_refused(client, path):
+    response = client.get(path, environ_base=REMOTE)
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("path", INTERNAL)
+def test_admin_token_is_required_when_set(client, shop, monkeypatch, path):
+    monkeypatch.setattr(shop, "ADMIN_TOKEN", "s3cret")
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 403
+    response = client.get(path, headers={"Authorization": "Bearer s3cret"}, environ_base=REMOTE)
+    assert response.status_code == 200
+
+
+def test_metrics_count_requests(client):
+    client.get("/api/categories")
+    body = client.get("/api/metrics").get_data(as_text=True)
+    assert "/api/categories" in body
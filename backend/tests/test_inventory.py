@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from inventory import Inventory
+
+
+def holds(shop, user_id):
+    conn = shop.db.get_connection()
+    return conn.execute("SELECT COUNT(*) FROM inventory_reservations WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+
+def test_sweep_deletes_only_expired_holds(shop, make_shopper, make_product):
+    inventory = Inventory(shop.db, hold_seconds=60, sweep_interval=0)
+    (expiring, _), (live, _) = make_shopper(), make_shopper()
+    product_id = make_product(stock=5)
+    inventory.reserve(expiring["id"], [(product_id, 1)])
+    later = time.time() + 30
+    inventory.hold_seconds = 600
+    inventory.reserve(live["id"], [(product_id, 1)])
+
+    assert inventory.sweep(now=later) == 0
+    assert inventory.sweep(now=later + 60) == 1
+    assert (holds(shop, expiring["id"]), holds(shop, live["id"])) == (0, 1)
+    assert inventory.stats()["swept"] == 1
+    inventory.release(live["id"])
+
+
+def test_expired_holds_stop_counting_before_the_sweep(shop, make_shopper, make_product, checkout):
+    inventory = Inventory(shop.db, hold_seconds=0, sweep_interval=0)
+    holder, _ = make_shopper()
+    _, other = make_shopper()
+    product_id = make_product(stock=1)
+    inventory.reserve(holder["id"], [(product_id, 1)])
+
+    assert holds(shop, holder["id"]) == 1
+    assert checkout(other, [(product_id, 1)]).status_code == 201
+    inventory.sweep()
+
+
+def test_sweeper_releases_expired_holds(shop, make_shopper, make_product):
+    inventory = Inventory(shop.db, hold_seconds=0, sweep_interval=0.01)
+    holder, _ = make_shopper()
+    inventory.reserve(holder["id"], [(make_product(), 2)])
+    assert holds(shop, holder["id"]) == 1
+
+    inventory.start_sweeper()
+    try:
+        assert inventory.stats()["sweeperRunning"]
+        deadline = time.monotonic() + 5
+        while holds(shop, holder["id"]) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        inventory.stop_sweeper()
+    assert holds(shop, holder["id"]) == 0
+    assert inventory.stats()["swept"] >= 1
+    assert not inventory.stats()["sweeperRunning"]
+
+
+@pytest.mark.parametrize("interval", [0, -1])
+def test_no_sweeper_without_an_interval(shop, interval):
+    inventory = Inventory(shop.db, sweep_interval=interval)
+    inventory.start_sweeper()
+    assert not inventory.stats()["sweeperRunning"]
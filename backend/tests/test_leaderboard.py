@@ -0,0 +1,116 @@
+import time
+
+from leaderboard import Leaderboard
+
+
+def popular_ids(client, **params):
+    response = client.get("/api/products", query_string={"sort": "popular", "limit": 100, **params})
+    assert response.status_code == 200
+    return [int(p["id"]) for p in response.json["products"]]
+
+
+def expected_ids(shop, category=None):
+    where, params = ("WHERE c.slug = ?", [category]) if category else ("", [])
+    conn = shop.db.get_connection()
+    return [row[0] for row in conn.execute(
+        f"SELECT p.id FROM products p JOIN categories c ON p.category_id = c.id {where} "
+        "ORDER BY p.sold_count DESC, p.id ASC LIMIT 100", params
+    )]
+
+
+def assert_consistent(client):
+    response = client.get("/api/leaderboard/check")
+    assert response.status_code == 200, response.json["problems"]
+    assert response.json["consistent"]
+
+
+def best_sold_count(shop):
+    return shop.db.get_connection().execute("SELECT MAX(sold_count) FROM products").fetchone()[0]
+
+
+def test_boards_follow_orders(client, shop, make_shopper, make_product, checkout):
+    # Tied with the best seller, then sales put them on top in reverse order
+    top = best_sold_count(shop)
+    product_ids = [make_product(stock=1000, sold_count=top, category=category)
+                   for category in ("organic", "organic", "soil-enhancer")]
+    for index, product_id in enumerate(product_ids):
+        _, headers = make_shopper()
+        assert checkout(headers, [(product_id, 100 * (index + 1))]).status_code == 201
+    shop.sold_counts.fold()
+
+    assert popular_ids(client)[:3] == product_ids[::-1]
+    assert popular_ids(client) == expected_ids(shop)
+    assert popular_ids(client, category="organic") == expected_ids(shop, "organic")
+    featured = client.get("/api/products/featured", query_string={"limit": 3}).json["products"]
+    assert [int(p["id"]) for p in featured] == product_ids[::-1]
+    assert_consistent(client)
+
+
+def test_sold_out_products_leave_featured(client, shop, shopper, make_product, checkout):
+    _, headers = shopper
+    product_id = make_product(stock=1, sold_count=best_sold_count(shop) + 1)
+    featured = client.get("/api/products/featured", query_string={"limit": 1}).json["products"]
+    assert featured[0]["id"] == str(product_id)
+
+    assert checkout(headers, [(product_id, 1)]).status_code == 201
+    featured = client.get("/api/products/featured", query_string={"limit": 1}).json["products"]
+    assert featured[0]["id"] != str(product_id)
+    # Still listed by the popular sort, which does not filter on stock
+    assert popular_ids(client)[0] == product_id
+    assert_consistent(client)
+
+
+def test_direct_catalog_writes_reach_the_boards(client, shop, make_product):
+    product_id = make_product(sold_count=best_sold_count(shop) + 1, category="soil-enhancer")
+    conn = shop.db.get_connection()
+    conn.execute("UPDATE products SET category_id = (SELECT id FROM categories WHERE slug = 'organic') "
+                 "WHERE id = ?", (product_id,))
+    conn.commit()
+    shop.db.bump_catalog_version()
+
+    assert popular_ids(client, category="organic")[0] == product_id
+    assert popular_ids(client, category="organic") == expected_ids(shop, "organic")
+    assert_consistent(client)
+
+
+def test_pages_past_a_small_board_fall_back(shop):
+    board = Leaderboard(shop.db, size=3, prune_interval=0)
+    board.rebuild()
+    products, cursor = board.page(2)
+    assert [p["id"] for p in products] == expected_ids(shop)[:2]
+    assert board.page(2, cursor=cursor) is None
+    assert board.check()["consistent"]
+
+
+def test_prune_keeps_rows_another_process_has_not_read(shop, make_product):
+    shop.leaderboard.prune()
+    conn = shop.db.get_connection()
+    read = conn.execute("SELECT MAX(id) FROM product_changes").fetchone()[0] or 0
+    # A sibling process that has read up to here and no further
+    conn.execute("INSERT INTO leaderboard_progress (pid, last_change, updated_at) VALUES (-1, ?, ?)",
+                 (read, time.time()))
+    conn.commit()
+    make_product()
+    make_product()
+
+    shop.leaderboard.prune()
+    assert conn.execute("SELECT COUNT(*) FROM product_changes WHERE id > ?", (read,)).fetchone()[0] == 2
+
+    # Once the sibling stops reporting, its progress expires and the rows go
+    shop.leaderboard.prune(now=time.time() + Leaderboard.PROGRESS_TIMEOUT + 1)
+    assert conn.execute("SELECT COUNT(*) FROM leaderboard_progress WHERE pid = -1").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM product_changes").fetchone()[0] == 0
+    assert shop.leaderboard.check()["consistent"]
+
+
+def test_board_pages_show_stock_after_a_sale(client, shop, shopper, make_product, checkout):
+    _, headers = shopper
+    product_id = make_product(stock=10, sold_count=best_sold_count(shop) + 1)
+    assert popular_ids(client)[0] == product_id
+    assert checkout(headers, [(product_id, 3)]).status_code == 201
+    # Not folded yet, so nothing about the product was logged for the boards
+
+    page = client.get("/api/products", query_string={"sort": "popular", "limit": 1}).json["products"]
+    featured = client.get("/api/products/featured", query_string={"limit": 1}).json["products"]
+    assert [(p["id"], p["stock"]) for p in page] == [(str(product_id), 7)]
+    assert [(p["id"], p["stock"]) for p in featured] == [(str(product_id), 7)]
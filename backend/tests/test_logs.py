@@ -0,0 +1,17 @@
+import logging
+
+
+def test_failed_logins_do_not_log_the_address(client, shopper, caplog):
+    user, _ = shopper
+    caplog.set_level(logging.DEBUG, logger="fertishop")
+    for email, password in ((user["email"], "wrong"), ("nobody@example.com", "secret")):
+        response = client.post("/api/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 401
+
+    failures = [record for record in caplog.records if getattr(record, "event", None) == "auth.login_failed"]
+    assert [record.fields["reason"] for record in failures] == ["bad_password", "unknown_email"]
+    assert failures[0].fields["user_id"] == user["id"]
+    for record in caplog.records:
+        text = repr(getattr(record, "fields", None)) + record.getMessage()
+        assert user["email"] not in text
+        assert "nobody@example.com" not in text
@@ -0,0 +1,56 @@
+import sqlite3
+
+import migrations
+
+
+class NoFTS5Cursor(sqlite3.Cursor):
+    # What a build of SQLite without FTS5 reports
+    def execute(self, sql, *args):
+        if "fts5" in sql:
+            raise sqlite3.OperationalError("no such module: fts5")
+        return super().execute(sql, *args)
+
+
+class NoFTS5Connection(sqlite3.Connection):
+    def cursor(self, factory=NoFTS5Cursor):
+        return super().cursor(factory)
+
+
+def tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_upgrade_applies_every_migration_once(tmp_path):
+    conn = sqlite3.connect(tmp_path / "shop.db")
+    latest = migrations.MIGRATIONS[-1][0]
+    assert migrations.upgrade(conn) == latest
+    assert migrations.pending(conn) == []
+    assert migrations.upgrade(conn) == latest
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(migrations.MIGRATIONS)
+
+
+def test_upgrade_stops_at_the_target(tmp_path):
+    conn = sqlite3.connect(tmp_path / "shop.db")
+    assert migrations.upgrade(conn, target=3) == 3
+    assert [version for version, _, _ in migrations.pending(conn)] == [m[0] for m in migrations.MIGRATIONS[3:]]
+
+
+def test_search_index_is_created_once_fts5_is_available(tmp_path):
+    path = tmp_path / "shop.db"
+    conn = sqlite3.connect(path, factory=NoFTS5Connection)
+    migrations.upgrade(conn)
+    # Everything else is applied; product_search stays pending
+    assert [name for _, name, _ in migrations.pending(conn)] == ["product_search"]
+    assert "products_fts" not in tables(conn)
+    conn.execute("INSERT INTO categories (name, slug) VALUES ('Organic', 'organic')")
+    conn.execute("INSERT INTO products (name, description, price, category_id) "
+                 "VALUES ('Kelp Tonic', 'Seaweed', 1, 1)")
+    conn.commit()
+    conn.close()
+
+    conn = sqlite3.connect(path)
+    migrations.upgrade(conn)
+    assert migrations.pending(conn) == []
+    assert "products_fts" in tables(conn)
+    # Products that existed before the index are searchable
+    assert conn.execute("SELECT rowid FROM products_fts WHERE products_fts MATCH 'kelp'").fetchall() == [(1,)]
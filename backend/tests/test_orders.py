@@ -0,0 +1,61 @@
+def test_orders_are_listed_newest_first(client, shopper, make_product, checkout):
+    user, headers = shopper
+    product_id = make_product()
+    placed = [checkout(headers, [(product_id, 1)]).json["order"]["id"] for _ in range(3)]
+
+    response = client.get("/api/orders", headers=headers)
+    assert response.status_code == 200
+    orders = response.json["orders"]
+    assert [f"order-{order['id']}" for order in orders] == placed[::-1]
+    assert response.json["nextCursor"] is None
+    assert orders[0]["userId"] == str(user["id"])
+    assert orders[0]["address"]["city"] == "Manila"
+    assert [item["productId"] for item in orders[0]["items"]] == [str(product_id)]
+
+
+def test_order_pages_cover_every_order_once(client, shopper, make_product, checkout):
+    _, headers = shopper
+    product_id = make_product(stock=100)
+    placed = [checkout(headers, [(product_id, 1)]).json["order"]["id"] for _ in range(7)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/orders", query_string=params, headers=headers)
+        assert response.status_code == 200
+        assert len(response.json["orders"]) <= 3
+        seen.extend(f"order-{order['id']}" for order in response.json["orders"])
+        cursor = response.json["nextCursor"]
+        if not cursor:
+            break
+    assert seen == placed[::-1]
+
+
+def test_order_summaries_count_items(client, shopper, make_product, checkout):
+    _, headers = shopper
+    first, second = make_product(), make_product()
+    checkout(headers, [(first, 2), (second, 3)])
+
+    response = client.get("/api/orders", query_string={"summary": "1"}, headers=headers)
+    assert response.status_code == 200
+    [order] = response.json["orders"]
+    assert order["itemCount"] == 2
+    assert order["itemQuantity"] == 5
+    assert "items" not in order
+
+
+def test_orders_reject_a_bad_cursor(client, shopper):
+    _, headers = shopper
+    for cursor in ("not-a-cursor", "WzFd"):
+        response = client.get("/api/orders", query_string={"cursor": cursor}, headers=headers)
+        assert response.status_code == 400
+
+
+def test_orders_are_private(client, make_shopper, make_product, checkout):
+    _, owner = make_shopper()
+    _, other = make_shopper()
+    order_id = checkout(owner, [(make_product(), 1)]).json["order"]["id"].removeprefix("order-")
+
+    assert client.get(f"/api/orders/{order_id}", headers=owner).status_code == 200
+    assert client.get(f"/api/orders/{order_id}", headers=other).status_code == 404
+    assert client.get("/api/orders", headers=other).json["orders"] == []
@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from auth import HasherBusy, PasswordHasher
+
+
+def stored_hash(shop, user_id):
+    conn = shop.db.get_connection()
+    return conn.execute("SELECT password FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+
+
+def test_hashes_verify_and_carry_their_cost_factor():
+    hasher = PasswordHasher(rounds=4, workers=1)
+    hashed = hasher.hash("secret")
+    assert hashed.startswith("$2b$04$")
+    assert hasher.verify(hashed.encode(), b"secret")
+    assert not hasher.verify(hashed.encode(), b"wrong")
+    assert not hasher.needs_rehash(hashed)
+    assert PasswordHasher(rounds=5).needs_rehash(hashed)
+    assert hasher.stats()["completed"] == 3
+
+
+def test_at_most_workers_hash_at_once():
+    hasher = PasswordHasher(rounds=4, workers=2, max_pending=8)
+    lock, running, peak = threading.Lock(), [0], [0]
+    release = threading.Event()
+
+    def work():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(5)
+        with lock:
+            running[0] -= 1
+
+    threads = [threading.Thread(target=hasher._run, args=(work,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert peak[0] == 2
+    assert hasher.stats()["completed"] == 6
+
+
+def test_work_beyond_the_queue_is_rejected_at_once():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    threads = [threading.Thread(target=hasher._run, args=(block,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash("secret")
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join(5)
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["outstanding"] == 0
+    # Room again once the queue drains
+    assert hasher.hash("secret").startswith("$2b$04$")
+
+
+@pytest.mark.parametrize("path", ["/api/auth/login", "/api/auth/register"])
+def test_saturated_hasher_answers_503(client, shop, shopper, monkeypatch, path):
+    user, _ = shopper
+    monkeypatch.setattr(shop.password_hasher, "_slots", threading.BoundedSemaphore(1))
+    shop.password_hasher._slots.acquire()
+
+    email = user["email"] if path.endswith("login") else "new-shopper@example.com"
+    response = client.post(path, json={"name": "New", "email": email, "password": "secret"})
+    assert response.status_code == 503
+    assert "busy" in response.json["error"]
+
+
+def test_login_upgrades_hashes_to_the_current_cost_factor(client, shop, shopper, monkeypatch):
+    user, _ = shopper
+    assert stored_hash(shop, user["id"]).startswith("$2b$04$")
+
+    monkeypatch.setattr(shop.password_hasher, "rounds", 5)
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": "secret"})
+    assert response.status_code == 200
+    assert stored_hash(shop, user["id"]).startswith("$2b$05$")
+    # Still the same password
+    assert client.post("/api/auth/login", json={"email": user["email"], "password": "secret"}).status_code == 200
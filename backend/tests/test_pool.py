@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+
+import pytest
+
+from pool import ConnectionPool, PoolTimeout
+
+
+def make_pool(**kwargs):
+    return ConnectionPool(lambda: sqlite3.connect(":memory:", check_same_thread=False), **kwargs)
+
+
+def test_released_connections_are_reused():
+    pool = make_pool(max_size=2)
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    assert pool.stats()["size"] == 1
+    assert (pool.stats()["inUse"], pool.stats()["checkouts"]) == (1, 2)
+
+
+def test_release_rolls_back_uncommitted_work():
+    pool = make_pool(max_size=1)
+    conn = pool.acquire()
+    conn.execute("CREATE TABLE t (x)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    assert conn.in_transaction
+    pool.release(conn)
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_checkout_times_out_while_every_connection_is_held():
+    pool = make_pool(max_size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+    pool.release(held)
+    assert pool.acquire() is held
+
+
+def test_waiting_checkout_gets_the_released_connection():
+    pool = make_pool(max_size=1, timeout=5.0)
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    pool.release(held)
+    waiter.join(5)
+    assert got == [held]
+
+
+def test_broken_idle_connections_are_replaced():
+    pool = make_pool(max_size=1, health_check_interval=0)
+    broken = pool.acquire()
+    pool.release(broken)
+    broken.close()
+    conn = pool.acquire()
+    assert conn is not broken
+    assert conn.execute("SELECT 1").fetchone() == (1,)
+    assert pool.stats()["failedHealthChecks"] == 1
+
+
+def test_requests_check_their_connection_back_in(client, shop):
+    shop.db.release_connection()
+    before = shop.db.pool.stats()
+    assert client.get("/api/products").status_code == 200
+    after = shop.db.pool.stats()
+    assert after["inUse"] == before["inUse"]
+    assert after["checkouts"] > before["checkouts"]
+
+
+def test_pool_timeouts_answer_503(client, shop, monkeypatch):
+    def exhausted():
+        raise PoolTimeout("Timed out waiting for a database connection")
+
+    shop.db.release_connection()
+    monkeypatch.setattr(shop.db.pool, "acquire", exhausted)
+    response = client.get("/api/products")
+    assert response.status_code == 503
+    assert "busy" in response.json["error"]
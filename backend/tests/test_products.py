@@ -0,0 +1,67 @@
+import pytest
+
+SORT_KEYS = {
+    "popular": lambda p: (-p["soldCount"], int(p["id"])),
+    "price-asc": lambda p: (p["price"], int(p["id"])),
+    "price-desc": lambda p: (-p["price"], int(p["id"])),
+    "name": lambda p: (p["name"], int(p["id"])),
+    "newest": lambda p: -int(p["id"]),
+}
+
+
+def all_pages(client, limit, **params):
+    products, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/products", query_string=query)
+        assert response.status_code == 200
+        assert len(response.json["products"]) <= limit
+        products.extend(response.json["products"])
+        cursor = response.json["nextCursor"]
+        if not cursor:
+            return products
+
+
+@pytest.mark.parametrize("sort", sorted(SORT_KEYS))
+def test_pages_cover_the_catalog_in_order(client, shop, sort):
+    count = shop.db.get_connection().execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    products = all_pages(client, 4, sort=sort)
+    assert len(products) == count
+    assert len({p["id"] for p in products}) == count
+    assert products == sorted(products, key=SORT_KEYS[sort])
+
+
+def test_equal_sort_values_are_not_skipped(client, make_product):
+    ids = {str(make_product(price=12.5)) for _ in range(5)}
+    products = all_pages(client, 2, sort="price-asc")
+    tied = [p["id"] for p in products if p["price"] == 12.5]
+    assert set(tied) >= ids
+    assert tied == sorted(tied, key=int)
+
+
+def test_category_pages_stay_in_the_category(client):
+    products = all_pages(client, 3, category="organic", sort="name")
+    assert products
+    assert {p["category"] for p in products} == {"organic"}
+
+
+def test_page_size_is_bounded(client):
+    response = client.get("/api/products", query_string={"limit": 10000})
+    assert response.status_code == 200
+    assert len(response.json["products"]) <= 100
+
+
+@pytest.mark.parametrize("params", [
+    {"sort": "cheapest"},
+    {"cursor": "garbage"},
+])
+def test_bad_paging_requests_are_rejected(client, params):
+    response = client.get("/api/products", query_string=params)
+    assert response.status_code == 400
+    assert "error" in response.json
+
+
+def test_cursor_must_match_the_sort(client):
+    cursor = client.get("/api/products", query_string={"limit": 1, "sort": "name"}).json["nextCursor"]
+    response = client.get("/api/products", query_string={"limit": 1, "sort": "price-asc", "cursor": cursor})
+    assert response.status_code == 400
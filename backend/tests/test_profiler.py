@@ -0,0 +1,91 @@
+import logging
+
+import pytest
+
+from models import Database
+from pool import ConnectionPool
+from profiler import QueryProfiler, normalize
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    """
+    A Database whose connections are profiled, with every statement slow and three repeats an N+1
+    """
+    db = Database(str(tmp_path / "profiled.db"), pool_size=1, profiler=QueryProfiler(slow_ms=0, n_plus_one=3))
+    db.reset_query_count()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def profiled_app(shop, monkeypatch):
+    """
+    Profile the app's own database for one test
+    """
+    shop.db.release_connection()
+    profiler = QueryProfiler(slow_ms=10000, n_plus_one=3)
+    monkeypatch.setattr(shop.db, "profiler", profiler)
+    monkeypatch.setattr(shop.db, "pool", ConnectionPool(shop.db._connect, max_size=2))
+    yield profiler
+    shop.db.release_connection()
+    shop.db.pool.close()
+
+
+def test_normalize_reduces_statements_to_their_shape():
+    assert normalize("SELECT * FROM products WHERE id = 42 AND name = 'it''s'") \
+        == "SELECT * FROM products WHERE id = ? AND name = ?"
+    assert normalize("SELECT 1 FROM t WHERE id IN (1, 2,\n 3)") == "SELECT ? FROM t WHERE id IN (?+)"
+    assert normalize("SELECT col2 FROM t2 WHERE x = -1.5e3") == "SELECT col2 FROM t2 WHERE x = ?"
+
+
+def test_repeated_statements_are_flagged_as_n_plus_one(profiled, caplog):
+    conn = profiled.get_connection()
+    for product_id in range(1, 6):
+        conn.execute("SELECT name FROM products WHERE id = ?", (product_id,)).fetchall()
+    conn.execute("SELECT COUNT(*) FROM categories").fetchone()
+
+    with caplog.at_level(logging.WARNING, logger="fertishop"):
+        summary = profiled.profile_summary("/test")
+    assert summary["statements"] == 6
+    assert summary["repeated"] == [{"sql": "SELECT name FROM products WHERE id = ?", "count": 5}]
+    assert [record.event for record in caplog.records if record.event == "sql.n_plus_one"] == ["sql.n_plus_one"]
+    assert profiled.profiler.stats()["nPlusOneRequests"] == 1
+    # The profile starts over for the next request
+    assert profiled.profile_summary()["statements"] == 0
+
+
+def test_slow_statements_are_logged_with_their_plan(profiled, caplog):
+    conn = profiled.get_connection()
+    conn.execute("SELECT name FROM products WHERE id = ?", (1,)).fetchall()
+
+    with caplog.at_level(logging.WARNING, logger="fertishop"):
+        summary = profiled.profile_summary()
+    assert summary["slow"] == 1
+    [record] = [record for record in caplog.records if record.event == "sql.slow"]
+    assert record.fields["sql"] == "SELECT name FROM products WHERE id = ?"
+    assert any("products" in line for line in record.fields["plan"])
+
+
+def test_executemany_is_one_statement(profiled):
+    conn = profiled.get_connection()
+    conn.execute("CREATE TEMP TABLE scratch (x)")
+    conn.cursor().executemany("INSERT INTO scratch VALUES (?)", [(n,) for n in range(20)])
+    conn.commit()
+    summary = profiled.profile_summary()
+    assert summary["repeated"] == []
+    assert summary["rows"] == 20
+
+
+def test_profiled_requests_carry_a_summary_header(client, make_product, profiled_app):
+    product_id = make_product()
+    response = client.get(f"/api/products/{product_id}")
+    assert response.status_code == 200
+    header = dict(part.split("=", 1) for part in response.headers["X-SQL-Profile"].split("; "))
+    assert int(header["statements"]) >= 1
+    assert header["repeated"] == "0"
+    assert profiled_app.stats()["requests"] >= 1
+
+
+def test_headers_are_absent_without_profiling(client):
+    assert "X-SQL-Profile" not in client.get("/api/categories").headers
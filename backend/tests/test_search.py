@@ -0,0 +1,69 @@
+import pytest
+
+
+@pytest.fixture
+def add_product(shop):
+    def add(name, description="", treatment_for=""):
+        conn = shop.db.get_connection()
+        cursor = conn.execute(
+            "INSERT INTO products (name, description, price, category_id, stock, treatment_for) "
+            "VALUES (?, ?, 100, 1, 10, ?)",
+            (name, description, treatment_for)
+        )
+        conn.commit()
+        shop.db.bump_catalog_version()
+        return str(cursor.lastrowid)
+    return add
+
+
+def search(client, text, **params):
+    response = client.get("/api/products", query_string={"search": text, **params})
+    assert response.status_code == 200
+    return response.json["products"]
+
+
+def test_name_matches_rank_above_description_matches(client, add_product):
+    in_description = add_product("Garden Helper", "Rich in quorblite minerals")
+    in_name = add_product("Quorblite Granules", "Slow release feed")
+    assert [p["id"] for p in search(client, "quorblite")] == [in_name, in_description]
+
+
+def test_words_match_as_prefixes_and_all_must_match(client, add_product):
+    both = add_product("Zentrovine Kelp Tonic")
+    add_product("Zentrovine Compost")
+    assert [p["id"] for p in search(client, "zentro kel")] == [both]
+
+
+def test_accents_are_ignored(client, add_product):
+    product_id = add_product("Crème Végétale")
+    assert [p["id"] for p in search(client, "vegetale")] == [product_id]
+
+
+def test_results_carry_a_highlighted_snippet(client, add_product):
+    add_product("Plain Name", "Cures flarnish blight fast", "flarnish blight")
+    [product] = search(client, "flarnish")
+    assert "<mark>" in product["snippet"]
+
+
+def test_search_input_cannot_inject_operators(client):
+    for text in ('kelp OR "', "NEAR(a b)", "*", "-", "name:kelp"):
+        search(client, text)
+
+
+def test_renamed_products_are_found_by_their_new_name(client, shop, add_product):
+    product_id = add_product("Old Wrublet Name")
+    conn = shop.db.get_connection()
+    conn.execute("UPDATE products SET name = 'Fresh Plimsor Name' WHERE id = ?", (product_id,))
+    conn.commit()
+    shop.db.bump_catalog_version()
+    assert search(client, "wrublet") == []
+    assert [p["id"] for p in search(client, "plimsor")] == [product_id]
+
+
+def test_search_falls_back_to_like_without_fts5(client, shop, add_product, monkeypatch):
+    product_id = add_product("Snarwick Feed")
+    monkeypatch.setattr(shop.db, "fts_enabled", False)
+    shop.db.bump_catalog_version()
+    products = search(client, "snarwick", sort="name")
+    assert [p["id"] for p in products] == [product_id]
+    assert "snippet" not in products[0]
@@ -0,0 +1,29 @@
+import json
+
+import serializers
+
+
+def test_responses_match_jsonify(client, shop):
+    body = client.get("/api/products/1").get_data(as_text=True)
+    with shop.app.test_request_context():
+        expected = shop.app.json.response(json.loads(body)).get_data(as_text=True)
+    assert body == expected
+
+
+def test_debug_responses_are_pretty_printed(shop, monkeypatch):
+    monkeypatch.setattr(shop.app, "debug", True)
+    with shop.app.test_request_context():
+        response = serializers.respond(status=201, product={"id": "1"})
+    assert response.status_code == 201
+    assert response.get_data(as_text=True).startswith('{\n  "product"')
+
+
+def test_placed_orders_use_prefixed_ids():
+    row = {"id": 7, "user_id": 3, "total": 10.0, "status": "to-pay", "created_at": "2024-01-01 00:00:00",
+           "address": {}, "payment_method": "cod",
+           "items": [{"product_id": 5, "name": "Kelp", "price": 5.0, "quantity": 2, "image": None}]}
+    placed = serializers.placed_order(row)
+    assert placed["id"] == "order-7"
+    assert placed["items"][0]["productId"] == "prod-5"
+    assert placed["items"][0]["image"] == serializers.PLACEHOLDER_IMAGE
+    assert serializers.order(row)["id"] == "7"
@@ -0,0 +1,117 @@
+import os
+import socket
+import threading
+import time
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+from server import Master, PooledWSGIServer, Worker
+
+
+class PidApp:
+    """
+    WSGI app that answers with the serving process's pid
+    """
+
+    def __init__(self):
+        self.config = {}
+
+    def __call__(self, environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [str(os.getpid()).encode()]
+
+
+def load_pid_app():
+    return PidApp(), SimpleNamespace(close=lambda: None), SimpleNamespace(flush=lambda: None)
+
+
+def get(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+        return int(response.read())
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def master():
+    master = Master(load_app=load_pid_app, host="127.0.0.1", port=0, workers=2, threads=2,
+                    max_requests=0, graceful_timeout=5, ready_timeout=10)
+    master.bind()
+    yield master
+    if master.listener.fileno() != -1:
+        master.stop()
+
+
+def test_readiness_reports_draining(client, shop, monkeypatch):
+    response = client.get("/api/ready")
+    assert (response.status_code, response.json["status"]) == (200, "ready")
+
+    monkeypatch.setitem(shop.app.config, "DRAINING", True)
+    response = client.get("/api/ready")
+    assert (response.status_code, response.json["status"]) == (503, "draining")
+
+
+def test_worker_stopped_while_loading_stops_once_serving():
+    worker = Worker(load_pid_app, None, threads=1, max_requests=0, ready_fd=-1)
+    worker.stop()
+    assert worker.stopping
+
+
+def test_server_recycles_after_max_requests():
+    listener = socket.create_server(("127.0.0.1", 0))
+    recycled = threading.Event()
+    server = PooledWSGIServer(PidApp(), listener, threads=2, max_requests=3, on_recycle=recycled.set)
+    serving = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    serving.start()
+    try:
+        port = listener.getsockname()[1]
+        assert [get(port) for _ in range(3)] == [os.getpid()] * 3
+        assert recycled.wait(5)
+        assert server.handled == 3
+    finally:
+        server.shutdown()
+        serving.join(5)
+        server.drain()
+        listener.close()
+
+
+def test_workers_share_the_socket_and_drain_on_stop(master):
+    workers = {master.spawn() for _ in range(2)}
+    assert set(master.workers) == workers
+
+    served = {get(master.port) for _ in range(20)}
+    assert served <= workers
+
+    master.stop()
+    assert master.workers == {} and master.retiring == {}
+    for pid in workers:
+        with pytest.raises(ChildProcessError):
+            os.waitpid(pid, os.WNOHANG)
+
+
+def test_rolling_restart_replaces_every_worker(master):
+    old = {master.spawn() for _ in range(2)}
+    master.rolling_restart()
+    wait_for(lambda: (master.reap(), not master.retiring)[1])
+
+    assert len(master.workers) == 2
+    assert not set(master.workers) & old
+    assert get(master.port) in master.workers
+
+
+def test_recycled_workers_are_replaced(master):
+    master.max_requests, master.max_requests_jitter = 2, 0
+    first = master.spawn()
+    assert [get(master.port), get(master.port)] == [first, first]
+
+    wait_for(lambda: (master.reap(), first not in master.workers)[1])
+    [replacement] = master.workers
+    assert replacement != first
+    assert get(master.port) == replacement
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import stat
+
+import pytest
+
+import snapshot
+
+
+def count(db_file, table):
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+@pytest.fixture
+def fresh_dir(tmp_path, monkeypatch):
+    """
+    An empty snapshot directory with a seed that only records that it ran
+    """
+    seeds = []
+
+    def seed(db_file, profile):
+        seeds.append(profile)
+        with sqlite3.connect(db_file) as conn:
+            conn.execute("CREATE TABLE seeded (n)")
+            conn.execute("INSERT INTO seeded VALUES (1)")
+    monkeypatch.setenv("SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(snapshot, "_seed", seed)
+    return seeds
+
+
+def test_isolated_databases_are_seeded_and_independent(shop):
+    with snapshot.isolated_database() as first, snapshot.isolated_database() as second:
+        assert first != second
+        assert count(first, "products") > 0 and count(first, "users") > 0
+        with sqlite3.connect(first) as conn:
+            conn.execute("DELETE FROM products")
+        assert count(first, "products") == 0
+        assert count(second, "products") > 0
+    assert not os.path.exists(first) and not os.path.exists(second)
+
+
+def test_restore_replaces_a_database_and_its_journal(shop, tmp_path):
+    db_file = str(tmp_path / "fertishop.db")
+    for name in (db_file, db_file + "-wal", db_file + "-shm"):
+        with open(name, "wb") as f:
+            f.write(b"stale")
+
+    snapshot.restore(db_file)
+    assert not os.path.exists(db_file + "-wal") and not os.path.exists(db_file + "-shm")
+    assert count(db_file, "products") > 0
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".restore-")] == []
+
+
+def test_restore_into_loads_an_open_connection(shop):
+    conn = snapshot.restore_into(sqlite3.connect(":memory:"))
+    assert conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] > 0
+
+
+def test_bootstrap_keeps_an_existing_database(shop, tmp_path):
+    db_file = str(tmp_path / "fertishop.db")
+    assert snapshot.bootstrap(db_file)
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("DELETE FROM products")
+    assert not snapshot.bootstrap(db_file)
+    assert count(db_file, "products") == 0
+
+
+def test_templates_are_built_once_per_key(fresh_dir, monkeypatch):
+    path = snapshot.build()
+    assert snapshot.build() == path
+    assert fresh_dir == [None]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    assert count(path, "seeded") == 1
+
+    # Hashes are stored at the cost they were made with, so the cost is in the key
+    monkeypatch.setenv("BCRYPT_ROUNDS", "5")
+    assert snapshot.build() != path
+    assert fresh_dir == [None, None]
+
+    assert snapshot.build({"products": 10}) != snapshot.build({"products": 20})
+    assert fresh_dir[2:] == [{"products": 10}, {"products": 20}]
+
+
+def test_forced_builds_seed_again(fresh_dir):
+    path = snapshot.build()
+    assert snapshot.build(force=True) == path
+    assert fresh_dir == [None, None]
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="ownership checks are POSIX only")
+def test_templates_others_can_write_are_refused(fresh_dir):
+    path = snapshot.build()
+    os.chmod(path, 0o620)
+    with pytest.raises(PermissionError):
+        snapshot.build()
+    with pytest.raises(PermissionError):
+        snapshot.restore(os.path.join(os.path.dirname(path), "copy.db"))
+
+    os.chmod(path, 0o600)
+    os.chmod(os.path.dirname(path), 0o777)
+    with pytest.raises(PermissionError):
+        snapshot.build()
+    os.chmod(os.path.dirname(path), 0o700)
@@ -0,0 +1,60 @@
+import time
+
+from sold_counts import SoldCounts
+
+
+def sold_count(shop, product_id):
+    conn = shop.db.get_connection()
+    return conn.execute("SELECT sold_count FROM products WHERE id = ?", (product_id,)).fetchone()[0]
+
+
+def pending_deltas(shop, product_id):
+    conn = shop.db.get_connection()
+    return conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM sold_count_deltas WHERE product_id = ?",
+                        (product_id,)).fetchone()[0]
+
+
+def test_orders_append_deltas_that_fold_into_sold_count(shop, make_shopper, make_product, checkout):
+    first, second = make_product(sold_count=7), make_product()
+    for items in ([(first, 2)], [(first, 3), (second, 1)]):
+        _, headers = make_shopper()
+        assert checkout(headers, items).status_code == 201
+
+    assert (sold_count(shop, first), pending_deltas(shop, first)) == (7, 5)
+    assert shop.sold_counts.fold() >= 3
+    assert (sold_count(shop, first), sold_count(shop, second)) == (12, 1)
+    assert pending_deltas(shop, first) == 0
+    # Nothing left to fold
+    assert shop.sold_counts.fold() == 0
+
+
+def test_catalog_reads_fold_once_the_bound_passes(client, shop, shopper, make_product, checkout, monkeypatch):
+    _, headers = shopper
+    product_id = make_product()
+    shop.sold_counts.fold()
+    assert checkout(headers, [(product_id, 4)]).status_code == 201
+
+    monkeypatch.setattr(shop.sold_counts, "max_staleness", 0.05)
+    time.sleep(0.1)
+    response = client.get(f"/api/products/{product_id}")
+    assert response.json["product"]["soldCount"] == 4
+    assert pending_deltas(shop, product_id) == 0
+
+
+def test_reads_within_the_bound_do_not_fold(shop, shopper, make_product, checkout):
+    _, headers = shopper
+    product_id = make_product()
+    shop.sold_counts.fold()
+    assert checkout(headers, [(product_id, 1)]).status_code == 201
+    shop.sold_counts.ensure_fresh()
+    assert pending_deltas(shop, product_id) == 1
+    shop.sold_counts.fold()
+
+
+def test_inline_mode_counts_in_the_order_transaction(shop, make_product):
+    inline = SoldCounts(shop.db, mode="inline")
+    product_id = make_product()
+    conn = shop.db.get_connection()
+    inline.record(conn.cursor(), [(product_id, 3)])
+    conn.commit()
+    assert (sold_count(shop, product_id), pending_deltas(shop, product_id)) == (3, 0)
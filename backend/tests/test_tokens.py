@@ -0,0 +1,49 @@
+import jwt
+
+import auth
+
+
+def token_of(headers):
+    return headers["Authorization"].split("Bearer ")[-1]
+
+
+def test_subject_is_encoded_as_a_string(shopper):
+    user, headers = shopper
+    claims = jwt.decode(token_of(headers), options={"verify_signature": False})
+    assert claims["sub"] == str(user["id"])
+    # Callers get the integer id back
+    assert auth.decode_token(token_of(headers))["sub"] == user["id"]
+
+
+def test_claims_resolve_the_user_without_the_database(client, shop, shopper, monkeypatch):
+    user, headers = shopper
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("users table read")
+    monkeypatch.setattr(shop.user_model, "get_by_id", unexpected)
+    monkeypatch.setattr(shop.user_model, "get_by_email", unexpected)
+
+    response = client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json["user"] == user
+
+
+def test_tokens_without_claims_load_the_user(client, shopper):
+    user, _ = shopper
+    legacy = auth.create_access_token({"sub": user["id"]})
+    response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {legacy}"})
+    assert response.status_code == 200
+    assert response.json["user"] == user
+
+
+def test_password_change_drops_cached_tokens(client, shopper):
+    _, headers = shopper
+    key = auth._token_key(token_of(headers))
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    assert auth._verified_tokens.get(key) is not None
+
+    response = client.post("/api/auth/password", headers=headers,
+                           json={"currentPassword": "secret", "newPassword": "changed"})
+    assert response.status_code == 200
+    assert auth._verified_tokens.get(key) is None
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
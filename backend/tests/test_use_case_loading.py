@@ -0,0 +1,46 @@
+import pytest
+
+
+def uncached_query_count(client, shop, path, **params):
+    # Move the catalog version so the read misses every cache
+    conn = shop.db.get_connection()
+    conn.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+    conn.commit()
+    shop.db.bump_catalog_version()
+    response = client.get(path, query_string=params)
+    assert response.status_code == 200
+    return int(response.headers["X-Query-Count"]), response.json["products"]
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/api/products", {"sort": "name"}),
+    ("/api/products", {"sort": "price-asc", "useCase": "soil-health"}),
+    ("/api/products", {"search": "organic"}),
+])
+def test_listing_queries_do_not_grow_with_the_page(client, shop, path, params):
+    small, _ = uncached_query_count(client, shop, path, limit=1, **params)
+    large, products = uncached_query_count(client, shop, path, limit=100, **params)
+    assert len(products) > 1
+    assert large == small
+
+
+def test_related_queries_do_not_grow_with_the_page(client, shop):
+    small, _ = uncached_query_count(client, shop, "/api/products/1/related", limit=1)
+    large, products = uncached_query_count(client, shop, "/api/products/1/related", limit=10)
+    assert len(products) > 1
+    assert large == small
+
+
+def test_every_product_carries_its_own_use_cases(client, shop):
+    conn = shop.db.get_connection()
+    expected = {}
+    for product_id, slug in conn.execute(
+        "SELECT puc.product_id, uc.slug FROM product_use_cases puc JOIN use_cases uc ON uc.id = puc.use_case_id "
+        "ORDER BY puc.product_id, puc.use_case_id"
+    ):
+        expected.setdefault(str(product_id), []).append(slug)
+
+    products = client.get("/api/products", query_string={"sort": "name", "limit": 100}).json["products"]
+    assert products
+    for product in products:
+        assert product["useCase"] == expected.get(product["id"], [])